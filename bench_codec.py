@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Encode/decode benchmark of the JSON and binary frame codecs (python_codec)
+on representative validation messages.
+
+Usage: python3 bench_codec.py [--seconds S]
+"""
+
+import argparse
+import random
+import time
+
+from python_codec import BinaryCodec, JSONCodec
+
+
+def representative_messages():
+    rng = random.Random(42)
+    envelope = {
+        "message_id": "validation_000123",
+        "type": "VALIDATION_REQUEST",
+        "timestamp": "2026-01-28T10:15:30.123456",
+    }
+    return {
+        "small": dict(envelope, attributes={
+            "board_id": "B-0042", "voltage": 3.3, "current": 0.42, "temperature": 41.5, "passed_selftest": True
+        }),
+        "mixed": dict(envelope, attributes={
+            "board_id": "B-0042",
+            "channels": [{"id": index, "name": f"ch{index}", "gain": rng.random(), "offset": rng.uniform(-1, 1),
+                          "enabled": index % 3 != 0} for index in range(32)],
+            "tags": ["line-3", "nightly", "rev-C"],
+        }),
+        "samples_1k": dict(envelope, attributes={
+            "board_id": "B-0042",
+            "voltage_samples": [rng.gauss(3.3, 0.05) for _ in range(1000)],
+            "timestamps_us": [index * 125 for index in range(1000)],
+        }),
+        "samples_64k": dict(envelope, attributes={
+            "board_id": "B-0042",
+            "voltage_samples": [rng.gauss(3.3, 0.05) for _ in range(65536)],
+        }),
+    }
+
+
+def per_call_us(function, argument, seconds):
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < seconds:
+        for _ in range(10):
+            function(argument)
+        count += 10
+        elapsed = time.perf_counter() - start
+    return elapsed / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=0.5, help="Time per measurement")
+    args = parser.parse_args()
+
+    print(f"{'message':<12} {'codec':<7} {'bytes':>9} {'encode_us':>11} {'decode_us':>11}")
+    for label, message in representative_messages().items():
+        for codec in (JSONCodec, BinaryCodec):
+            payload = codec.encode(message)
+            assert codec.decode(payload) == message
+            encode = per_call_us(codec.encode, message, args.seconds)
+            decode = per_call_us(codec.decode, payload, args.seconds)
+            print(f"{label:<12} {codec.name:<7} {len(payload):>9} {encode:>11.1f} {decode:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Measure per-frame compression on typical simple_python messages, offline.
+
+For each payload size (a VALIDATION_BATCH of requests with sample arrays,
+grown to roughly the target size) and each algorithm/level, reports:
+  ratio      - compressed size / original size
+  comp us    - time to compress one payload
+  decomp us  - time to decompress it again
+  saved      - bytes saved per frame
+  MB/s saved - bytes saved per second of compression + decompression CPU;
+               compression pays off on links slower than this
+
+Payloads below the server's --compression-min-size are never compressed; use
+the rows where "saved" is small or "MB/s saved" exceeds the link speed to
+choose that threshold.
+
+Usage: python3 bench_compression.py [--sizes 100,1000,...] [--levels 1,6,9] [--runs N]
+"""
+
+import argparse
+import random
+import time
+
+from python_compression import ALGORITHMS, Compressor, decompress_payload
+from python_framing import encode_payload
+
+DEFAULT_SIZES = (100, 300, 1000, 3000, 10000, 100000, 1000000)
+
+
+def sample_payload(size, seed=0):
+    """A JSON payload of about `size` bytes shaped like real validation traffic."""
+    rng = random.Random(seed)
+    if size < 400:
+        return encode_payload({"type": "VALIDATION_REQUEST", "message_id": "msg_000001",
+                               "attributes": {"validator": "range_check", "board_id": "B-001",
+                                              "voltage": round(rng.uniform(3.0, 3.6), 3)}})[:size]
+    requests, payload = [], b''
+    while len(payload) < size:
+        index = len(requests)
+        requests.append({"type": "VALIDATION_REQUEST", "message_id": f"msg_{index:06d}",
+                         "timestamp": "2026-01-28T00:00:00",
+                         "attributes": {"validator": "range_check", "board_id": f"B-{index % 64:03d}",
+                                        "voltage": round(rng.uniform(3.0, 3.6), 3),
+                                        "current": round(rng.uniform(0.1, 0.9), 3),
+                                        "samples": [round(rng.gauss(0.0, 1.0), 4) for _ in range(8)]}})
+        payload = encode_payload({"type": "VALIDATION_BATCH", "message_id": "batch_1",
+                                  "attributes": {"requests": requests}})
+    return payload
+
+
+def time_per_call(function, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = function()
+    return (time.perf_counter() - start) / runs, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated payload sizes in bytes")
+    parser.add_argument("--levels", default='1,6,9', help="Comma-separated compression levels")
+    parser.add_argument("--algorithms", default=','.join(ALGORITHMS),
+                        help=f"Comma-separated algorithms (default: {','.join(ALGORITHMS)})")
+    parser.add_argument("--runs", type=int, default=0,
+                        help="Repetitions per measurement (default: scaled to the payload size)")
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'algorithm':<10} {'level':>5} {'ratio':>6} {'comp us':>9} {'decomp us':>9} "
+          f"{'saved':>8} {'MB/s saved':>10}")
+    for size in map(int, args.sizes.split(',')):
+        payload = sample_payload(size)
+        runs = args.runs or max(3, min(2000, 2_000_000 // len(payload)))
+        for algorithm in args.algorithms.split(','):
+            for level in map(int, args.levels.split(',')):
+                compressor = Compressor(algorithm, level, min_size=0)
+                compress_time, compressed = time_per_call(lambda: compressor.compress(payload), runs)
+                if compressed is payload:
+                    print(f"{len(payload):>8} {algorithm:<10} {level:>5} {'-':>6} {compress_time * 1e6:>9.1f} "
+                          f"{'-':>9} {0:>8} {'-':>10}  (incompressible, sent as is)")
+                    continue
+                decompress_time, _ = time_per_call(lambda: decompress_payload(compressed), runs)
+                saved = len(payload) - len(compressed)
+                rate = saved / (compress_time + decompress_time) / 1e6
+                print(f"{len(payload):>8} {algorithm:<10} {level:>5} {len(compressed) / len(payload):>6.3f} "
+                      f"{compress_time * 1e6:>9.1f} {decompress_time * 1e6:>9.1f} {saved:>8} {rate:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
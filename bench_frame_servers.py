@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Compare the asyncio and threaded engines of the IPC/gRPC frame servers.
+
+Starts each engine in a subprocess on a free port and measures:
+  connections/s - connect, one request/response round trip, close
+  messages/s    - lock-step request/response on persistent connections
+  pipelined/s   - with --pipeline N, up to N frames in flight per connection
+                  against a --multiplex server
+
+Usage: python3 bench_frame_servers.py [--clients N] [--messages N] [--duration S] [--pipeline N]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+from python_framing import encode_frame, read_frame
+from python_readiness import launch
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    """Ask the OS for an unused TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(script, port, extra_args, port_flag=None):
+    """Start a server subprocess and wait until it reports it is listening."""
+    port_args = [port_flag, str(port)] if port_flag else [str(port)]
+    process, _ = launch([sys.executable, os.path.join(SCRIPT_DIR, script)] + port_args + extra_args,
+                        timeout=10, cwd=SCRIPT_DIR)
+    return process
+
+
+def request_frame(index):
+    return encode_frame({
+        "message_id": f"bench_{index}",
+        "type": "VALIDATION_REQUEST",
+        "timestamp": "2026-01-28T00:00:00",
+        "attributes": {"board_id": "B-001", "voltage": 3.3, "index": index}
+    })
+
+
+async def round_trip(reader, writer, frame):
+    writer.write(frame)
+    await writer.drain()
+    if await read_frame(reader) is None:
+        raise ConnectionError("server closed the connection")
+
+
+async def connection_worker(port, deadline, counter):
+    frame = request_frame(0)
+    while time.monotonic() < deadline:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        await round_trip(reader, writer, frame)
+        writer.close()
+        await writer.wait_closed()
+        counter[0] += 1
+
+
+async def message_worker(port, messages, counter):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for index in range(messages):
+        await round_trip(reader, writer, request_frame(index))
+        counter[0] += 1
+    writer.close()
+    await writer.wait_closed()
+
+
+async def pipelined_worker(port, messages, depth, counter):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    window = asyncio.Semaphore(depth)
+
+    async def receive():
+        for _ in range(messages):
+            if await read_frame(reader) is None:
+                raise ConnectionError("server closed the connection")
+            counter[0] += 1
+            window.release()
+
+    receiver = asyncio.ensure_future(receive())
+    for index in range(messages):
+        await window.acquire()
+        writer.write(request_frame(index))
+        await writer.drain()
+    await receiver
+    writer.close()
+    await writer.wait_closed()
+
+
+async def measure_connections(port, clients, duration):
+    counter = [0]
+    start = time.perf_counter()
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(connection_worker(port, deadline, counter) for _ in range(clients)))
+    return counter[0] / (time.perf_counter() - start)
+
+
+async def measure_messages(port, clients, messages):
+    counter = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(message_worker(port, messages, counter) for _ in range(clients)))
+    return counter[0] / (time.perf_counter() - start)
+
+
+async def measure_pipelined(port, clients, messages, depth):
+    counter = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(pipelined_worker(port, messages, depth, counter) for _ in range(clients)))
+    return counter[0] / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--script", default='python_ipc_server.py', help="Server script to benchmark")
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per persistent client")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds for the connection test")
+    parser.add_argument("--pipeline", type=int, default=0,
+                        help="Frames in flight per connection for the multiplex test (0 = skip)")
+    args = parser.parse_args()
+
+    print(f"{'engine':<10} {'clients':>8} {'connections/s':>15} {'messages/s':>12} {'pipelined/s':>12}")
+    for engine in ('threaded', 'asyncio'):
+        port = free_port()
+        process = start_server(args.script, port, ['--engine', engine, '--backlog', '1024'])
+        try:
+            conns = asyncio.run(measure_connections(port, args.clients, args.duration))
+            msgs = asyncio.run(measure_messages(port, args.clients, args.messages))
+        finally:
+            process.terminate()
+            process.wait()
+
+        pipelined = '-'
+        if args.pipeline > 0:
+            port = free_port()
+            process = start_server(args.script, port, ['--engine', engine, '--backlog', '1024', '--multiplex'])
+            try:
+                rate = asyncio.run(measure_pipelined(port, args.clients, args.messages, args.pipeline))
+                pipelined = f"{rate:.0f}"
+            finally:
+                process.terminate()
+                process.wait()
+        print(f"{engine:<10} {args.clients:>8} {conns:>15.0f} {msgs:>12.0f} {pipelined:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the frame reader/writer over a local socketpair.
+
+Compares the original receive loop (recv(4), then payload += recv(4096) chunks,
+header + payload concatenated for sendall) with python_framing.FrameReader and
+send_frame (recv_into a reusable buffer, scatter/gather sendmsg) for payload
+sizes from 100 B to 64 MB.
+
+Usage: python3 bench_framing.py [--volume MB] [--legacy-max MB]
+"""
+
+import argparse
+import socket
+import struct
+import time
+from threading import Thread
+
+from python_framing import FrameReader, send_frame
+
+SIZES = [100, 1024, 16 * 1024, 256 * 1024, 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024]
+
+
+def legacy_send(sock, payload):
+    sock.sendall(struct.pack('>I', len(payload)) + payload)
+
+
+def legacy_read(sock):
+    length_data = sock.recv(4)
+    if not length_data:
+        return None
+    length = struct.unpack('>I', length_data)[0]
+    payload = b''
+    while len(payload) < length:
+        chunk = sock.recv(min(4096, length - len(payload)))
+        if not chunk:
+            break
+        payload += chunk
+    return payload
+
+
+def run(size, count, send, make_reader):
+    """Send `count` frames of `size` bytes and time receiving them."""
+    sender_sock, receiver_sock = socket.socketpair()
+    payload = b'x' * size
+
+    def sender():
+        for _ in range(count):
+            send(sender_sock, payload)
+
+    thread = Thread(target=sender)
+    read = make_reader(receiver_sock)
+    start = time.perf_counter()
+    thread.start()
+    for _ in range(count):
+        frame = read()
+        assert len(frame) == size
+    elapsed = time.perf_counter() - start
+    thread.join()
+    sender_sock.close()
+    receiver_sock.close()
+    return count / elapsed, size * count / elapsed / (1024 * 1024)
+
+
+def label(size):
+    for unit, scale in (('MB', 1024 * 1024), ('KB', 1024)):
+        if size >= scale:
+            return f"{size // scale} {unit}"
+    return f"{size} B"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--volume", type=int, default=256, help="MB transferred per size (default: 256)")
+    parser.add_argument("--legacy-max", type=int, default=4,
+                        help="Largest payload in MB to run the quadratic legacy reader on (default: 4)")
+    args = parser.parse_args()
+
+    print(f"{'payload':>8} {'legacy frames/s':>16} {'legacy MB/s':>12} {'new frames/s':>13} {'new MB/s':>9}")
+    for size in SIZES:
+        count = max(2, min(50000, args.volume * 1024 * 1024 // size))
+        if size <= args.legacy_max * 1024 * 1024:
+            legacy_rate, legacy_mb = run(size, count, legacy_send, lambda sock: (lambda: legacy_read(sock)))
+            legacy = f"{legacy_rate:>16.0f} {legacy_mb:>12.1f}"
+        else:
+            legacy = f"{'skipped':>16} {'-':>12}"
+        new_rate, new_mb = run(size, count, send_frame, lambda sock: FrameReader(sock).read_frame)
+        print(f"{label(size):>8} {legacy} {new_rate:>13.0f} {new_mb:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
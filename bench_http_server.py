@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Compare the legacy (single-threaded HTTP/1.0 http.server) and asyncio
+(keep-alive HTTP/1.1) engines of python_test_server.py on POST /validate.
+
+Each engine is started in a subprocess on a free port and driven by N
+concurrent clients for --duration seconds. Clients reuse their connection
+whenever the server keeps it open and reconnect otherwise, so the legacy
+numbers include the per-request TCP handshake the Eiffel HTTP bridge pays.
+Latency is measured per request, including any reconnect; connection resets
+(e.g. from an overflowing listen backlog) are counted as errors.
+
+Usage: python3 bench_http_server.py [--clients 1,16,256] [--duration S]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from bench_frame_servers import free_port, start_server
+
+
+def validate_request(port, index):
+    body = json.dumps({
+        "message_id": f"bench_{index}",
+        "type": "VALIDATION_REQUEST",
+        "timestamp": "2026-01-28T00:00:00",
+        "attributes": {"board_id": "B-001", "voltage": 3.3, "index": index}
+    }).encode('utf-8')
+    head = (f"POST /validate HTTP/1.1\r\n"
+            f"Host: 127.0.0.1:{port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"\r\n").encode('latin-1')
+    return head + body
+
+
+async def read_response(reader):
+    """Read one response; returns True if the server keeps the connection open."""
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').lower()
+    status_line, _, header_block = head.partition('\r\n')
+    headers = dict(line.split(':', 1) for line in header_block.split('\r\n') if ':' in line)
+    length = headers.get('content-length')
+    if length is None:
+        await reader.read()  # HTTP/1.0 without a length: the body ends at EOF
+        return False
+    await reader.readexactly(int(length))
+    if status_line.startswith('http/1.0'):
+        return 'keep-alive' in headers.get('connection', '')
+    return 'close' not in headers.get('connection', '')
+
+
+async def client(port, deadline, latencies, errors):
+    request = validate_request(port, 0)
+    reader = writer = None
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            await writer.drain()
+            keep_alive = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # e.g. a reset from an overflowing listen backlog; count it and reconnect
+            errors[0] += 1
+            keep_alive = False
+        else:
+            latencies.append(time.perf_counter() - start)
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def measure(port, clients, duration):
+    latencies = []
+    errors = [0]
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, deadline, latencies, errors) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    return len(latencies) / elapsed, p50, p99, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", default='1,16,256', help="Comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per measurement")
+    args = parser.parse_args()
+    client_counts = [int(count) for count in args.clients.split(',')]
+
+    print(f"{'engine':<10} {'clients':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for engine in ('legacy', 'asyncio'):
+        port = free_port()
+        process = start_server('python_test_server.py', port, ['--engine', engine], port_flag='--port')
+        try:
+            for clients in client_counts:
+                rate, p50, p99, errors = asyncio.run(measure(port, clients, args.duration))
+                print(f"{engine:<10} {clients:>8} {rate:>10.0f} {p50:>9.2f} {p99:>9.2f} {errors:>7}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
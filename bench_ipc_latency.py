@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Round-trip latency of the IPC server over loopback TCP, a Unix domain socket
+and a shared-memory ring-buffer channel.
+
+Starts python_ipc_server.py once per transport and sends lock-step requests
+from a single blocking client, reporting mean/p50/p99 latency in microseconds.
+
+Usage: python3 bench_ipc_latency.py [--messages N] [--engine asyncio|threaded]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from python_framing import LENGTH_PREFIX, encode_frame
+from python_shm_transport import ShmClient, default_shm_path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    """Ask the OS for an unused TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def connect(family, address, timeout=10):
+    """Connect to the server, retrying until it is listening."""
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+            return sock
+        except OSError:
+            sock.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+def recv_exactly(sock, size):
+    data = sock.recv(size, socket.MSG_WAITALL)
+    if len(data) != size:
+        raise ConnectionError("server closed the connection")
+    return data
+
+
+MESSAGE = {
+    "message_id": "latency",
+    "type": "VALIDATION_REQUEST",
+    "attributes": {"board_id": "B-001", "voltage": 3.3}
+}
+
+
+def measure(sock, messages):
+    """Return sorted round-trip latencies in microseconds."""
+    if sock.family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    frame = encode_frame(MESSAGE)
+    samples = []
+    for _ in range(messages):
+        start = time.perf_counter_ns()
+        sock.sendall(frame)
+        length = LENGTH_PREFIX.unpack(recv_exactly(sock, LENGTH_PREFIX.size))[0]
+        recv_exactly(sock, length)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    return samples
+
+
+def measure_shm(client, messages):
+    """Return sorted shared-memory round-trip latencies in microseconds."""
+    samples = []
+    for _ in range(messages):
+        start = time.perf_counter_ns()
+        client.request(MESSAGE)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    return samples
+
+
+def attach_shm(path, timeout=10):
+    """Attach to a shared-memory channel, retrying until the server created it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return ShmClient(path)
+        except (OSError, ValueError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+def start_ipc_server(server_args):
+    return subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPT_DIR, 'python_ipc_server.py')] + server_args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=SCRIPT_DIR
+    )
+
+
+def report(label, samples):
+    mean = sum(samples) / len(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[int(len(samples) * 0.99)]
+    print(f"{label:<18} {mean:>10.1f} {p50:>10.1f} {p99:>10.1f}")
+
+
+def run(label, server_args, family, address, messages):
+    process = start_ipc_server(server_args)
+    try:
+        sock = connect(family, address)
+        measure(sock, min(messages, 1000))  # warm-up
+        samples = measure(sock, messages)
+        sock.close()
+    finally:
+        process.terminate()
+        process.wait()
+    report(label, samples)
+
+
+def run_shm(label, path, messages):
+    process = start_ipc_server(['--shm', path])
+    try:
+        time.sleep(0.2)  # let the server replace any stale channel file
+        client = attach_shm(path)
+        measure_shm(client, min(messages, 1000))  # warm-up
+        samples = measure_shm(client, messages)
+        client.close()
+    finally:
+        process.terminate()
+        process.wait()
+        for name in (path, path + '.req', path + '.resp'):
+            if os.path.exists(name):
+                os.unlink(name)
+    report(label, samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000, help="Round trips per transport")
+    parser.add_argument("--engine", choices=('asyncio', 'threaded'), default='asyncio')
+    args = parser.parse_args()
+
+    print(f"{'transport':<18} {'mean_us':>10} {'p50_us':>10} {'p99_us':>10}")
+    port = free_port()
+    run('tcp 127.0.0.1', [str(port), '--engine', args.engine],
+        socket.AF_INET, ('127.0.0.1', port), args.messages)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ipc.sock')
+        run('unix (path)', ['--engine', args.engine, '--unix', path],
+            socket.AF_UNIX, path, args.messages)
+
+    if sys.platform.startswith('linux'):
+        name = f"simple_python_bench_{os.getpid()}"
+        run('unix (abstract)', ['--engine', args.engine, '--unix', '@' + name],
+            socket.AF_UNIX, '\0' + name, args.messages)
+
+    if hasattr(os, 'mkfifo'):
+        run_shm('shared memory', default_shm_path(f"simple_python_bench_{os.getpid()}"), args.messages)
+
+
+if __name__ == '__main__':
+    main()
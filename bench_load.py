@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Load generator for the HTTP (/validate), IPC (9001) and gRPC (9002) servers.
+
+Acts as a client for each wire protocol - HTTP/1.1 POST /validate with
+keep-alive, or 4-byte length-prefixed JSON frames - and drives it in one of
+two modes:
+
+  closed  --concurrency workers each send a request, wait for the response,
+          and immediately send the next one
+  open    requests are issued at a fixed --rate (req/s) regardless of how fast
+          responses come back; latency is measured from each request's
+          scheduled start, so queueing delay is not hidden (no coordinated
+          omission); at most --concurrency requests are in flight, requests
+          beyond that are counted as dropped
+
+Requests share --connections connections per transport (a connection carries
+one request at a time). Load can be spread over --processes generator
+processes so the client is not the bottleneck.
+
+Reported per transport: throughput, errors, latency mean/p50/p90/p99/p99.9/max
+and the server's CPU time over the measurement window (the --server-pid
+process plus its children, or the server started with --start-server; Linux
+/proc only). --output writes the results as JSON; --compare BASELINE.json
+prints the change against an earlier run and exits 1 if throughput dropped or
+p99 grew by more than --max-regression.
+
+Usage:
+  python3 bench_load.py --transport http,ipc,grpc --start-server --duration 10
+  python3 bench_load.py --transport ipc --mode open --rate 5000 --output run.json
+  python3 bench_load.py --transport ipc --start-server --compare run.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_frame_servers import free_port, start_server
+from bench_http_server import read_response
+from python_framing import encode_payload, read_frame, write_frame
+
+TRANSPORTS = {
+    # name: (server script, default port, port given as --port)
+    'http': ('python_test_server.py', 8888, True),
+    'ipc': ('python_ipc_server.py', 9001, False),
+    'grpc': ('python_grpc_server.py', 9002, False),
+}
+MODES = ('closed', 'open')
+QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999))
+START_DELAY = 1.0  # seconds for generator processes to start and connect
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def request_message(index, payload_size):
+    """A VALIDATION_REQUEST whose JSON encoding is about `payload_size` bytes."""
+    message = {
+        "message_id": f"load_{index}",
+        "type": "VALIDATION_REQUEST",
+        "timestamp": "2026-01-28T00:00:00",
+        "attributes": {"board_id": "B-001", "voltage": 3.3, "padding": ""}
+    }
+    padding = payload_size - len(encode_payload(message))
+    if padding > 0:
+        message["attributes"]["padding"] = "x" * padding
+    return message
+
+
+class FrameClient:
+    """One connection to a length-prefixed frame server."""
+
+    def __init__(self, host, port, message):
+        self.host = host
+        self.port = port
+        self.payload = encode_payload(message)
+        self.reader = self.writer = None
+
+    async def request(self):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        write_frame(self.writer, self.payload)
+        await self.writer.drain()
+        if await read_frame(self.reader) is None:
+            raise ConnectionError("server closed the connection")
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class HTTPClient(FrameClient):
+    """One keep-alive connection to the HTTP server (reconnects if it closes)."""
+
+    def __init__(self, host, port, message):
+        super().__init__(host, port, message)
+        body = encode_payload(message)
+        head = (f"POST /validate HTTP/1.1\r\n"
+                f"Host: {host}:{port}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"\r\n").encode('latin-1')
+        self.payload = head + body
+
+    async def request(self):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(self.payload)
+        await self.writer.drain()
+        if not await read_response(self.reader):
+            self.close()
+
+
+class Recorder:
+    """Latencies of requests that completed inside the measurement window."""
+
+    def __init__(self, measure_from, measure_until):
+        self.measure_from = measure_from
+        self.measure_until = measure_until
+        self.latencies = []
+        self.errors = 0
+        self.dropped = 0
+
+    def measuring(self, now):
+        return self.measure_from <= now < self.measure_until
+
+
+async def timed_request(pool, started, recorder):
+    """Send one request on a pooled connection; latency counts from `started`."""
+    client = await pool.get()
+    try:
+        await client.request()
+    except (ConnectionError, asyncio.IncompleteReadError, OSError):
+        client.close()
+        if recorder.measuring(time.time()):
+            recorder.errors += 1
+        return
+    finally:
+        pool.put_nowait(client)
+    finished = time.perf_counter()
+    if recorder.measuring(time.time()):
+        recorder.latencies.append(finished - started)
+
+
+async def closed_loop(pool, workers, deadline, recorder):
+    async def worker():
+        while time.time() < deadline:
+            await timed_request(pool, time.perf_counter(), recorder)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+
+async def open_loop(pool, rate, max_in_flight, deadline, recorder):
+    in_flight = set()
+    interval = 1.0 / rate
+    next_at = time.perf_counter()
+    while time.time() < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            if recorder.measuring(time.time()):
+                recorder.dropped += 1
+        else:
+            task = asyncio.ensure_future(timed_request(pool, next_at, recorder))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_at += interval
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+async def generate(share):
+    """Run one generator process's share of the load."""
+    client_class = HTTPClient if share['transport'] == 'http' else FrameClient
+    message = request_message(share['index'], share['payload_size'])
+    pool = asyncio.Queue()
+    for _ in range(share['connections']):
+        pool.put_nowait(client_class(share['host'], share['port'], message))
+
+    start_at = share['start_at']
+    measure_from = start_at + share['warmup']
+    deadline = measure_from + share['duration']
+    recorder = Recorder(measure_from, deadline)
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    if share['mode'] == 'closed':
+        await closed_loop(pool, share['concurrency'], deadline, recorder)
+    else:
+        await open_loop(pool, share['rate'], share['concurrency'], deadline, recorder)
+    while not pool.empty():
+        pool.get_nowait().close()
+    return recorder.latencies, recorder.errors, recorder.dropped
+
+
+def run_share(share):
+    return asyncio.run(generate(share))
+
+
+def split(total, parts):
+    """Distribute `total` over `parts` as evenly as possible."""
+    return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
+
+
+def descendants(pid):
+    """pid and all of its descendant process ids (Linux /proc)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat:
+                    ppid = int(stat.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        found.append(current)
+        stack.extend(children.get(current, ()))
+    return found
+
+
+def server_cpu_seconds(pid):
+    """User + system CPU seconds of a process tree, or None if unavailable."""
+    if pid is None or not os.path.isdir('/proc'):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    total = 0
+    for process in descendants(pid):
+        try:
+            with open(f'/proc/{process}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])  # utime, stime
+    return total / ticks
+
+
+def summarize(latencies):
+    latencies.sort()
+    count = len(latencies)
+    summary = {"mean": sum(latencies) / count * 1000 if count else 0.0}
+    for label, quantile in QUANTILES:
+        summary[label] = latencies[min(count - 1, int(count * quantile))] * 1000 if count else 0.0
+    summary["max"] = latencies[-1] * 1000 if count else 0.0
+    return {key: round(value, 4) for key, value in summary.items()}
+
+
+def run_transport(transport, port, args, server_pid):
+    """Drive one transport and return its result record."""
+    start_at = time.time() + START_DELAY
+    shares = [{
+        'transport': transport, 'host': args.host, 'port': port, 'mode': args.mode,
+        'index': index, 'payload_size': args.payload_size,
+        'concurrency': concurrency, 'connections': max(1, connections),
+        'rate': args.rate / args.processes if args.rate else 0,
+        'start_at': start_at, 'warmup': args.warmup, 'duration': args.duration,
+    } for index, (concurrency, connections) in enumerate(zip(
+        split(args.concurrency, args.processes), split(args.connections, args.processes)))]
+
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        futures = [pool.submit(run_share, share) for share in shares]
+        time.sleep(max(0.0, start_at + args.warmup - time.time()))
+        cpu_start = server_cpu_seconds(server_pid)
+        time.sleep(max(0.0, start_at + args.warmup + args.duration - time.time()))
+        cpu_end = server_cpu_seconds(server_pid)
+        results = [future.result() for future in futures]
+
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    dropped = sum(result[2] for result in results)
+    record = {
+        "transport": transport,
+        "port": port,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / args.duration, 1),
+        "latency_ms": summarize(latencies),
+        "server_cpu": None,
+    }
+    if args.mode == 'open':
+        record["target_rps"] = args.rate
+        record["dropped"] = dropped
+    if cpu_start is not None and cpu_end is not None:
+        seconds = cpu_end - cpu_start
+        record["server_cpu"] = {"seconds": round(seconds, 3),
+                                "percent": round(100 * seconds / args.duration, 1)}
+    return record
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(records):
+    print(f"{'transport':<10} {'req/s':>10} {'errors':>7} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'p99.9 ms':>9} {'max ms':>8} {'cpu %':>6}")
+    for record in records:
+        latency = record["latency_ms"]
+        cpu = record["server_cpu"]
+        print(f"{record['transport']:<10} {record['throughput_rps']:>10.0f} {record['errors']:>7} "
+              f"{latency['p50']:>8.2f} {latency['p90']:>8.2f} {latency['p99']:>8.2f} "
+              f"{latency['p999']:>9.2f} {latency['max']:>8.2f} "
+              f"{cpu['percent'] if cpu else '-':>6}")
+
+
+def compare(records, baseline_path, max_regression):
+    """Print changes against a baseline run; True if nothing regressed."""
+    with open(baseline_path) as baseline_file:
+        baseline = {record["transport"]: record for record in json.load(baseline_file)["results"]}
+    ok = True
+    for record in records:
+        before = baseline.get(record["transport"])
+        if before is None:
+            continue
+        throughput = record["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        p99 = record["latency_ms"]["p99"] / before["latency_ms"]["p99"] - 1 if before["latency_ms"]["p99"] else 0.0
+        regressed = throughput < -max_regression or p99 > max_regression
+        ok = ok and not regressed
+        print(f"{record['transport']:<10} throughput {throughput:+.1%}  p99 {p99:+.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the simple_python servers")
+    parser.add_argument("--transport", default='http,ipc,grpc',
+                        help="Comma-separated transports: http, ipc, grpc (default: all)")
+    parser.add_argument("--host", default='127.0.0.1', help="Server address")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Server port (only with a single transport; default: 8888/9001/9002)")
+    parser.add_argument("--mode", choices=MODES, default='closed', help="closed or open loop (default: closed)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Open loop: total requests per second")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Closed loop: workers; open loop: max requests in flight (default: 16)")
+    parser.add_argument("--connections", type=int, default=16, help="Connections per transport (default: 16)")
+    parser.add_argument("--payload-size", type=int, default=200, help="Approximate request size in bytes")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per transport")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before measuring")
+    parser.add_argument("--processes", type=int, default=1, help="Load generator processes")
+    parser.add_argument("--start-server", action='store_true',
+                        help="Start each transport's server on a free port for the run")
+    parser.add_argument("--server-args", default='', help="Extra arguments for --start-server servers")
+    parser.add_argument("--server-pid", type=int, default=None,
+                        help="Measure CPU of this already running server process")
+    parser.add_argument("--label", default=None, help="Free-form label stored in the JSON output")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Allowed throughput drop / p99 increase for --compare (default: 0.10)")
+    args = parser.parse_args()
+
+    transports = [name.strip() for name in args.transport.split(',') if name.strip()]
+    unknown = [name for name in transports if name not in TRANSPORTS]
+    if unknown:
+        parser.error(f"unknown transport(s): {', '.join(unknown)}")
+    if args.mode == 'open' and args.rate <= 0:
+        parser.error("--mode open requires --rate")
+    if args.port is not None and len(transports) > 1:
+        parser.error("--port needs a single --transport")
+    args.processes = max(1, min(args.processes, args.concurrency))
+
+    records = []
+    for transport in transports:
+        script, default_port, port_flag = TRANSPORTS[transport]
+        port = args.port or default_port
+        server = None
+        server_pid = args.server_pid
+        if args.start_server:
+            port = free_port()
+            server = start_server(script, port, args.server_args.split(),
+                                  port_flag='--port' if port_flag else None)
+            server_pid = server.pid
+        try:
+            records.append(run_transport(transport, port, args, server_pid))
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    print_table(records)
+    report = {
+        "tool": "bench_load",
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "git_revision": git_revision(),
+        "label": args.label,
+        "python": sys.version.split()[0],
+        "config": {key: getattr(args, key) for key in (
+            'mode', 'rate', 'concurrency', 'connections', 'payload_size', 'duration',
+            'warmup', 'processes', 'server_args')},
+        "results": records,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+            output.write('\n')
+    if args.compare and not compare(records, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
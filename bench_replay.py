@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Replay a capture log (python_capture) against a server and compare latencies.
+
+Every captured connection is reopened against the target and its requests
+are sent as they were captured: raw frames to the IPC/gRPC port, re-serialized
+requests to the HTTP port. Requests are sent on schedule without waiting for
+earlier responses (open loop), so a slower server shows up as latency, not as
+a stretched schedule:
+
+  --speed 1      the original timing (default)
+  --speed N      N times faster (inter-arrival gaps divided by N)
+  --flat-out     every connection at once, every request as fast as it can
+                 be written
+
+Responses are matched to requests by message_id on frame connections and by
+order on HTTP connections, both for the replay and, from the captured RESPONSE
+records, for the original run. The report compares the two latency
+distributions and the per-request delta (replayed - original), overall and
+per server.
+
+Usage:
+  python3 bench_replay.py CAPTURE_DIR --port 9001
+  python3 bench_replay.py CAPTURE_DIR --target http=8080 --target ipc=9001 --speed 10
+  python3 bench_replay.py CAPTURE_DIR --port 9001 --flat-out --output replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+
+from bench_http_server import read_response
+from bench_load import summarize
+from python_capture import CONNECT, DISCONNECT, FRAME, HTTP_REQUEST, RESPONSE, read_capture
+from python_codec import CODECS, DECODE_ERRORS, DEFAULT_CODEC, HANDSHAKE_ACK_TYPE, is_handshake, negotiate
+from python_framing import read_frame, write_frame
+from python_streaming import is_continuation
+
+
+class Request:
+    """One captured request: when it arrived, its correlation key and both latencies."""
+
+    __slots__ = ('timestamp', 'payload', 'key', 'original', 'replayed', 'sent')
+
+    def __init__(self, timestamp, payload, key):
+        self.timestamp = timestamp
+        self.payload = payload
+        self.key = key  # message_id for frames, None for HTTP and frames without a response
+        self.original = None
+        self.replayed = None
+        self.sent = None
+
+
+class Connection:
+    """A captured connection and its requests in arrival order."""
+
+    def __init__(self, server, opened):
+        self.server = server
+        self.opened = opened
+        self.http = server == 'http'
+        self.requests = []
+        self.codec = DEFAULT_CODEC
+        self.first_frame = True
+
+    def add(self, record):
+        if record.kind == HTTP_REQUEST:
+            self.requests.append(Request(record.timestamp, record.payload, None))
+            return
+        key = None
+        try:
+            message = self.codec.decode(record.payload)
+        except DECODE_ERRORS:
+            message = {}
+        if is_handshake(message):
+            negotiated, _ = negotiate(message, self.first_frame)
+            self.codec = negotiated or self.codec
+        elif not is_continuation(message):
+            key = str(message.get("message_id", "unknown"))
+        self.first_frame = False
+        self.requests.append(Request(record.timestamp, record.payload, key))
+
+    def match_original(self, record, waiting):
+        """Attribute a captured RESPONSE to the earliest unanswered request it answers."""
+        queue = waiting[None if self.http else record.payload.decode('utf-8', 'replace')]
+        if queue:
+            request = queue.popleft()
+            request.original = (record.timestamp - request.timestamp) / 1e9
+
+
+def load_capture(directory):
+    """Read a capture into Connections with their original latencies."""
+    connections = {}
+    waiting = {}
+    for record in read_capture(directory):
+        key = (record.pid, record.connection)
+        if record.kind == CONNECT:
+            connections[key] = Connection(json.loads(record.payload).get("server", "ipc"), record.timestamp)
+            waiting[key] = defaultdict(deque)
+            continue
+        connection = connections.get(key)
+        if connection is None:
+            continue  # opened before the oldest segment kept
+        if record.kind in (FRAME, HTTP_REQUEST):
+            connection.add(record)
+            request = connection.requests[-1]
+            if connection.http or request.key is not None:
+                waiting[key][request.key].append(request)
+        elif record.kind == RESPONSE:
+            connection.match_original(record, waiting[key])
+        elif record.kind == DISCONNECT:
+            waiting.pop(key, None)
+    return [connection for connection in connections.values() if connection.requests]
+
+
+async def replay_connection(connection, host, port, start, origin, speed):
+    """Send one connection's requests on schedule and time their responses."""
+    reader, writer = await asyncio.open_connection(host, port)
+    waiting = defaultdict(deque)
+    for request in connection.requests:
+        if connection.http or request.key is not None:
+            waiting[request.key].append(request)
+    receiver = asyncio.ensure_future(receive(connection, reader, waiting))
+    try:
+        for request in connection.requests:
+            if speed:
+                delay = start + (request.timestamp - origin) / 1e9 / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            request.sent = time.perf_counter()
+            if connection.http:
+                writer.write(request.payload)
+            else:
+                write_frame(writer, request.payload)
+            await writer.drain()
+        await receiver
+    except ConnectionError:
+        pass
+    finally:
+        receiver.cancel()
+        writer.close()
+
+
+async def receive(connection, reader, waiting):
+    codec = DEFAULT_CODEC
+    while any(waiting.values()):
+        if connection.http:
+            keep_alive = await read_response(reader)
+            key = None
+        else:
+            payload = await read_frame(reader)
+            if payload is None:
+                return
+            message = codec.decode(payload)
+            if message.get("type") == HANDSHAKE_ACK_TYPE:
+                codec = CODECS.get(message.get("attributes", {}).get("codec"), codec)
+                continue
+            key = str(message.get("message_id", "unknown"))
+        queue = waiting.get(key)
+        if queue:
+            request = queue.popleft()
+            request.replayed = time.perf_counter() - request.sent
+        if connection.http and not keep_alive:
+            return
+
+
+def report(label, requests):
+    original = [request.original for request in requests if request.original is not None]
+    replayed = [request.replayed for request in requests if request.replayed is not None]
+    deltas = [request.replayed - request.original for request in requests
+              if request.original is not None and request.replayed is not None]
+    result = {"requests": len(requests), "answered": len(replayed),
+              "original": summarize(original), "replayed": summarize(replayed)}
+    delta = summarize(deltas)
+    result["delta"] = delta
+    print(f"{label:<8} {len(requests):>8} {len(replayed):>8} "
+          f"{result['original']['p50']:>9.3f} {result['replayed']['p50']:>9.3f} {delta['p50']:>+9.3f} "
+          f"{result['original']['p99']:>9.3f} {result['replayed']['p99']:>9.3f} {delta['p99']:>+9.3f}")
+    return result
+
+
+async def replay(connections, host, ports, speed, timeout):
+    origin = min(connection.opened for connection in connections)
+    start = time.perf_counter()
+
+    async def run(connection):
+        if speed:
+            delay = start + (connection.opened - origin) / 1e9 / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await replay_connection(connection, host, ports[connection.server], start, origin, speed)
+
+    tasks = [asyncio.ensure_future(run(connection)) for connection in connections]
+    captured = max(request.timestamp for connection in connections for request in connection.requests) - origin
+    limit = captured / 1e9 / (speed or float('inf')) + timeout
+    done, pending = await asyncio.wait(tasks, timeout=limit)
+    for task in pending:
+        task.cancel()
+    errors = [task.exception() for task in done if task.exception() is not None]
+    return time.perf_counter() - start, captured / 1e9, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a simple_python capture log")
+    parser.add_argument("capture", help="Capture directory (--capture of the server)")
+    parser.add_argument("--host", default='127.0.0.1', help="Target host")
+    parser.add_argument("--port", type=int, default=None, help="Target port for every captured server")
+    parser.add_argument("--target", action='append', default=[], metavar='SERVER=PORT',
+                        help="Target port for one captured server (http, ipc, grpc); repeatable")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay N times faster (default: 1)")
+    parser.add_argument("--flat-out", action='store_true', help="Ignore the captured timing")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="Seconds to wait for responses after the last request (default: 10)")
+    parser.add_argument("--output", default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    connections = load_capture(args.capture)
+    if not connections:
+        raise SystemExit(f"No requests captured in {args.capture}")
+    ports = defaultdict(lambda: args.port)
+    for target in args.target:
+        server, _, port = target.partition('=')
+        ports[server.lower()] = int(port)
+    missing = sorted({connection.server for connection in connections if ports[connection.server] is None})
+    if missing:
+        parser.error(f"no --port or --target for captured server(s): {', '.join(missing)}")
+
+    speed = None if args.flat_out else args.speed
+    elapsed, captured, errors = asyncio.run(replay(connections, args.host, ports, speed, args.timeout))
+    print(f"{sum(len(connection.requests) for connection in connections)} requests on {len(connections)} "
+          f"connections: captured over {captured:.3f}s, replayed in {elapsed:.3f}s "
+          f"({'flat out' if speed is None else f'{speed:g}x'})")
+    for error in errors[:5]:
+        print(f"connection failed: {error}")
+    print(f"{'server':<8} {'requests':>8} {'answered':>8} {'orig p50':>9} {'new p50':>9} {'delta p50':>9} "
+          f"{'orig p99':>9} {'new p99':>9} {'delta p99':>9}  (ms)")
+    by_server = defaultdict(list)
+    for connection in connections:
+        by_server[connection.server].extend(connection.requests)
+    results = {server: report(server, requests) for server, requests in sorted(by_server.items())}
+    if len(results) > 1:
+        results['all'] = report('all', [request for requests in by_server.values() for request in requests])
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({"captured_seconds": captured, "replayed_seconds": elapsed, "speed": speed,
+                       "servers": results}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
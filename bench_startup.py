@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Measure server startup: interpreter launch through the first served request.
+
+Each server is started --runs times on a free port and timed from Popen() to:
+  ready  - the moment the launcher learns the server is listening
+  first  - the first request answered (GET /health for HTTP, one
+           VALIDATION_REQUEST frame for IPC/gRPC)
+
+with two ways of learning readiness:
+  notify - the server's READY line on an inherited pipe (python_readiness,
+           what the start_*_blocking launchers use now)
+  poll   - connect_ex() every --poll-interval seconds (what the launchers used
+           to do, every 0.5 s)
+
+A bare `python -c pass` is timed as the floor no launcher can beat.
+
+Usage: python3 bench_startup.py [--runs N] [--poll-interval S] [--servers http,ipc,grpc]
+"""
+
+import argparse
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_frame_servers import SCRIPT_DIR, free_port, request_frame
+from python_framing import FrameReader
+from python_readiness import SERVER_SCRIPTS, launch, server_argv
+
+def first_request(name, port):
+    """Send one request on a fresh connection and wait for its answer."""
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        if name == 'http':
+            sock.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            if not sock.recv(4096):
+                raise ConnectionError("server closed the connection")
+        else:
+            sock.sendall(request_frame(0))
+            if FrameReader(sock).read_frame() is None:
+                raise ConnectionError("server closed the connection")
+
+
+def start_notified(name):
+    start = time.perf_counter()
+    process, addresses = launch(server_argv(name, 0), cwd=SCRIPT_DIR)
+    ready = time.perf_counter()
+    return process, int(addresses[0]), ready - start
+
+
+def start_polled(name, interval):
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(server_argv(name, port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               cwd=SCRIPT_DIR)
+    while True:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                break
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} server exited with code {process.returncode}")
+        time.sleep(interval)
+    return process, port, time.perf_counter() - start
+
+
+def measure(name, method, runs, interval):
+    """Return (ready seconds, first-request seconds) lists over `runs` starts."""
+    ready_times, first_times = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        if method == 'notify':
+            process, port, ready = start_notified(name)
+        else:
+            process, port, ready = start_polled(name, interval)
+        try:
+            first_request(name, port)
+            first_times.append(time.perf_counter() - start)
+            ready_times.append(ready)
+        finally:
+            process.terminate()
+            process.wait()
+    return ready_times, first_times
+
+
+def measure_interpreter(runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def describe(values):
+    return f"{statistics.median(values) * 1000:>9.1f} {percentile(values, 0.9) * 1000:>9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10, help="Starts per server and method")
+    parser.add_argument("--poll-interval", type=float, default=0.5,
+                        help="connect_ex() interval of the polling launcher (default: 0.5 s)")
+    parser.add_argument("--servers", default=','.join(SERVER_SCRIPTS),
+                        help=f"Comma-separated servers to start (default: {','.join(SERVER_SCRIPTS)})")
+    args = parser.parse_args()
+
+    print(f"{'server':<8} {'method':<8} {'ready p50':>9} {'ready p90':>9} {'first p50':>9} {'first p90':>9}  (ms)")
+    interpreter = measure_interpreter(args.runs)
+    print(f"{'python':<8} {'-c pass':<8} {describe(interpreter)} {describe(interpreter)}")
+    for name in args.servers.split(','):
+        for method in ('notify', 'poll'):
+            ready, first = measure(name, method, args.runs, args.poll_interval)
+            print(f"{name:<8} {method:<8} {describe(ready)} {describe(first)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Example validator module for the simple_python servers.
+
+Load with: python3 python_ipc_server.py --validators example_validators
+Then route a request with attributes.validator = "range_check", "checksum" or
+"sample_stats" (which can also be sent as a streamed request; see python_streaming).
+"""
+
+import hashlib
+
+_LIMITS = None
+
+
+def init_worker():
+    """Runs once per process before any request; load models and tables here."""
+    global _LIMITS
+    _LIMITS = {"voltage": (3.0, 3.6), "current": (0.0, 2.0), "temperature": (-20.0, 85.0)}
+
+
+def range_check(message):
+    """PASS if every known numeric attribute lies within its limits."""
+    attributes = message.get("attributes", {})
+    failures = [name for name, (low, high) in _LIMITS.items()
+                if name in attributes and not low <= float(attributes[name]) <= high]
+    return {
+        "result": "FAIL" if failures else "PASS",
+        "failed_attributes": failures
+    }
+
+
+def checksum(message):
+    """CPU-bound example: iterated SHA-256 over the attribute payload."""
+    attributes = message.get("attributes", {})
+    digest = repr(sorted(attributes.items())).encode('utf-8')
+    for _ in range(int(attributes.get("rounds", 10000))):
+        digest = hashlib.sha256(digest).digest()
+    return {"result": "PASS", "digest": digest.hex()}
+
+
+def sample_stats(message):
+    """Summarize attributes.samples in one pass, so it also works on a streamed request."""
+    count, total, low, high = 0, 0.0, None, None
+    for sample in message.get("attributes", {}).get("samples", ()):
+        sample = float(sample)
+        count += 1
+        total += sample
+        low = sample if low is None or sample < low else low
+        high = sample if high is None or sample > high else high
+    return {
+        "result": "PASS" if count else "FAIL",
+        "count": count,
+        "mean": total / count if count else None,
+        "min": low,
+        "max": high
+    }
+
+
+VALIDATORS = {
+    "range_check": range_check,
+    "checksum": (checksum, 5.0),
+    "sample_stats": sample_stats,
+}
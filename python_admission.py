@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Admission control for the HTTP, IPC and gRPC servers.
+
+Four limits keep a burst from turning into unbounded memory growth:
+  max_connections  - open client connections per server
+  max_in_flight    - requests being validated or queued for validation, server-wide
+  max_frame_size   - largest frame (or HTTP body) a client may announce; checked
+                     against the length prefix before anything is buffered
+  max_queue_depth  - requests in flight on one multiplexed connection
+
+Over a limit, the server sheds load instead of queueing: it answers with the
+usual ERROR message, error_code OVERLOADED, plus attributes.reason and
+attributes.retry_after_ms so Eiffel bridges back off rather than time out (HTTP
+answers 503 / 413 with a Retry-After header). A rejected connection gets one
+such frame and is closed; an oversized frame closes its connection too, since
+its payload is never read. Only max_frame_size is on by default.
+"""
+
+import math
+from threading import Lock
+
+from python_validation import error_response
+
+OVERLOADED = 'OVERLOADED'
+DEFAULT_MAX_FRAME_SIZE = 16 * 1024 * 1024
+DEFAULT_RETRY_AFTER_MS = 100
+
+# attributes.reason values, also the `reason` label of rejected_total
+TOO_MANY_CONNECTIONS = 'max_connections'
+TOO_MANY_IN_FLIGHT = 'max_in_flight'
+FRAME_TOO_LARGE = 'max_frame_size'
+QUEUE_FULL = 'max_queue_depth'
+
+
+def overloaded_response(message_id, reason, message, retry_after_ms=DEFAULT_RETRY_AFTER_MS):
+    """Build the ERROR (error_code OVERLOADED) answering a shed request."""
+    response = error_response(message_id, OVERLOADED, message)
+    response["attributes"]["reason"] = reason
+    response["attributes"]["retry_after_ms"] = retry_after_ms
+    return response
+
+
+class AdmissionControl:
+    """Connection and in-flight counters checked against configured limits (None = unlimited)."""
+
+    def __init__(self, max_connections=None, max_in_flight=None, max_frame_size=DEFAULT_MAX_FRAME_SIZE,
+                 max_queue_depth=None, retry_after_ms=DEFAULT_RETRY_AFTER_MS):
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.max_frame_size = max_frame_size
+        self.max_queue_depth = max_queue_depth
+        self.retry_after_ms = retry_after_ms
+        self.connections = 0
+        self.in_flight = 0
+        self.lock = Lock()
+
+    def description(self):
+        """Describe the active limits for the startup line."""
+        limits = [f"{name}={value}" for name, value in (
+            ('max_connections', self.max_connections), ('max_in_flight', self.max_in_flight),
+            ('max_frame_size', self.max_frame_size), ('max_queue_depth', self.max_queue_depth))
+            if value is not None]
+        return f"limits: {', '.join(limits)}" if limits else "limits: none"
+
+    @property
+    def retry_after_seconds(self):
+        """retry_after_ms rounded up to whole seconds for an HTTP Retry-After header."""
+        return max(1, math.ceil(self.retry_after_ms / 1000))
+
+    def open_connection(self):
+        """Count a new connection; False if it would exceed max_connections."""
+        with self.lock:
+            if self.max_connections is not None and self.connections >= self.max_connections:
+                return False
+            self.connections += 1
+            return True
+
+    def close_connection(self):
+        with self.lock:
+            self.connections -= 1
+
+    def begin(self):
+        """Count a request about to be validated; False if it would exceed max_in_flight."""
+        with self.lock:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def end(self, future=None):
+        """Release a request's in-flight slot (also usable as a future's done callback)."""
+        with self.lock:
+            self.in_flight -= 1
+
+    def frame_too_large(self, length):
+        """True if an announced frame or body length exceeds max_frame_size."""
+        return self.max_frame_size is not None and length > self.max_frame_size
+
+    def queue_full(self, depth):
+        """True if a connection already has max_queue_depth requests in flight."""
+        return self.max_queue_depth is not None and depth >= self.max_queue_depth
+
+    def rejection(self, message_id, reason):
+        """The OVERLOADED response for a request or connection shed for `reason`."""
+        messages = {
+            TOO_MANY_CONNECTIONS: f"Server is at its limit of {self.max_connections} connections",
+            TOO_MANY_IN_FLIGHT: f"Server is at its limit of {self.max_in_flight} requests in flight",
+            FRAME_TOO_LARGE: f"Frame exceeds the limit of {self.max_frame_size} bytes",
+            QUEUE_FULL: f"Connection is at its limit of {self.max_queue_depth} requests in flight",
+        }
+        return overloaded_response(message_id, reason, messages[reason], self.retry_after_ms)
+
+
+def add_admission_arguments(parser):
+    """Add the admission-control command-line options shared by every server."""
+    parser.add_argument("--max-connections", type=int, default=None,
+                        help="Reject connections beyond N with OVERLOADED (default: unlimited)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Answer requests beyond N in flight with OVERLOADED (default: unlimited)")
+    parser.add_argument("--max-frame-size", type=int, default=DEFAULT_MAX_FRAME_SIZE,
+                        help=f"Largest accepted frame or body in bytes (default: {DEFAULT_MAX_FRAME_SIZE})")
+    parser.add_argument("--max-queue-depth", type=int, default=None,
+                        help="Requests in flight per multiplexed connection (default: unlimited)")
+    parser.add_argument("--retry-after-ms", type=int, default=DEFAULT_RETRY_AFTER_MS,
+                        help=f"Back-off hint sent with OVERLOADED (default: {DEFAULT_RETRY_AFTER_MS})")
+
+
+def admission_from_args(args):
+    """Build an AdmissionControl from parsed command-line arguments."""
+    return AdmissionControl(args.max_connections, args.max_in_flight, args.max_frame_size,
+                            args.max_queue_depth, args.retry_after_ms)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Append-only capture log of the traffic a server receives, for replay.
+
+With --capture DIR, the IPC, gRPC and (asyncio) HTTP servers append a record
+for every connection opened and closed, every request frame or HTTP request
+received and every response sent to a segmented, memory-mapped log in DIR.
+bench_replay.py plays a capture back against any server at the original
+timing, N times faster or flat out, and compares latencies.
+
+Records use the wire's own framing: a 4-byte big-endian length prefix, then
+the record header and its payload:
+
+    length     uint32   bytes after this field
+    timestamp  uint64   arrival (or send) time, ns since the epoch
+    connection uint32   connection id, unique within the capturing process
+    kind       uint8    CONNECT, FRAME, HTTP_REQUEST, RESPONSE or DISCONNECT
+    payload             CONNECT: JSON {"server": ..., "peer": ...}
+                        FRAME: the request frame's payload, as decoded by the
+                        framing layer (decompressed, still codec-encoded)
+                        HTTP_REQUEST: the request head and body, re-serialized
+                        RESPONSE: the response's message_id (empty for HTTP,
+                        whose responses are in request order)
+
+Each process writes its own segments, capture-<pid>-<sequence>.seg, so --workers
+captures merge by timestamp. A segment is preallocated to --capture-segment-size
+bytes and mmap-ed; a zero length prefix marks the end of the records in it,
+and a closed segment is truncated to its records. --capture-max-segments keeps
+only the newest segments of each process.
+
+Recording only appends the record to an in-memory buffer under a lock; a
+background thread copies the buffer into the mapped segment in bulk every
+FLUSH_INTERVAL seconds, or once FLUSH_BYTES are waiting. Records buffered when
+the process is killed are lost; everything already copied survives in the page
+cache. Streamed HTTP request bodies (python_streaming) are not captured.
+"""
+
+import heapq
+import itertools
+import json
+import mmap
+import os
+import re
+import struct
+import time
+from collections import deque, namedtuple
+from threading import Event, Lock, Thread
+
+RECORD = struct.Struct('>IQIB')  # length prefix + header
+PREFIX_SIZE = 4
+CONNECT, FRAME, HTTP_REQUEST, RESPONSE, DISCONNECT = range(1, 6)
+KIND_NAMES = {CONNECT: 'connect', FRAME: 'frame', HTTP_REQUEST: 'http_request', RESPONSE: 'response',
+              DISCONNECT: 'disconnect'}
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+FLUSH_INTERVAL = 0.2
+FLUSH_BYTES = 1024 * 1024
+_SEGMENT_NAME = re.compile(r'capture-(\d+)-(\d+)\.seg$')
+
+CaptureRecord = namedtuple('CaptureRecord', 'timestamp pid connection kind payload')
+
+
+class CaptureLog:
+    """One process's capture: a record buffer flushed into mmap-ed segment files."""
+
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE, max_segments=0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.lock = Lock()
+        self.chunks = [bytearray()]  # one per segment, the last one still being filled
+        self.planned = 0  # bytes of the current segment, written or buffered
+        self.buffered = 0
+        self.open_connections = {}
+        self.ids = itertools.count(1)
+        self.sequence = 0
+        self.segments = deque()
+        self.segment_file = None
+        self.segment = None
+        self.position = 0
+        self.wakeup = Event()
+        self.closed = False
+        self.flusher = Thread(target=self._run, name="capture-flusher", daemon=True)
+        self.flusher.start()
+
+    def description(self):
+        """Describe the capture settings for the startup line."""
+        return f"capture={self.directory}"
+
+    def record(self, connection, kind, payload=b''):
+        """Append one record (safe to call from any thread)."""
+        size = RECORD.size - PREFIX_SIZE + len(payload)
+        with self.lock:
+            if self.planned and self.planned + PREFIX_SIZE + size > self.segment_size:
+                self.chunks.append(bytearray())
+                self.planned = 0
+            chunk = self.chunks[-1]
+            chunk += RECORD.pack(size, time.time_ns(), connection, kind)
+            chunk += payload
+            self.planned += PREFIX_SIZE + size
+            self.buffered += PREFIX_SIZE + size
+            if self.buffered >= FLUSH_BYTES:
+                self.wakeup.set()
+
+    def open(self, key, server, peer):
+        """Record a new connection, identified from now on by `key` (its writer or socket)."""
+        connection = self.open_connections[key] = next(self.ids)
+        self.record(connection, CONNECT, json.dumps({"server": server, "peer": str(peer)}).encode('utf-8'))
+        return connection
+
+    def response(self, key, message_id=''):
+        """Record a response sent on the connection `key`."""
+        connection = self.open_connections.get(key)
+        if connection is not None:
+            self.record(connection, RESPONSE, str(message_id).encode('utf-8'))
+
+    def close(self, key):
+        connection = self.open_connections.pop(key, None)
+        if connection is not None:
+            self.record(connection, DISCONNECT)
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Copy the buffered records into the mapped segments (flusher thread only)."""
+        with self.lock:
+            chunks, self.chunks = self.chunks, [bytearray()]
+            self.buffered = 0
+        for index, chunk in enumerate(chunks):
+            if index:
+                self._close_segment()
+            if not chunk:
+                continue
+            if self.segment is None:
+                self._open_segment(len(chunk))
+            self.segment[self.position:self.position + len(chunk)] = chunk
+            self.position += len(chunk)
+
+    def _open_segment(self, min_size):
+        self.sequence += 1
+        path = os.path.join(self.directory, f"capture-{os.getpid()}-{self.sequence:06d}.seg")
+        self.segment_file = open(path, 'w+b')
+        self.segment_file.truncate(max(self.segment_size, min_size))
+        self.segment = mmap.mmap(self.segment_file.fileno(), 0)
+        self.position = 0
+        self.segments.append(path)
+        while self.max_segments and len(self.segments) > self.max_segments:
+            try:
+                os.unlink(self.segments.popleft())
+            except FileNotFoundError:
+                pass
+
+    def _close_segment(self):
+        if self.segment is None:
+            return
+        self.segment.flush()
+        self.segment.close()
+        self.segment_file.truncate(self.position)
+        self.segment_file.close()
+        self.segment = self.segment_file = None
+
+    def shutdown(self):
+        """Flush every record and close the current segment."""
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.flusher.join()
+        self._close_segment()
+
+
+def http_request_bytes(request):
+    """Re-serialize a parsed HTTP request (python_http_server.HTTPRequest) for capture."""
+    lines = [f"{request.method} {request.path} {request.version}"]
+    lines += [f"{name}: {value}" for name, value in request.headers.items()
+              if name not in ('content-length', 'transfer-encoding', 'expect')]
+    lines.append(f"content-length: {len(request.body)}")
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + request.body
+
+
+def read_segment(path, pid=0):
+    """Yield the records of one segment file, stopping at its end marker."""
+    with open(path, 'rb') as segment_file:
+        data = segment_file.read()
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        size, timestamp, connection, kind = RECORD.unpack_from(data, offset)
+        end = offset + PREFIX_SIZE + size
+        if size == 0 or end > len(data):
+            break
+        yield CaptureRecord(timestamp, pid, connection, kind, data[offset + RECORD.size:end])
+        offset = end
+
+
+def read_capture(directory):
+    """Yield every record in a capture directory, all processes merged by timestamp."""
+    processes = {}
+    for name in os.listdir(directory):
+        match = _SEGMENT_NAME.match(name)
+        if match:
+            pid, sequence = int(match.group(1)), int(match.group(2))
+            processes.setdefault(pid, []).append((sequence, os.path.join(directory, name)))
+    streams = [itertools.chain.from_iterable(read_segment(path, pid) for _, path in sorted(segments))
+               for pid, segments in processes.items()]
+    return heapq.merge(*streams, key=lambda record: record.timestamp)
+
+
+def add_capture_arguments(parser):
+    """Add the capture command-line options shared by every server."""
+    parser.add_argument("--capture", metavar='DIR', default=None,
+                        help="Append every request and response to a capture log in DIR (see bench_replay.py)")
+    parser.add_argument("--capture-segment-size", type=int, default=DEFAULT_SEGMENT_SIZE // (1024 * 1024),
+                        metavar='MB', help=f"Capture segment size in MiB "
+                                           f"(default: {DEFAULT_SEGMENT_SIZE // (1024 * 1024)})")
+    parser.add_argument("--capture-max-segments", type=int, default=0,
+                        help="Keep only the newest N segments per process (default: 0 = all)")
+
+
+def capture_from_args(args):
+    """Build a CaptureLog from parsed command-line arguments, or None if capture is off."""
+    if not args.capture:
+        return None
+    return CaptureLog(args.capture, args.capture_segment_size * 1024 * 1024, args.capture_max_segments)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Frame payload codecs: JSON (default) and a compact tag-based binary encoding.
+
+Binary payloads start with ENVELOPE_MARKER (0xB0, never the first byte of a
+JSON document) followed by envelope fields, each a one-byte field tag and a
+value:
+
+  0x01 message_id   0x02 type   0x03 timestamp   0x04 attributes
+  0x0F any other top-level key (a string value with the key, then the value)
+
+Values are self-describing, one tag byte then the body:
+
+  0x00 null     0x01 false    0x02 true
+  0x03 integer  zigzag varint (any size)
+  0x04 float    8-byte little-endian IEEE 754 double
+  0x05 string   varint byte length + UTF-8
+  0x06 array    varint count + values
+  0x07 object   varint count + (varint length + UTF-8 key, value) pairs
+  0x08 array of floats   varint count + packed little-endian doubles
+  0x09 array of integers varint count + packed little-endian int64
+
+Arrays whose items are all floats (or all int64-range integers) are packed as
+one block, so number-heavy attributes skip per-value formatting and parsing.
+
+A connection uses JSON until the client's first frame is a HANDSHAKE:
+  {"type": "HANDSHAKE", "attributes": {"codecs": ["binary", "json"]}}
+The server answers, in JSON, with the first codec it supports:
+  {"type": "HANDSHAKE_ACK", "attributes": {"codec": "binary"}}
+and both directions use that codec for every later frame.
+"""
+
+import struct
+import sys
+from array import array
+
+from python_framing import decode_payload, encode_payload
+from python_validation import error_response
+
+ENVELOPE_MARKER = 0xB0
+ENVELOPE_FIELDS = ('message_id', 'type', 'timestamp', 'attributes')
+FIELD_TAGS = {name: index + 1 for index, name in enumerate(ENVELOPE_FIELDS)}
+EXTRA_FIELD_TAG = 0x0F
+
+NULL, FALSE, TRUE, INTEGER, FLOAT, STRING, ARRAY, OBJECT, FLOAT_ARRAY, INT_ARRAY = range(10)
+
+HANDSHAKE_TYPE = 'HANDSHAKE'
+HANDSHAKE_ACK_TYPE = 'HANDSHAKE_ACK'
+
+DOUBLE = struct.Struct('<d')
+_pack_double = DOUBLE.pack
+_unpack_double = DOUBLE.unpack_from
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    result = byte & 0x7F
+    shift = 7
+    pos += 1
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _write_string(out, text):
+    encoded = text.encode('utf-8')
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _read_string(data, pos):
+    length = data[pos]
+    if length < 0x80:
+        pos += 1
+    else:
+        length, pos = _read_varint(data, pos)
+    end = pos + length
+    if end > len(data):
+        raise ValueError("Truncated binary payload: string runs past the end")
+    return data[pos:end].decode('utf-8'), end
+
+
+def _packed(values, typecode):
+    packed = array(typecode, values)
+    if not LITTLE_ENDIAN:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _write_value(out, value):
+    kind = type(value)
+    if kind is str:
+        out.append(STRING)
+        _write_string(out, value)
+    elif kind is float:
+        out.append(FLOAT)
+        out += _pack_double(value)
+    elif kind is int:
+        out.append(INTEGER)
+        _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+    elif kind is bool:
+        out.append(TRUE if value else FALSE)
+    elif value is None:
+        out.append(NULL)
+    elif kind is dict:
+        out.append(OBJECT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            _write_string(out, str(key))
+            _write_value(out, item)
+    elif kind is list or kind is tuple:
+        kinds = set(map(type, value))
+        if kinds == {float}:
+            out.append(FLOAT_ARRAY)
+            _write_varint(out, len(value))
+            out += _packed(value, 'd')
+        elif kinds == {int} and INT64_MIN <= min(value) and max(value) <= INT64_MAX:
+            out.append(INT_ARRAY)
+            _write_varint(out, len(value))
+            out += _packed(value, 'q')
+        else:
+            out.append(ARRAY)
+            _write_varint(out, len(value))
+            for item in value:
+                _write_value(out, item)
+    else:
+        raise TypeError(f"Object of type {kind.__name__} is not serializable")
+
+
+def _read_packed(data, pos, typecode):
+    count, pos = _read_varint(data, pos)
+    end = pos + count * 8
+    if end > len(data):
+        raise ValueError("Truncated binary payload: packed array runs past the end")
+    packed = array(typecode)
+    packed.frombytes(data[pos:end])
+    if not LITTLE_ENDIAN:
+        packed.byteswap()
+    return packed.tolist(), end
+
+
+def _read_value(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag == STRING:
+        return _read_string(data, pos)
+    if tag == FLOAT:
+        return _unpack_double(data, pos)[0], pos + 8
+    if tag == INTEGER:
+        raw, pos = _read_varint(data, pos)
+        return (raw >> 1) if not raw & 1 else -((raw + 1) >> 1), pos
+    if tag == OBJECT:
+        count, pos = _read_varint(data, pos)
+        if count > len(data) - pos:
+            raise ValueError("Truncated binary payload: object count runs past the end")
+        result = {}
+        for _ in range(count):
+            key, pos = _read_string(data, pos)
+            result[key], pos = _read_value(data, pos)
+        return result, pos
+    if tag == TRUE:
+        return True, pos
+    if tag == FALSE:
+        return False, pos
+    if tag == FLOAT_ARRAY:
+        return _read_packed(data, pos, 'd')
+    if tag == INT_ARRAY:
+        return _read_packed(data, pos, 'q')
+    if tag == ARRAY:
+        count, pos = _read_varint(data, pos)
+        if count > len(data) - pos:
+            raise ValueError("Truncated binary payload: array count runs past the end")
+        result = [None] * count
+        for index in range(count):
+            result[index], pos = _read_value(data, pos)
+        return result, pos
+    if tag == NULL:
+        return None, pos
+    raise ValueError(f"Unknown value tag 0x{tag:02x} at offset {pos - 1}")
+
+
+def encode_binary(message):
+    """Encode a message dict as a binary payload."""
+    out = bytearray((ENVELOPE_MARKER,))
+    for key, value in message.items():
+        tag = FIELD_TAGS.get(key)
+        if tag is None:
+            out.append(EXTRA_FIELD_TAG)
+            _write_string(out, str(key))
+        else:
+            out.append(tag)
+        _write_value(out, value)
+    return bytes(out)
+
+
+def decode_binary(payload):
+    """Decode a binary payload (bytes, bytearray or memoryview) into a message dict."""
+    data = bytes(payload)  # indexing bytes is cheaper than indexing a memoryview
+    if not len(data) or data[0] != ENVELOPE_MARKER:
+        raise ValueError("Not a binary simple_python payload")
+    message = {}
+    pos = 1
+    end = len(data)
+    try:
+        while pos < end:
+            tag = data[pos]
+            pos += 1
+            if tag == EXTRA_FIELD_TAG:
+                key, pos = _read_string(data, pos)
+            elif 1 <= tag <= len(ENVELOPE_FIELDS):
+                key = ENVELOPE_FIELDS[tag - 1]
+            else:
+                raise ValueError(f"Unknown envelope field tag 0x{tag:02x}")
+            message[key], pos = _read_value(data, pos)
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"Truncated binary payload: {e}")
+    return message
+
+
+class JSONCodec:
+    name = 'json'
+    encode = staticmethod(encode_payload)
+    decode = staticmethod(decode_payload)
+
+
+class BinaryCodec:
+    name = 'binary'
+    encode = staticmethod(encode_binary)
+    decode = staticmethod(decode_binary)
+
+
+CODECS = {codec.name: codec for codec in (JSONCodec, BinaryCodec)}
+DEFAULT_CODEC = JSONCodec
+DECODE_ERRORS = (ValueError, UnicodeDecodeError)  # json.JSONDecodeError is a ValueError
+
+
+def is_handshake(message):
+    """True if the message is a codec HANDSHAKE."""
+    return message.get("type") == HANDSHAKE_TYPE
+
+
+def negotiate(message, first_frame, supported=CODECS):
+    """Pick a codec for a HANDSHAKE and build its HANDSHAKE_ACK.
+
+    Returns (codec, response); codec is None if the handshake is refused
+    because it was not the first frame of the connection.
+    """
+    if not first_frame:
+        return None, error_response(message.get("message_id", "unknown"), "INVALID_HANDSHAKE",
+                                    "HANDSHAKE must be the first frame of a connection")
+    attributes = message.get("attributes") or {}
+    requested = attributes.get("codecs") or [DEFAULT_CODEC.name]
+    codec = next((supported[name] for name in requested if name in supported), DEFAULT_CODEC)
+    ack = {
+        "type": HANDSHAKE_ACK_TYPE,
+        "message_id": message.get("message_id", "unknown"),
+        "attributes": {"codec": codec.name, "supported": list(supported)}
+    }
+    return codec, ack
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Per-frame compression for the socket servers and HTTP /validate.
+
+Socket servers: the top bit of a frame's 4-byte length prefix (COMPRESSED_FLAG)
+marks a compressed payload; the remaining 31 bits are its compressed length.
+The payload starts with one algorithm byte:
+
+  0x01 zlib        deflate in a zlib wrapper
+  0x02 zlib-dict   the same with a preset dictionary, identified by the
+                   Adler-32 DICTID in the zlib header
+  0x03 lzma        LZMA in the .lzma ("alone") container
+
+Every server decompresses flagged frames from any client, bounded by
+max_frame_size. Responses are compressed only on connections that asked for
+it in their HANDSHAKE:
+
+  {"type": "HANDSHAKE", "attributes": {"codecs": ["json"], "compression": ["zlib-dict", "zlib"]}}
+
+The HANDSHAKE_ACK names the algorithm chosen (the client's first the server
+allows, or null) and the server's min_size. Payloads below min_size, or that
+do not shrink, are sent uncompressed, so small frames cost nothing.
+
+The preset dictionary is a block of strings typical of simple_python message
+envelopes (DEFAULT_DICTIONARY), or one trained on captured messages with
+`python3 python_compression.py train messages.jsonl -o dict.bin` and loaded
+with --compression-dictionary; `python3 python_compression.py dictionary -o
+dict.bin` writes the default one for clients.
+
+HTTP: a /validate body may carry "Content-Encoding: gzip", "deflate" or "xz"
+(both HTTP engines), and on the asyncio engine a response body of at least
+min_size is compressed when the request's Accept-Encoding allows one of them.
+"""
+
+import argparse
+import gzip
+import json
+import lzma
+import re
+import sys
+import zlib
+from collections import Counter
+
+COMPRESSED_FLAG = 0x80000000
+LENGTH_MASK = 0x7FFFFFFF
+
+ZLIB, ZLIB_DICT, LZMA = 0x01, 0x02, 0x03
+ALGORITHMS = {'zlib': ZLIB, 'zlib-dict': ZLIB_DICT, 'lzma': LZMA}
+ALGORITHM_NAMES = {value: name for name, value in ALGORITHMS.items()}
+HTTP_ENCODINGS = ('gzip', 'deflate', 'xz')
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVEL = 6
+MAX_DICTIONARY_SIZE = 32 * 1024  # the deflate window
+
+DEFAULT_SAMPLES = [
+    {"type": "VALIDATION_REQUEST", "message_id": "msg_000001", "timestamp": "2026-01-28T00:00:00",
+     "attributes": {"validator": "range_check", "board_id": "B-001", "voltage": 3.3, "current": 0.5,
+                    "temperature": 25.0, "samples": [0.0, 0.5, 1.0]}},
+    {"type": "VALIDATION_RESPONSE", "message_id": "msg_000001",
+     "attributes": {"result": "PASS", "message": "Message received and validated",
+                    "echoed_message_id": "msg_000001", "failed_attributes": []}},
+    {"type": "VALIDATION_RESPONSE", "message_id": "msg_000002",
+     "attributes": {"result": "FAIL", "score": 0.95, "failed_attributes": ["voltage"]}},
+    {"type": "VALIDATION_BATCH", "message_id": "batch_1", "attributes": {"requests": []}},
+    {"type": "VALIDATION_BATCH_RESPONSE", "message_id": "batch_1",
+     "attributes": {"count": 1, "errors": 0, "responses": []}},
+    {"type": "ERROR", "message_id": "unknown",
+     "attributes": {"error_code": "VALIDATION_FAILED", "error_message": "Invalid JSON received"}},
+    {"type": "PYTHON_VALIDATION_REQUEST", "message_id": "msg_000003", "timestamp": "2026-01-28T00:00:00",
+     "attributes": {"board_id": "B-002", "index": 1}},
+]
+
+_FRAGMENT = re.compile(r'"(?:[^"\\]|\\.)*"(?:: )?|[-0-9.eE]+|[\[\]{},: ]+|true|false|null')
+
+
+def train_dictionary(messages, size=MAX_DICTIONARY_SIZE):
+    """Build a preset dictionary from sample messages (dicts or JSON strings).
+
+    Frequent JSON fragments (keys with their ': ', string values, punctuation
+    runs) are kept by frequency x length; the most useful ones go last, where
+    deflate reaches them with the shortest distances.
+    """
+    counts = Counter()
+    for message in messages:
+        text = message if isinstance(message, str) else json.dumps(message)
+        counts.update(fragment for fragment in _FRAGMENT.findall(text) if len(fragment) > 2)
+    ranked = sorted(counts, key=lambda fragment: (counts[fragment] * len(fragment), fragment), reverse=True)
+    chosen, total = [], 0
+    for fragment in ranked:
+        encoded = fragment.encode('utf-8')
+        if total + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+DEFAULT_DICTIONARY = train_dictionary(DEFAULT_SAMPLES * 4)
+_dictionaries = {zlib.adler32(DEFAULT_DICTIONARY): DEFAULT_DICTIONARY}
+
+
+def register_dictionary(dictionary):
+    """Make a preset dictionary available for decompression; returns its Adler-32 id."""
+    dictionary_id = zlib.adler32(dictionary)
+    _dictionaries[dictionary_id] = dictionary
+    return dictionary_id
+
+
+class CompressionError(ValueError):
+    """A compressed payload that cannot be decompressed."""
+
+
+class DecompressedTooLargeError(CompressionError):
+    """A compressed payload that would expand beyond the size limit."""
+
+    def __init__(self, max_size):
+        super().__init__(f"Decompressed payload exceeds the limit of {max_size} bytes")
+        self.max_size = max_size
+
+
+class CompressedPayload(bytes):
+    """A compressed frame payload; write_frame()/send_frame() flag it in the length prefix."""
+
+
+def _bounded(decompressor, data, max_size):
+    limit = -1 if max_size is None else max_size + 1
+    try:
+        output = decompressor.decompress(data, limit) if limit > 0 else decompressor.decompress(data)
+    except (zlib.error, lzma.LZMAError, EOFError) as e:
+        raise CompressionError(f"Corrupt compressed payload: {e}")
+    if max_size is not None and len(output) > max_size:
+        raise DecompressedTooLargeError(max_size)
+    if not decompressor.eof:
+        raise CompressionError("Truncated compressed payload")
+    return output
+
+
+def decompress_payload(payload, max_size=None):
+    """Decompress a flagged frame payload (algorithm byte + data) into bytes."""
+    if not payload:
+        raise CompressionError("Empty compressed payload")
+    algorithm, data = payload[0], payload[1:]
+    if algorithm == ZLIB:
+        return _bounded(zlib.decompressobj(), data, max_size)
+    if algorithm == ZLIB_DICT:
+        if len(data) < 6 or not data[1] & 0x20:
+            raise CompressionError("zlib-dict payload without a dictionary id")
+        dictionary_id = int.from_bytes(data[2:6], 'big')
+        dictionary = _dictionaries.get(dictionary_id)
+        if dictionary is None:
+            raise CompressionError(f"Unknown preset dictionary {dictionary_id:#010x}")
+        return _bounded(zlib.decompressobj(zdict=dictionary), data, max_size)
+    if algorithm == LZMA:
+        return _bounded(lzma.LZMADecompressor(lzma.FORMAT_ALONE), data, max_size)
+    raise CompressionError(f"Unknown compression algorithm {algorithm:#04x}")
+
+
+class Compressor:
+    """Compresses outgoing payloads of at least min_size with one algorithm."""
+
+    def __init__(self, algorithm='zlib', level=DEFAULT_LEVEL, min_size=DEFAULT_MIN_SIZE,
+                 dictionary=DEFAULT_DICTIONARY):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown compression algorithm: {algorithm}")
+        self.name = algorithm
+        self.algorithm = ALGORITHMS[algorithm]
+        self.level = level
+        self.min_size = min_size
+        self.dictionary = dictionary
+
+    def compress(self, payload):
+        """The CompressedPayload for `payload`, or `payload` itself if too small or incompressible."""
+        if len(payload) < self.min_size:
+            return payload
+        if self.algorithm == LZMA:
+            data = lzma.compress(payload, lzma.FORMAT_ALONE, preset=min(self.level, 9))
+        else:
+            zdict = {'zdict': self.dictionary} if self.algorithm == ZLIB_DICT else {}
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 15, **zdict)
+            data = compressor.compress(payload) + compressor.flush()
+        if len(data) + 1 >= len(payload):
+            return payload
+        return CompressedPayload(bytes((self.algorithm,)) + data)
+
+
+class CompressingCodec:
+    """A connection codec whose encoded payloads are compressed (see python_codec)."""
+
+    def __init__(self, codec, compressor):
+        self.codec = codec
+        self.compressor = compressor
+        self.name = codec.name
+        self.decode = codec.decode
+
+    def encode(self, message):
+        return self.compressor.compress(self.codec.encode(message))
+
+
+class CompressionSettings:
+    """Which algorithms a server offers and how it compresses (per server, shared by connections)."""
+
+    def __init__(self, algorithms=tuple(ALGORITHMS), level=DEFAULT_LEVEL, min_size=DEFAULT_MIN_SIZE,
+                 dictionary=DEFAULT_DICTIONARY):
+        unknown = [name for name in algorithms if name not in ALGORITHMS]
+        if unknown:
+            raise ValueError(f"Unknown compression algorithm(s): {', '.join(unknown)}")
+        self.algorithms = list(algorithms)
+        self.level = level
+        self.min_size = min_size
+        self.dictionary = dictionary
+        register_dictionary(dictionary)
+
+    def description(self):
+        """Describe the compression settings for the startup line."""
+        if not self.algorithms:
+            return "compression=off"
+        return f"compression={'/'.join(self.algorithms)}(level={self.level}, min_size={self.min_size})"
+
+    def negotiate(self, message, ack):
+        """Pick the HANDSHAKE's preferred allowed algorithm, record it in `ack`; returns a Compressor or None."""
+        requested = (message.get("attributes") or {}).get("compression") or []
+        name = next((name for name in requested if name in self.algorithms), None)
+        ack["attributes"]["compression"] = name
+        ack["attributes"]["compression_min_size"] = self.min_size
+        if name is None:
+            return None
+        return Compressor(name, self.level, self.min_size, self.dictionary)
+
+    def wrap(self, codec, message, ack):
+        """The codec for a connection after its HANDSHAKE: `codec`, compressing if negotiated."""
+        compressor = self.negotiate(message, ack)
+        return CompressingCodec(codec, compressor) if compressor else codec
+
+    def decode_body(self, body, content_encoding, max_size=None):
+        """Undo an HTTP Content-Encoding (ValueError for an unsupported one)."""
+        encoding = content_encoding.strip().lower()
+        if encoding in ('', 'identity'):
+            return body
+        if encoding == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            decompressor = zlib.decompressobj()
+        elif encoding == 'xz':
+            decompressor = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+        else:
+            raise CompressionError(f"Unsupported Content-Encoding: {content_encoding[:20]}")
+        return _bounded(decompressor, body, max_size)
+
+    def encode_body(self, body, accept_encoding):
+        """Compress an HTTP response body if the client accepts it; returns (body, encoding or None)."""
+        if not self.algorithms or len(body) < self.min_size:
+            return body, None
+        accepted = {token.split(';', 1)[0].strip().lower() for token in accept_encoding.split(',')}
+        encoding = next((encoding for encoding in HTTP_ENCODINGS if encoding in accepted), None)
+        if encoding == 'gzip':
+            encoded = gzip.compress(body, self.level, mtime=0)
+        elif encoding == 'deflate':
+            encoded = zlib.compress(body, self.level)
+        elif encoding == 'xz':
+            encoded = lzma.compress(body, lzma.FORMAT_XZ, preset=min(self.level, 9))
+        else:
+            return body, None
+        return (encoded, encoding) if len(encoded) < len(body) else (body, None)
+
+
+def algorithm_list(value):
+    """argparse type for --compression: comma-separated algorithm names, or 'none'."""
+    if value == 'none':
+        return []
+    algorithms = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in algorithms if name not in ALGORITHMS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown compression algorithm(s): {', '.join(unknown)}")
+    return algorithms
+
+
+def add_compression_arguments(parser):
+    """Add the compression command-line options shared by every server."""
+    parser.add_argument("--compression", type=algorithm_list, default=list(ALGORITHMS),
+                        help=f"Algorithms offered to clients, in preference order, or 'none' "
+                             f"(default: {','.join(ALGORITHMS)})")
+    parser.add_argument("--compression-level", type=int, default=DEFAULT_LEVEL,
+                        help=f"zlib/lzma compression level (default: {DEFAULT_LEVEL})")
+    parser.add_argument("--compression-min-size", type=int, default=DEFAULT_MIN_SIZE,
+                        help=f"Send payloads below N bytes uncompressed (default: {DEFAULT_MIN_SIZE})")
+    parser.add_argument("--compression-dictionary", default=None, metavar='PATH',
+                        help="Preset dictionary for zlib-dict (default: built-in envelope dictionary)")
+
+
+def compression_from_args(args):
+    """Build CompressionSettings from parsed command-line arguments."""
+    dictionary = DEFAULT_DICTIONARY
+    if args.compression_dictionary:
+        with open(args.compression_dictionary, 'rb') as dictionary_file:
+            dictionary = dictionary_file.read(MAX_DICTIONARY_SIZE)
+    return CompressionSettings(args.compression, args.compression_level, args.compression_min_size, dictionary)
+
+
+def main():
+    """Train or export a zlib-dict preset dictionary."""
+    parser = argparse.ArgumentParser(description="simple_python compression dictionaries")
+    commands = parser.add_subparsers(dest='command', required=True)
+    train = commands.add_parser('train', help="Train a dictionary on JSON-lines message samples")
+    train.add_argument("samples", nargs='+', help="Files with one JSON message per line")
+    train.add_argument("--size", type=int, default=MAX_DICTIONARY_SIZE, help="Dictionary size in bytes")
+    train.add_argument("-o", "--output", required=True, help="Dictionary file to write")
+    export = commands.add_parser('dictionary', help="Write the built-in dictionary")
+    export.add_argument("-o", "--output", required=True, help="Dictionary file to write")
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        messages = []
+        for path in args.samples:
+            with open(path) as samples:
+                messages.extend(line.strip() for line in samples if line.strip())
+        dictionary = train_dictionary(messages, args.size)
+    else:
+        dictionary = DEFAULT_DICTIONARY
+    with open(args.output, 'wb') as output:
+        output.write(dictionary)
+    print(f"Wrote {len(dictionary)} bytes (id {zlib.adler32(dictionary):#010x}) to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
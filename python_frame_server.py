@@ -0,0 +1,783 @@
+#!/usr/bin/env python3
+"""
+Shared core for the length-prefixed TCP servers (IPC on 9001, gRPC on 9002).
+
+Two engines are available:
+  asyncio   - one event loop serves every connection (default)
+  threaded  - one daemon thread per accepted connection (legacy behaviour)
+
+By default each connection is lock-step: one request frame, one response frame.
+In multiplex mode a client may keep many frames in flight on one connection;
+they are validated concurrently on a handler thread pool and the responses are
+written in completion order, correlated by their message_id.
+
+Instead of TCP, a server can listen on a Unix domain stream socket (--unix PATH);
+a PATH starting with '@' names a Linux abstract-namespace socket. With --shm PATH
+it serves a shared-memory ring-buffer channel instead (see python_shm_transport).
+
+Frames are JSON unless the client's first frame is a HANDSHAKE negotiating the
+binary codec (see python_codec). Frames flagged as compressed are decompressed
+on arrival; responses are compressed when the HANDSHAKE asked for it (see
+python_compression).
+
+A STATS frame is answered with a STATS_RESPONSE carrying a snapshot of the
+server's metrics (see python_metrics); a PING frame with a PONG. A request
+with "server_timing": true gets its read/decode/validate durations back in
+its response's attributes["server_timing"]. A PROFILE frame starts a
+sampling profile of the running server (see python_profiling).
+
+A request naming a "stream" attribute is validated while that attribute's
+STREAM_CHUNK continuation frames are still arriving, on a thread of its own,
+with at most a window of chunks buffered (see python_streaming). In lock-step
+mode its response is sent once its STREAM_END has been read.
+
+Connections, requests in flight, frame size and per-connection queue depth are
+limited by an AdmissionControl; what is over a limit is answered with an
+OVERLOADED ERROR instead of being queued (see python_admission). Connections
+that idle, trickle a frame or stop reading responses past their timeouts are
+closed (see python_timeouts).
+
+SIGTERM drains the server: it stops accepting, answers the frames already
+read and closes each connection once it has nothing in flight, within
+--drain-timeout. SIGHUP reloads the --validators modules and restarts the
+validator pool without closing a connection (see python_lifecycle).
+
+With --workers N a master process runs N copies of the server sharing the
+port (see python_workers).
+
+With --capture DIR every connection, request frame and response is appended to
+a capture log for bench_replay.py (see python_capture); the shared-memory
+channel is not captured.
+
+Once listening, a server reports its address (the real port when asked for
+port 0) through --ready-fd / --notify-socket (see python_readiness).
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock, Thread
+
+from python_admission import (FRAME_TOO_LARGE, QUEUE_FULL, TOO_MANY_CONNECTIONS, TOO_MANY_IN_FLIGHT,
+                              AdmissionControl, add_admission_arguments, admission_from_args)
+from python_capture import FRAME, add_capture_arguments, capture_from_args
+from python_codec import DECODE_ERRORS, DEFAULT_CODEC, is_handshake, negotiate
+from python_compression import CompressionError, CompressionSettings, add_compression_arguments, \
+    compression_from_args
+from python_framing import (LENGTH_PREFIX, FrameReader, FrameTooLargeError, IncompleteFrameError, encode_payload,
+                            read_frame_timed, send_frame, set_nodelay, write_frame)
+from python_lifecycle import add_lifecycle_arguments, drain_connections, drain_connections_async, \
+    install_signal_handlers
+from python_logging import SHUTDOWN, STARTUP, add_logging_arguments, configure_logging_from_args, fields, log, message_log
+from python_metrics import (MetricsRegistry, ServerTiming, TransportMetrics, is_stats_request, stats_response,
+                            wants_server_timing)
+from python_profiling import StackSampler, add_profiling_arguments, is_profile_request, profiler_from_args
+from python_readiness import add_readiness_arguments, notifier_from_args
+from python_shm_transport import DEFAULT_SLOT_COUNT, DEFAULT_SLOT_SIZE, ShmServer
+from python_streaming import (StreamError, StreamTable, chunk_items, feed_async, is_continuation, run_in_thread,
+                              stream_error, streamed_attribute)
+from python_timeouts import (ConnectionTimeouts, DeadlineHeap, add_timeout_arguments, shutdown_socket, stop_stream,
+                             timeouts_from_args)
+from python_validation import is_ping, pong_response, validation_response
+from python_validators import ValidationService, add_validation_arguments, validation_service_from_args
+from python_workers import Worker, add_worker_arguments, run_master
+
+ENGINES = ('asyncio', 'threaded')
+DEFAULT_BACKLOG = 128
+
+
+class FrameServer:
+    """Base class for servers speaking 4-byte length prefix + JSON frames."""
+
+    name = 'Frame'
+    response_text = 'Message received and validated'
+
+    def __init__(self, port, host='127.0.0.1', engine='asyncio', backlog=DEFAULT_BACKLOG,
+                 multiplex=False, handler_threads=None, unix_path=None,
+                 shm_path=None, shm_slot_size=DEFAULT_SLOT_SIZE, shm_slots=DEFAULT_SLOT_COUNT,
+                 validation=None, metrics=None, admission=None, listen_socket=None, on_ready=None,
+                 compression=None, capture=None, profiler=None, timeouts=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        self.host = host
+        self.port = port
+        self.engine = engine
+        self.backlog = backlog
+        self.multiplex = multiplex
+        self.handler_threads = handler_threads
+        self.unix_path = unix_path
+        self.shm_path = shm_path
+        self.shm_slot_size = shm_slot_size
+        self.shm_slots = shm_slots
+        self.shm_server = None
+        self.validation = validation or ValidationService()
+        self.metrics = metrics or MetricsRegistry()
+        self.stats = TransportMetrics(self.metrics, self.transport_name(), server=self.name.lower())
+        self.validation.bind_metrics(self.metrics)
+        self.admission = admission or AdmissionControl()
+        self.compression = compression or CompressionSettings()
+        self.capture = capture
+        self.profiler = profiler or StackSampler()
+        self.timeouts = timeouts or ConnectionTimeouts()
+        self.deadlines = None
+        self.drain_deadline = None
+        self.listen_socket = listen_socket
+        self.on_ready = on_ready
+        self.executor = None
+        self.server = None
+        self.running = False
+        self.loop = None
+        self._stopped = None
+
+    def start(self):
+        """Start the server with the configured engine (blocks until stopped)."""
+        self.validation.start()
+        if self.uses_handler_pool():
+            self.executor = ThreadPoolExecutor(max_workers=self.handler_threads,
+                                               thread_name_prefix=f"{self.name}-handler")
+        try:
+            if self.shm_path:
+                self.serve_shm()
+            elif self.engine == 'asyncio':
+                asyncio.run(self.serve_async())
+            else:
+                self.start_threaded()
+        finally:
+            if self.executor:
+                self.executor.shutdown(wait=False)
+            self.validation.shutdown()
+            if self.capture:
+                self.capture.shutdown()
+            self.remove_unix_path()
+
+    def uses_handler_pool(self):
+        """True if requests are validated on the handler pool rather than the event loop."""
+        return self.multiplex or self.validation.blocking
+
+    def transport_name(self):
+        """Transport label for metrics: shm, unix or tcp."""
+        if self.shm_path:
+            return 'shm'
+        return 'unix' if self.unix_path else 'tcp'
+
+    def address_description(self):
+        """Describe the listening address for log lines."""
+        if self.shm_path:
+            return f"shm:{self.shm_path}"
+        if self.unix_path:
+            return f"unix:{self.unix_path}"
+        return f"{self.host}:{self.port}"
+
+    def bind_unix_path(self):
+        """Return the AF_UNIX address to bind, clearing a stale socket file."""
+        if self.unix_path.startswith('@'):
+            return '\0' + self.unix_path[1:]
+        if os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+        return self.unix_path
+
+    def remove_unix_path(self):
+        """Delete the socket file of a filesystem Unix socket we bound ourselves."""
+        if self.unix_path and not self.unix_path.startswith('@') and not self.listen_socket:
+            try:
+                os.unlink(self.unix_path)
+            except FileNotFoundError:
+                pass
+
+    def report_ready(self, sock=None):
+        """Record the bound port (port 0 picks a free one) and call on_ready with the address."""
+        if self.shm_path:
+            address = self.shm_path
+        elif self.unix_path:
+            address = self.unix_path
+        else:
+            self.port = sock.getsockname()[1]
+            address = self.port
+        if self.on_ready:
+            self.on_ready(address)
+
+    def mode_description(self):
+        """Describe the engine settings for the startup line."""
+        mode = 'multiplex' if self.multiplex else 'lock-step'
+        description = (f"engine={self.engine}, backlog={self.backlog}, mode={mode}, "
+                       f"{self.validation.description()}, {self.admission.description()}, "
+                       f"{self.compression.description()}, {self.timeouts.description()}")
+        if self.capture:
+            description += f", {self.capture.description()}"
+        return description
+
+    def handle_message(self, message_json, timer=None):
+        """Build the response for a decoded request, VALIDATION_BATCH, STATS, PING or PROFILE frame.
+
+        With a ServerTiming `timer` the response carries the request's stage timings.
+        """
+        self.stats.requests.inc()
+        response = self.control_response(message_json)
+        if response is not None:
+            stream = streamed_attribute(message_json)
+            if stream:
+                stream.abandon()  # never validated: its chunks are read and dropped
+            return response
+        start = time.perf_counter_ns()
+        response = self.validation.handle(message_json, self.default_response)
+        elapsed = time.perf_counter_ns() - start
+        self.stats.validate.observe_ns(elapsed)
+        if timer:
+            timer.add('validate', elapsed)
+            response = timer.attach(response)
+        return response
+
+    def control_response(self, message_json):
+        """The answer to a STATS, PING or PROFILE frame, or None for a request to validate."""
+        if is_stats_request(message_json):
+            return stats_response(message_json, self.metrics)
+        if is_ping(message_json):
+            return pong_response(message_json)
+        if is_profile_request(message_json):
+            return self.profiler.respond(message_json)
+        return None
+
+    def shed(self, message_json, reason, streams=None):
+        """Count a request (or connection) shed for `reason` and build its OVERLOADED answer.
+
+        A shed streamed request's continuation frames are still read, then dropped.
+        """
+        self.stats.rejected(reason)
+        stream = streams and streams.streams.get(message_json.get("message_id", "unknown"))
+        if stream:
+            stream.abandon()
+        message_id = message_json.get("message_id", "unknown")
+        log.debug("Shedding %s: %s", message_id, reason)
+        return self.admission.rejection(message_id, reason)
+
+    def default_response(self, message_json):
+        """Build the built-in VALIDATION_RESPONSE for requests no validator claims."""
+        return validation_response(message_json.get("message_id", "unknown"), self.response_text)
+
+    def serve_shm(self):
+        """Serve a shared-memory ring-buffer channel on the calling thread."""
+        self.shm_server = ShmServer(self.shm_path, self.handle_message, slot_size=self.shm_slot_size,
+                                    slot_count=self.shm_slots, stats=self.stats)
+        self.running = True
+
+        def on_ready():
+            self.report_ready()
+            log.info("%s server listening on %s (slots=%d, slot_size=%d, %s)",
+                     self.name, self.address_description(), self.shm_slots, self.shm_slot_size,
+                     self.validation.description(), extra=STARTUP)
+
+        self.shm_server.serve_forever(on_ready)
+
+    # asyncio engine
+
+    async def serve_async(self):
+        """Serve all connections from a single event loop."""
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.deadlines = DeadlineHeap(self.timeouts, self.stats)
+        if self.listen_socket:
+            start = asyncio.start_unix_server if self.unix_path else asyncio.start_server
+            self.server = await start(self.handle_stream, sock=self.listen_socket, backlog=self.backlog)
+        elif self.unix_path:
+            self.server = await asyncio.start_unix_server(
+                self.handle_stream, self.bind_unix_path(), backlog=self.backlog)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle_stream, self.host, self.port, backlog=self.backlog)
+        self.running = True
+        self.report_ready(self.server.sockets[0])
+
+        log.info("%s server listening on %s (%s)",
+                 self.name, self.address_description(), self.mode_description(), extra=STARTUP)
+
+        sweeper = asyncio.ensure_future(self.deadlines.run_async()) if self.timeouts.enabled else None
+        try:
+            await self._stopped.wait()
+        finally:
+            self.running = False
+            self.server.close()
+            if self.drain_deadline:
+                await drain_connections_async(self.deadlines, self.drain_deadline)
+            if sweeper:
+                sweeper.cancel()
+            await self.server.wait_closed()
+
+    async def handle_stream(self, reader, writer):
+        """Handle a single client connection on the event loop."""
+        addr = writer.get_extra_info('peername')
+        if not self.admission.open_connection():
+            log.warning("Rejecting connection: at max_connections", extra=fields(peer=addr))
+            write_frame(writer, encode_payload(self.shed({}, TOO_MANY_CONNECTIONS)))
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+            return
+        log.info("Client connected", extra=fields(peer=addr))
+        self.stats.connections.add(1)
+        connection = self.capture.open(writer, self.name.lower(), addr) if self.capture else None
+        write_lock = asyncio.Lock()
+        pending = set()
+        deadline = self.deadlines.track(writer, writer.transport.abort, stop_stream(reader, writer), addr,
+                                        busy=lambda: bool(pending))
+        streams = StreamTable()
+        codec = DEFAULT_CODEC
+        first_frame = True
+        try:
+            while self.running:
+                payload, read_ns = await read_frame_timed(reader, self.admission.max_frame_size, deadline)
+                if payload is None:
+                    break
+                self.stats.read.observe_ns(read_ns)
+                if connection:
+                    self.capture.record(connection, FRAME, payload)
+                self.stats.bytes_in.inc(LENGTH_PREFIX.size + len(payload))
+
+                start = time.perf_counter_ns()
+                try:
+                    message_json = codec.decode(payload)
+                except DECODE_ERRORS as e:
+                    log.error("%s decode error: %s", codec.name, e)
+                    self.stats.error(f"invalid_{codec.name}")
+                    break
+                decode_ns = time.perf_counter_ns() - start
+                self.stats.decode.observe_ns(decode_ns)
+                timer = ServerTiming(read=read_ns, decode=decode_ns) if wants_server_timing(message_json) else None
+                message_log.info("Message received", message_id=message_json.get('message_id', 'unknown'))
+
+                if is_handshake(message_json):
+                    negotiated, ack = negotiate(message_json, first_frame)
+                    if negotiated:
+                        negotiated = self.compression.wrap(negotiated, message_json, ack)
+                    ack_payload = encode_payload(ack) if negotiated else codec.encode(ack)
+                    async with write_lock:
+                        write_frame(writer, ack_payload)
+                        await writer.drain()
+                    codec = negotiated or codec
+                elif is_continuation(message_json):
+                    await self.continue_stream_async(streams, message_json, writer, write_lock, codec)
+                elif not await self.open_stream_async(streams, message_json, writer, write_lock, codec):
+                    pass
+                elif self.multiplex and self.admission.queue_full(len(pending)):
+                    await self.send_async(self.shed(message_json, QUEUE_FULL, streams), writer, write_lock, codec)
+                elif not self.admission.begin():
+                    await self.send_async(self.shed(message_json, TOO_MANY_IN_FLIGHT, streams), writer, write_lock,
+                                          codec)
+                elif self.multiplex or message_json.get("message_id", "unknown") in streams.streams:
+                    task = asyncio.ensure_future(self.respond_async(message_json, writer, write_lock, codec, timer))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    task.add_done_callback(self.admission.end)
+                    streams.track(message_json, task)
+                else:
+                    try:
+                        await self.respond_async(message_json, writer, write_lock, codec, timer)
+                    finally:
+                        self.admission.end()
+                first_frame = False
+
+            if pending:
+                await asyncio.gather(*pending)
+
+        except asyncio.IncompleteReadError:
+            if not deadline.expired:
+                log.error("Client disconnected mid-frame", extra=fields(peer=addr))
+                self.stats.error('incomplete_message')
+        except CompressionError as e:
+            log.error("Decompression error: %s", e, extra=fields(peer=addr))
+            self.stats.error('invalid_compression')
+        except FrameTooLargeError as e:
+            # the payload is never read, so the stream cannot be resynchronized
+            log.warning("Closing connection: %s", e, extra=fields(peer=addr))
+            try:
+                await self.send_async(self.shed({}, FRAME_TOO_LARGE), writer, write_lock, codec)
+            except ConnectionError:
+                pass
+        except Exception as e:
+            log.error("Client handler error: %s", e, extra=fields(peer=addr))
+            self.stats.error('handler_exception')
+        finally:
+            streams.abort_all()
+            for task in pending:
+                task.cancel()
+            self.deadlines.forget(writer)
+            if connection:
+                self.capture.close(writer)
+            writer.close()
+            self.admission.close_connection()
+            self.stats.connections.add(-1)
+            log.info("Client disconnected", extra=fields(peer=addr))
+
+    async def open_stream_async(self, streams, message_json, writer, write_lock, codec=DEFAULT_CODEC):
+        """Open the request's stream if it names one; False (after answering) if malformed."""
+        try:
+            streams.open(message_json)
+            return True
+        except StreamError as e:
+            self.stats.error('invalid_stream')
+            await self.send_async(stream_error(message_json.get("message_id", "unknown"), e),
+                                  writer, write_lock, codec)
+            return False
+
+    async def continue_stream_async(self, streams, message_json, writer, write_lock, codec=DEFAULT_CODEC):
+        """Feed a STREAM_CHUNK to its stream, or end it on STREAM_END."""
+        try:
+            stream = streams.lookup(message_json)
+            items = chunk_items(message_json)
+        except StreamError as e:
+            self.stats.error('invalid_stream')
+            await self.send_async(stream_error(message_json.get("message_id", "unknown"), e),
+                                  writer, write_lock, codec)
+            return
+        if items is not None:
+            await feed_async(stream, items, self.loop)
+            return
+        response = streams.close(message_json)
+        if response is not None and not self.multiplex:
+            await response  # lock-step: answer before reading the next request
+
+    async def respond_async(self, message_json, writer, write_lock, codec=DEFAULT_CODEC, timer=None):
+        """Validate one admitted request and write its response frame."""
+        try:
+            if message_json.get("stream") is not None:
+                response = await asyncio.wrap_future(run_in_thread(self.handle_message, message_json, timer))
+            elif self.executor:
+                response = await self.loop.run_in_executor(
+                    self.executor, self.handle_message, message_json, timer)
+            else:
+                response = self.handle_message(message_json, timer)
+            await self.send_async(response, writer, write_lock, codec)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error("Handler error for %s: %s", message_json.get('message_id', 'unknown'), e)
+            self.stats.error('handler_exception')
+
+    async def send_async(self, response, writer, write_lock, codec=DEFAULT_CODEC):
+        """Encode one response and write it as a frame."""
+        start = time.perf_counter_ns()
+        payload = codec.encode(response)
+        self.stats.encode.observe_ns(time.perf_counter_ns() - start)
+        deadline = self.deadlines.get(writer) if self.deadlines else None
+        async with write_lock:
+            start = time.perf_counter_ns()
+            write_frame(writer, payload)
+            if deadline:
+                deadline.writing()
+            await writer.drain()
+            if deadline:
+                deadline.written()
+            self.stats.send.observe_ns(time.perf_counter_ns() - start)
+        self.stats.bytes_out.inc(LENGTH_PREFIX.size + len(payload))
+        if self.capture:
+            self.capture.response(writer, response.get("message_id", "unknown"))
+
+    # threaded engine
+
+    def start_threaded(self):
+        """Accept connections and serve each one on its own thread."""
+        self.deadlines = DeadlineHeap(self.timeouts, self.stats)
+        if self.listen_socket:
+            self.server = self.listen_socket
+        elif self.unix_path:
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(self.bind_unix_path())
+        else:
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server.bind((self.host, self.port))
+        self.server.listen(self.backlog)
+        self.running = True
+        self.report_ready(self.server)
+
+        log.info("%s server listening on %s (%s)",
+                 self.name, self.address_description(), self.mode_description(), extra=STARTUP)
+
+        if self.timeouts.enabled:
+            self.deadlines.run_thread(self.name)
+
+        while self.running:
+            try:
+                client, addr = self.server.accept()
+                log.info("Client connected", extra=fields(peer=addr))
+
+                # Handle client in a thread
+                Thread(target=self.handle_client, args=(client, addr), daemon=True).start()
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                if self.running:
+                    log.error("Accept error: %s", e)
+        if self.drain_deadline:
+            drain_connections(self.deadlines, self.drain_deadline)
+        self.deadlines.stop()
+
+    def handle_client(self, client, addr):
+        """Handle a single client connection."""
+        set_nodelay(client)
+        if not self.admission.open_connection():
+            log.warning("Rejecting connection: at max_connections", extra=fields(peer=addr))
+            try:
+                send_frame(client, encode_payload(self.shed({}, TOO_MANY_CONNECTIONS)))
+            except OSError:
+                pass
+            client.close()
+            return
+        self.stats.connections.add(1)
+        connection = self.capture.open(client, self.name.lower(), addr) if self.capture else None
+        send_lock = Lock()
+        pending = set()
+        deadline = self.deadlines.track(client, shutdown_socket(client), shutdown_socket(client, socket.SHUT_RD),
+                                        addr, busy=lambda: bool(pending))
+        reader = FrameReader(client, max_frame_size=self.admission.max_frame_size, deadline=deadline)
+        streams = StreamTable()
+        codec = DEFAULT_CODEC
+        first_frame = True
+        try:
+            while self.running:
+                payload = reader.read_frame()
+                if payload is None:
+                    break
+                read_ns = reader.read_ns
+                self.stats.read.observe_ns(read_ns)
+                log.debug("Received payload: %d bytes", len(payload))
+                if connection:
+                    self.capture.record(connection, FRAME, payload)
+                self.stats.bytes_in.inc(LENGTH_PREFIX.size + len(payload))
+
+                # Decode message straight from the read buffer
+                start = time.perf_counter_ns()
+                try:
+                    message_json = codec.decode(payload)
+                except DECODE_ERRORS as e:
+                    log.error("%s decode error: %s", codec.name, e)
+                    self.stats.error(f"invalid_{codec.name}")
+                    break
+                finally:
+                    payload.release()
+                decode_ns = time.perf_counter_ns() - start
+                self.stats.decode.observe_ns(decode_ns)
+                timer = ServerTiming(read=read_ns, decode=decode_ns) if wants_server_timing(message_json) else None
+                message_log.info("Message received", message_id=message_json.get('message_id', 'unknown'))
+
+                if is_handshake(message_json):
+                    negotiated, ack = negotiate(message_json, first_frame)
+                    if negotiated:
+                        negotiated = self.compression.wrap(negotiated, message_json, ack)
+                    ack_payload = encode_payload(ack) if negotiated else codec.encode(ack)
+                    with send_lock:
+                        send_frame(client, ack_payload)
+                    codec = negotiated or codec
+                elif is_continuation(message_json):
+                    self.continue_stream_threaded(streams, message_json, client, send_lock, codec)
+                elif not self.open_stream_threaded(streams, message_json, client, send_lock, codec):
+                    pass
+                elif self.multiplex and self.admission.queue_full(len(pending)):
+                    self.send_threaded(client, send_lock, self.shed(message_json, QUEUE_FULL, streams), codec)
+                elif not self.admission.begin():
+                    self.send_threaded(client, send_lock, self.shed(message_json, TOO_MANY_IN_FLIGHT, streams),
+                                       codec)
+                elif self.multiplex or message_json.get("message_id", "unknown") in streams.streams:
+                    if message_json.get("stream") is not None:
+                        future = run_in_thread(self.respond_threaded, client, send_lock, message_json, codec, timer)
+                    else:
+                        future = self.executor.submit(self.respond_threaded, client, send_lock, message_json,
+                                                      codec, timer)
+                    pending.add(future)
+                    future.add_done_callback(pending.discard)
+                    future.add_done_callback(self.admission.end)
+                    streams.track(message_json, future)
+                else:
+                    try:
+                        self.respond_threaded(client, send_lock, message_json, codec, timer)
+                    finally:
+                        self.admission.end()
+                first_frame = False
+
+        except IncompleteFrameError:
+            if not deadline.expired:
+                log.error("Client disconnected mid-frame", extra=fields(peer=addr))
+                self.stats.error('incomplete_message')
+        except CompressionError as e:
+            log.error("Decompression error: %s", e, extra=fields(peer=addr))
+            self.stats.error('invalid_compression')
+        except FrameTooLargeError as e:
+            # the payload is never read, so the stream cannot be resynchronized
+            log.warning("Closing connection: %s", e, extra=fields(peer=addr))
+            try:
+                self.send_threaded(client, send_lock, self.shed({}, FRAME_TOO_LARGE), codec)
+            except OSError:
+                pass
+        except Exception as e:
+            log.error("Client handler error: %s", e, extra=fields(peer=addr))
+            self.stats.error('handler_exception')
+        finally:
+            streams.abort_all()
+            wait(list(pending))
+            self.deadlines.forget(client)
+            if connection:
+                self.capture.close(client)
+            client.close()
+            self.admission.close_connection()
+            self.stats.connections.add(-1)
+            log.info("Client disconnected", extra=fields(peer=addr))
+
+    def open_stream_threaded(self, streams, message_json, client, send_lock, codec=DEFAULT_CODEC):
+        """Open the request's stream if it names one; False (after answering) if malformed."""
+        try:
+            streams.open(message_json)
+            return True
+        except StreamError as e:
+            self.stats.error('invalid_stream')
+            self.send_threaded(client, send_lock, stream_error(message_json.get("message_id", "unknown"), e),
+                               codec)
+            return False
+
+    def continue_stream_threaded(self, streams, message_json, client, send_lock, codec=DEFAULT_CODEC):
+        """Feed a STREAM_CHUNK to its stream (blocking while its window is full), or end it on STREAM_END."""
+        try:
+            stream = streams.lookup(message_json)
+            items = chunk_items(message_json)
+        except StreamError as e:
+            self.stats.error('invalid_stream')
+            self.send_threaded(client, send_lock, stream_error(message_json.get("message_id", "unknown"), e),
+                               codec)
+            return
+        if items is not None:
+            stream.feed(items)
+            return
+        response = streams.close(message_json)
+        if response is not None and not self.multiplex:
+            wait([response])  # lock-step: answer before reading the next request
+
+    def respond_threaded(self, client, send_lock, message_json, codec=DEFAULT_CODEC, timer=None):
+        """Validate one admitted request and send its response frame."""
+        try:
+            response = self.handle_message(message_json, timer)
+            self.send_threaded(client, send_lock, response, codec)
+        except Exception as e:
+            log.error("Handler error for %s: %s", message_json.get('message_id', 'unknown'), e)
+            self.stats.error('handler_exception')
+
+    def send_threaded(self, client, send_lock, response, codec=DEFAULT_CODEC):
+        """Encode one response and send it as a frame."""
+        start = time.perf_counter_ns()
+        payload = codec.encode(response)
+        self.stats.encode.observe_ns(time.perf_counter_ns() - start)
+        log.debug("Sending response: %d bytes", len(payload))
+        deadline = self.deadlines.get(client) if self.deadlines else None
+        with send_lock:
+            start = time.perf_counter_ns()
+            if deadline:
+                deadline.writing()
+            send_frame(client, payload)
+            if deadline:
+                deadline.written()
+            self.stats.send.observe_ns(time.perf_counter_ns() - start)
+        self.stats.bytes_out.inc(LENGTH_PREFIX.size + len(payload))
+        if self.capture:
+            self.capture.response(client, response.get("message_id", "unknown"))
+
+    def drain(self, timeout):
+        """Stop accepting and let open connections finish within `timeout` seconds, then stop (SIGTERM)."""
+        log.info("%s server draining (up to %gs)...", self.name, timeout, extra=SHUTDOWN)
+        self.drain_deadline = time.monotonic() + timeout
+        self.stop()
+
+    def stop(self):
+        """Stop the server (safe to call from any thread)."""
+        self.running = False
+        if self.shm_server:
+            self.shm_server.stop()
+        elif self.engine == 'asyncio':
+            if self.loop and self._stopped and not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self._stopped.set)
+        elif self.server:
+            self.server.close()
+
+
+def parse_server_args(default_port, argv=None):
+    """Parse the common command line of the frame servers."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("port", type=int, nargs='?', default=default_port, help="Port to listen on")
+    parser.add_argument("--host", default='127.0.0.1', help="Address to bind")
+    parser.add_argument("--engine", choices=ENGINES, default='asyncio',
+                        help="Connection engine (default: asyncio)")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help=f"Listen backlog (default: {DEFAULT_BACKLOG})")
+    parser.add_argument("--multiplex", action='store_true',
+                        help="Process pipelined frames concurrently, reply in completion order")
+    parser.add_argument("--handler-threads", type=int, default=None,
+                        help="Handler pool size in multiplex mode (default: executor default)")
+    parser.add_argument("--unix", metavar='PATH', default=None,
+                        help="Listen on a Unix domain socket instead of TCP ('@name' = abstract namespace)")
+    parser.add_argument("--shm", metavar='PATH', default=None,
+                        help="Serve a shared-memory ring-buffer channel at PATH (e.g. /dev/shm/simple_python)")
+    parser.add_argument("--shm-slot-size", type=int, default=DEFAULT_SLOT_SIZE,
+                        help=f"Bytes per ring slot, including the length prefix (default: {DEFAULT_SLOT_SIZE})")
+    parser.add_argument("--shm-slots", type=int, default=DEFAULT_SLOT_COUNT,
+                        help=f"Slots per ring (default: {DEFAULT_SLOT_COUNT})")
+    add_validation_arguments(parser)
+    add_admission_arguments(parser)
+    add_compression_arguments(parser)
+    add_capture_arguments(parser)
+    add_profiling_arguments(parser)
+    add_timeout_arguments(parser)
+    add_lifecycle_arguments(parser)
+    add_worker_arguments(parser)
+    add_readiness_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.shm:
+        parser.error("--workers cannot share a --shm channel")
+    return args
+
+
+def server_options(args):
+    """Map parsed command-line arguments to FrameServer keyword arguments."""
+    return {
+        'host': args.host,
+        'engine': args.engine,
+        'backlog': args.backlog,
+        'multiplex': args.multiplex,
+        'handler_threads': args.handler_threads,
+        'unix_path': args.unix,
+        'shm_path': args.shm,
+        'shm_slot_size': args.shm_slot_size,
+        'shm_slots': args.shm_slots,
+        'validation': validation_service_from_args(args),
+        'admission': admission_from_args(args),
+        'compression': compression_from_args(args),
+        'capture': capture_from_args(args),
+        'profiler': profiler_from_args(args),
+        'timeouts': timeouts_from_args(args),
+    }
+
+
+def run_server(server_class, default_port, argv=None):
+    """Command-line entry point shared by the frame servers."""
+    args = parse_server_args(default_port, argv)
+    configure_logging_from_args(args)
+    exit_code = run_master(server_class.name, args, args.host, args.port, args.unix)
+    if exit_code is not None:
+        sys.exit(exit_code)
+    options = server_options(args)
+    worker = Worker.from_environ()
+    if worker:
+        options['listen_socket'] = worker.listen_socket(args.host, args.port, args.unix)
+        options['metrics'] = worker.metrics_registry()
+        options['on_ready'] = worker.notifier()
+    else:
+        options['on_ready'] = notifier_from_args(args)
+    server = server_class(args.port, **options)
+    install_signal_handlers(lambda: server.drain(args.drain_timeout), server.validation.reload)
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        log.info("%s server shutting down...", server.name, extra=SHUTDOWN)
+        server.stop()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Length-prefixed frame helpers shared by the IPC and gRPC socket servers.
+Every frame is a 4-byte big-endian length prefix followed by a UTF-8 JSON payload.
+
+FrameReader reads frames from a blocking socket with recv_into() into one
+reusable per-connection buffer and hands out payloads as memoryview slices of
+it, so a frame is copied exactly once (kernel -> buffer) before decoding.
+Frames larger than the buffer are received straight into an exact-size buffer
+of their own. send_frame() writes large payloads with one scatter/gather
+sendmsg() instead of concatenating them with their prefix; below
+SCATTER_THRESHOLD the concatenation is cheaper than building the iovec.
+
+Both readers take a max_frame_size and raise FrameTooLargeError as soon as a
+length prefix announces more, before any of the payload is buffered.
+
+A length prefix with COMPRESSED_FLAG set announces a compressed payload (see
+python_compression): the readers return it decompressed, still bounded by
+max_frame_size, and the writers set the flag for a CompressedPayload.
+"""
+
+import asyncio
+import json
+import socket
+import struct
+import time
+
+from python_compression import (COMPRESSED_FLAG, LENGTH_MASK, CompressedPayload, DecompressedTooLargeError,
+                                decompress_payload)
+
+LENGTH_PREFIX = struct.Struct('>I')
+READ_BUFFER_SIZE = 64 * 1024
+SCATTER_THRESHOLD = 64 * 1024
+
+
+class IncompleteFrameError(ConnectionError):
+    """The peer disconnected in the middle of a frame."""
+
+
+class FrameTooLargeError(ValueError):
+    """A length prefix announced a frame above the reader's max_frame_size."""
+
+    def __init__(self, length, max_frame_size):
+        if length is None:
+            super().__init__(f"Decompressed frame exceeds the limit of {max_frame_size} bytes")
+        else:
+            super().__init__(f"Frame of {length} bytes exceeds the limit of {max_frame_size} bytes")
+        self.length = length
+
+
+def encode_payload(message):
+    """Serialize a message dict into a frame payload."""
+    return json.dumps(message).encode('utf-8')
+
+
+def encode_frame(message):
+    """Serialize a message dict into a length-prefixed JSON frame."""
+    payload = encode_payload(message)
+    return LENGTH_PREFIX.pack(len(payload)) + payload
+
+
+def decode_payload(payload):
+    """Decode a frame payload (bytes or memoryview) into a message dict."""
+    if isinstance(payload, memoryview):
+        return json.loads(str(payload, 'utf-8'))
+    return json.loads(payload)
+
+
+def frame_header(payload):
+    """The length prefix for a payload, flagged if it is compressed."""
+    if isinstance(payload, CompressedPayload):
+        return LENGTH_PREFIX.pack(len(payload) | COMPRESSED_FLAG)
+    return LENGTH_PREFIX.pack(len(payload))
+
+
+def decompress_frame(payload, max_frame_size=None):
+    """Decompress a flagged frame's payload, enforcing max_frame_size on the result."""
+    try:
+        return decompress_payload(payload, max_frame_size)
+    except DecompressedTooLargeError:
+        raise FrameTooLargeError(None, max_frame_size)
+
+
+def set_nodelay(sock):
+    """Disable Nagle on TCP sockets so small response frames leave immediately."""
+    if sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class FrameReader:
+    """Reads length-prefixed frames from a blocking socket without re-copying."""
+
+    def __init__(self, sock, buffer_size=READ_BUFFER_SIZE, max_frame_size=None, deadline=None):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self.deadline = deadline  # python_timeouts.Deadline, moved as frames start and complete
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.read_ns = 0  # time the last payload took to arrive after its prefix
+
+    def _fill(self, size):
+        """Ensure `size` unread bytes are buffered; False on EOF."""
+        if self.start + size > len(self.buffer):
+            # compact unread bytes to the front of the buffer
+            remaining = self.end - self.start
+            self.view[:remaining] = self.view[self.start:self.end]
+            self.start, self.end = 0, remaining
+        while self.end - self.start < size:
+            received = self.sock.recv_into(self.view[self.end:])
+            if not received:
+                return False
+            self.end += received
+        return True
+
+    def read_frame(self):
+        """Return the next payload as a memoryview, or None on a clean EOF.
+
+        The view is only valid until the next call. Raises IncompleteFrameError
+        if the peer disconnects in the middle of a frame and FrameTooLargeError
+        if the frame exceeds max_frame_size.
+        """
+        if self.deadline:
+            if self.end == self.start:
+                self.deadline.idle()
+                self._fill(1)  # an EOF here is reported by the _fill below
+            self.deadline.reading()
+        if not self._fill(LENGTH_PREFIX.size):
+            if self.end == self.start:
+                return None
+            raise IncompleteFrameError("Incomplete message")
+        start = time.perf_counter_ns()
+        prefix = LENGTH_PREFIX.unpack_from(self.buffer, self.start)[0]
+        length = prefix & LENGTH_MASK
+        self.start += LENGTH_PREFIX.size
+        if self.max_frame_size is not None and length > self.max_frame_size:
+            raise FrameTooLargeError(length, self.max_frame_size)
+
+        if length > len(self.buffer):
+            payload = self._read_large(length)
+        else:
+            if not self._fill(length):
+                raise IncompleteFrameError("Incomplete message")
+            payload = self.view[self.start:self.start + length]
+            self.start += length
+            if self.start == self.end:
+                self.start = self.end = 0
+        if prefix & COMPRESSED_FLAG:
+            compressed = payload
+            try:
+                payload = memoryview(decompress_frame(compressed, self.max_frame_size))
+            finally:
+                compressed.release()
+        self.read_ns = time.perf_counter_ns() - start
+        if self.deadline:
+            self.deadline.done()
+        return payload
+
+    def _read_large(self, length):
+        """Receive a frame bigger than the buffer into its own exact-size buffer."""
+        frame = bytearray(length)
+        view = memoryview(frame)
+        buffered = min(self.end - self.start, length)
+        view[:buffered] = self.view[self.start:self.start + buffered]
+        self.start += buffered
+        if self.start == self.end:
+            self.start = self.end = 0
+        received = buffered
+        while received < length:
+            count = self.sock.recv_into(view[received:])
+            if not count:
+                raise IncompleteFrameError("Incomplete message")
+            received += count
+        return view
+
+
+def send_frame(sock, payload):
+    """Send one frame, gathering prefix and large payloads in a single sendmsg()."""
+    header = frame_header(payload)
+    if len(payload) < SCATTER_THRESHOLD or not hasattr(sock, 'sendmsg'):
+        sock.sendall(header + payload)
+        return
+    buffers = [memoryview(header), memoryview(payload)]
+    while buffers:
+        sent = sock.sendmsg(buffers)
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers.pop(0)
+        if buffers and sent:
+            buffers[0] = buffers[0][sent:]
+
+
+async def read_frame(reader, max_frame_size=None):
+    """Read one frame payload from an asyncio StreamReader.
+
+    Returns None on a clean EOF between frames, raises
+    asyncio.IncompleteReadError if the peer disconnects mid-frame and
+    FrameTooLargeError if the frame exceeds max_frame_size.
+    """
+    return (await read_frame_timed(reader, max_frame_size))[0]
+
+
+async def read_frame_timed(reader, max_frame_size=None, deadline=None):
+    """read_frame() that also returns the nanoseconds spent reading the payload after its prefix.
+
+    A python_timeouts.Deadline is moved to idle until the frame's first byte, then to reading.
+    """
+    header = b''
+    try:
+        if deadline:
+            deadline.idle()
+            header = await reader.readexactly(1)
+            deadline.reading()
+        header += await reader.readexactly(LENGTH_PREFIX.size - len(header))
+    except asyncio.IncompleteReadError as e:
+        if not header and not e.partial:
+            return None, 0
+        raise
+    start = time.perf_counter_ns()
+    prefix = LENGTH_PREFIX.unpack(header)[0]
+    length = prefix & LENGTH_MASK
+    if max_frame_size is not None and length > max_frame_size:
+        raise FrameTooLargeError(length, max_frame_size)
+    payload = await reader.readexactly(length)
+    if prefix & COMPRESSED_FLAG:
+        payload = decompress_frame(payload, max_frame_size)
+    if deadline:
+        deadline.done()
+    return payload, time.perf_counter_ns() - start
+
+
+def write_frame(writer, payload):
+    """Queue one frame on an asyncio StreamWriter without concatenating."""
+    writer.writelines((frame_header(payload), payload))
@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+"""
+Concurrent, keep-alive HTTP/1.1 server for the /validate, /echo and /health
+endpoints of python_test_server.py (its default engine).
+
+One event loop owns every connection. Connections are persistent (HTTP/1.1
+default; HTTP/1.0 clients opt in with "Connection: keep-alive") and requests
+may be pipelined: each request is dispatched as soon as it has been read, and
+responses are written back strictly in request order, with at most
+`max_pipeline` responses outstanding per connection.
+
+/validate bodies are decoded, validated and encoded on a bounded handler
+thread pool (--handler-threads), so a slow validator only occupies a pool
+thread; /health and /echo are answered on the event loop itself and never
+wait behind a /validate call.
+
+GET /metrics renders the server's metrics registry as Prometheus text.
+POST /profile?seconds=N starts a sampling profile of the running server and
+answers 202 with the path it is written to (see python_profiling).
+
+A /validate request with "server_timing": true gets its read, decode and
+validate durations back in attributes["server_timing"]; such responses, and
+every /validate response with server_timing=True (--server-timing), carry a
+Server-Timing header with the encode duration as well.
+
+Request bodies may use "Transfer-Encoding: chunked". A chunked POST /validate
+with "Content-Type: application/x-ndjson" is a streamed request: its first line
+is dispatched as soon as it arrives and the following lines (JSON arrays of
+items) are fed to the validator while the body is still being received, at
+most a window of lines ahead of it (see python_streaming). Other chunked
+bodies are reassembled, up to max_frame_size.
+
+A /validate body may be sent with "Content-Encoding: gzip", "deflate" or "xz"
+(decompressed on the handler pool, bounded by max_frame_size; 415 for other
+encodings, 400 for a corrupt body), and responses of at least the compression
+min_size are compressed when Accept-Encoding allows it (see python_compression).
+
+With --capture DIR every connection, request (streamed bodies excepted) and
+response is appended to a capture log for bench_replay.py (see python_capture).
+
+Admission control (python_admission) answers connections beyond
+max_connections and /validate requests beyond max_in_flight with 503, and
+bodies above max_frame_size with 413, each carrying an OVERLOADED ERROR body
+and a Retry-After header. Pipelined requests per connection are bounded by
+max_pipeline, which pauses reading rather than shedding. Connections that
+idle, trickle a request or stop reading responses past their timeouts are
+closed (see python_timeouts).
+
+On drain (SIGTERM) the server stops accepting, answers the requests already
+read with "Connection: close" and closes each connection once its responses
+are written, within the drain timeout (see python_lifecycle).
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from python_admission import FRAME_TOO_LARGE, TOO_MANY_CONNECTIONS, TOO_MANY_IN_FLIGHT, AdmissionControl
+from python_capture import HTTP_REQUEST, http_request_bytes
+from python_compression import HTTP_ENCODINGS, CompressionError, CompressionSettings, DecompressedTooLargeError
+from python_frame_server import DEFAULT_BACKLOG
+from python_lifecycle import drain_connections_async
+from python_logging import SHUTDOWN, STARTUP, fields, log, message_log
+from python_metrics import MetricsRegistry, ServerTiming, TransportMetrics, wants_server_timing
+from python_profiling import StackSampler
+from python_streaming import NDJSON_CONTENT_TYPE, StreamError, feed_async, open_stream, run_in_thread
+from python_timeouts import ConnectionTimeouts, DeadlineHeap, stop_stream
+from python_validation import error_response, validation_response
+from python_validators import ValidationService
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+MAX_HEADER_BYTES = 64 * 1024
+DEFAULT_MAX_PIPELINE = 32
+SERVER_NAME = 'simple_python_test'
+
+
+class HTTPError(Exception):
+    """A request that cannot be parsed; answered with `status` and the connection closed."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class HTTPRequest:
+    """A parsed request: method, path, version, lower-cased headers and body.
+
+    A streamed request has no body; `chunks` yields it as it arrives instead.
+    """
+
+    __slots__ = ('method', 'path', 'version', 'headers', 'body', 'size', 'chunks', 'read_ns')
+
+    def __init__(self, method, path, version, headers, body=b'', size=0, chunks=None, read_ns=0):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.size = size
+        self.chunks = chunks
+        self.read_ns = read_ns  # time the body took to arrive after the head
+
+    @property
+    def keep_alive(self):
+        """True if the client wants the connection kept open after this request."""
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return 'keep-alive' in connection
+        return 'close' not in connection
+
+
+def json_body(message):
+    return json.dumps(message).encode('utf-8')
+
+
+def render_response(status, body, keep_alive, content_type='application/json', headers=()):
+    """Serialize a complete HTTP/1.1 response with an explicit Content-Length."""
+    status = HTTPStatus(status)
+    extra = ''.join(f"{name}: {value}\r\n" for name, value in headers)
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Server: {SERVER_NAME}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"{extra}"
+            f"\r\n")
+    return head.encode('latin-1') + body
+
+
+def discard_pending(responses):
+    """Cancel responses still queued on a connection that is going away."""
+    while not responses.empty():
+        pending = responses.get_nowait()
+        if pending is not None:
+            pending.cancel()
+
+
+def _settle(future, task):
+    """Complete `future` with the outcome of the finished `task`."""
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+async def read_chunks(reader, max_chunk=None):
+    """Yield the data of each chunk of a chunked body, skipping any trailers."""
+    while True:
+        try:
+            line = await reader.readuntil(b'\r\n')
+            size = int(line.split(b';', 1)[0], 16)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            raise HTTPError(400, "Malformed chunked body")
+        if size == 0:
+            try:
+                while await reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                raise HTTPError(400, "Malformed chunked body")
+            return
+        if max_chunk is not None and size > max_chunk:
+            raise HTTPError(413, f"Chunk of {size} bytes exceeds the limit of {max_chunk} bytes")
+        try:
+            data = await reader.readexactly(size + 2)
+        except asyncio.IncompleteReadError:
+            raise HTTPError(400, "Incomplete chunked body")
+        yield data[:-2]
+
+
+async def read_lines(chunks, max_line=None):
+    """Split a streamed body into its non-empty lines as the chunks arrive."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b'\n', start)) >= 0:
+            if buffer[start:end].strip():
+                yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+        if max_line is not None and len(buffer) > max_line:
+            raise HTTPError(413, f"Line exceeds the limit of {max_line} bytes")
+    if buffer.strip():
+        yield bytes(buffer)
+
+
+def is_streamed_request(method, path, headers):
+    """True for a chunked NDJSON POST /validate, validated while its body arrives."""
+    content_type = headers.get('content-type', '').split(';', 1)[0].strip().lower()
+    return method == 'POST' and path == '/validate' and content_type == NDJSON_CONTENT_TYPE
+
+
+async def read_request(reader, writer, max_body=None, deadline=None):
+    """Read one request from the stream; None on a clean EOF between requests.
+
+    A python_timeouts.Deadline is moved to idle until the request's first byte,
+    then to reading until its body (or, for a streamed request, its head) is read.
+    """
+    head = b''
+    try:
+        if deadline:
+            deadline.idle()
+            head = await reader.readexactly(1)
+            deadline.reading()
+        head += await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if not (head + e.partial).strip():
+            return None
+        raise HTTPError(400, "Incomplete request head")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, f"Request head exceeds {MAX_HEADER_BYTES} bytes")
+
+    start = time.perf_counter_ns()
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, path, version = lines[0].split(' ')
+    except ValueError:
+        raise HTTPError(400, f"Malformed request line: {lines[0][:100]!r}")
+    if version not in ('HTTP/1.0', 'HTTP/1.1'):
+        raise HTTPError(505, f"Unsupported protocol version: {version[:20]}")
+
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, separator, value = line.partition(':')
+        if not separator:
+            raise HTTPError(400, f"Malformed header line: {line[:100]!r}")
+        headers[name.strip().lower()] = value.strip()
+
+    if 'transfer-encoding' in headers:
+        encoding = headers['transfer-encoding']
+        if encoding.lower() != 'chunked':
+            raise HTTPError(501, f"Transfer-Encoding {encoding[:20]!r} is not supported")
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        if is_streamed_request(method, path, headers):
+            if deadline:
+                deadline.done()
+            return HTTPRequest(method, path, version, headers, None, len(head), read_chunks(reader, max_body))
+        body = bytearray()
+        async for chunk in read_chunks(reader, max_body):
+            body += chunk
+            if max_body is not None and len(body) > max_body:
+                raise HTTPError(413, f"Body exceeds the limit of {max_body} bytes")
+        if deadline:
+            deadline.done()
+        return HTTPRequest(method, path, version, headers, bytes(body), len(head) + len(body),
+                           read_ns=time.perf_counter_ns() - start)
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length")
+    if max_body is not None and length > max_body:
+        # refused before the body is read (or a 100 Continue invites it)
+        raise HTTPError(413, f"Body of {length} bytes exceeds the limit of {max_body} bytes")
+
+    if length and headers.get('expect', '').lower() == '100-continue':
+        writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+    try:
+        body = await reader.readexactly(length) if length else b''
+    except asyncio.IncompleteReadError:
+        raise HTTPError(400, "Incomplete request body")
+    if deadline:
+        deadline.done()
+    return HTTPRequest(method, path, version, headers, body, len(head) + length,
+                       read_ns=time.perf_counter_ns() - start)
+
+
+class HTTPValidationServer:
+    """Event-loop HTTP/1.1 server with keep-alive, pipelining and a validation pool."""
+
+    name = 'HTTP'
+    response_text = 'Message received and validated'
+
+    def __init__(self, port, host='127.0.0.1', backlog=DEFAULT_BACKLOG, handler_threads=None,
+                 max_pipeline=DEFAULT_MAX_PIPELINE, validation=None, metrics=None, admission=None,
+                 listen_socket=None, on_ready=None, compression=None, capture=None, profiler=None,
+                 server_timing=False, timeouts=None):
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.handler_threads = handler_threads
+        self.max_pipeline = max_pipeline
+        self.validation = validation or ValidationService()
+        self.metrics = metrics or MetricsRegistry()
+        self.stats = TransportMetrics(self.metrics, 'http')
+        self.validation.bind_metrics(self.metrics)
+        self.admission = admission or AdmissionControl()
+        self.compression = compression or CompressionSettings()
+        self.capture = capture
+        self.profiler = profiler or StackSampler()
+        self.server_timing = server_timing
+        self.timeouts = timeouts or ConnectionTimeouts()
+        self.deadlines = None
+        self.drain_deadline = None
+        self.listen_socket = listen_socket
+        self.on_ready = on_ready
+        self.executor = None
+        self.server = None
+        self.running = False
+        self.loop = None
+        self._stopped = None
+
+    def start(self):
+        """Start the server (blocks until stopped)."""
+        self.validation.start()
+        self.executor = ThreadPoolExecutor(max_workers=self.handler_threads,
+                                           thread_name_prefix=f"{self.name}-handler")
+        try:
+            asyncio.run(self.serve_async())
+        finally:
+            self.executor.shutdown(wait=False)
+            self.validation.shutdown()
+            if self.capture:
+                self.capture.shutdown()
+
+    def mode_description(self):
+        """Describe the engine settings for the startup line."""
+        description = (f"engine=asyncio, keep-alive, backlog={self.backlog}, "
+                       f"handler_threads={self.executor._max_workers}, pipeline={self.max_pipeline}, "
+                       f"{self.validation.description()}, {self.admission.description()}, "
+                       f"{self.compression.description()}, {self.timeouts.description()}")
+        if self.capture:
+            description += f", {self.capture.description()}"
+        if self.server_timing:
+            description += ", server-timing"
+        return description
+
+    async def serve_async(self):
+        """Serve all connections from a single event loop."""
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.deadlines = DeadlineHeap(self.timeouts, self.stats)
+        if self.listen_socket:
+            self.server = await asyncio.start_server(
+                self.handle_connection, sock=self.listen_socket,
+                backlog=self.backlog, limit=MAX_HEADER_BYTES)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle_connection, self.host, self.port,
+                backlog=self.backlog, limit=MAX_HEADER_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]  # the real port when asked for 0
+        self.running = True
+        if self.on_ready:
+            self.on_ready(self.port)
+
+        log.info("%s server listening on http://%s:%d (%s)",
+                 self.name, self.host, self.port, self.mode_description(), extra=STARTUP)
+        log.info("Endpoints: POST /validate, POST /echo, POST /profile, GET /health, GET /metrics",
+                 extra=STARTUP)
+
+        sweeper = asyncio.ensure_future(self.deadlines.run_async()) if self.timeouts.enabled else None
+        try:
+            await self._stopped.wait()
+        finally:
+            self.running = False
+            self.server.close()
+            if self.drain_deadline:
+                await drain_connections_async(self.deadlines, self.drain_deadline)
+            if sweeper:
+                sweeper.cancel()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        """Read pipelined requests, dispatching each while earlier ones are answered."""
+        if not self.admission.open_connection():
+            log.warning("Rejecting connection: at max_connections",
+                        extra=fields(peer=writer.get_extra_info('peername')))
+            writer.write(self.overloaded(TOO_MANY_CONNECTIONS, 503, keep_alive=False))
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+            return
+        responses = asyncio.Queue(maxsize=self.max_pipeline)
+        sender = asyncio.ensure_future(self.send_responses(writer, responses))
+        self.stats.connections.add(1)
+        connection = self.capture.open(writer, 'http', writer.get_extra_info('peername')) if self.capture else None
+        unanswered = set()
+        deadline = self.deadlines.track(writer, writer.transport.abort, stop_stream(reader, writer),
+                                        writer.get_extra_info('peername'), busy=lambda: bool(unanswered))
+        try:
+            while self.running and not sender.done():
+                try:
+                    request = await read_request(reader, writer, self.admission.max_frame_size, deadline)
+                except HTTPError as e:
+                    if deadline.expired:
+                        break  # closed by its read timeout
+                    if e.status == 413:
+                        log.warning("Closing connection: %s", e)
+                        response = self.overloaded(FRAME_TOO_LARGE, 413, keep_alive=False)
+                    else:
+                        log.error("Bad request: %s", e)
+                        self.stats.error('bad_request')
+                        response = render_response(e.status, json_body({"error": str(e)}), keep_alive=False)
+                    await responses.put(self._answered(response))
+                    break
+                if request is None:
+                    break
+                self.stats.requests.inc()
+                self.stats.bytes_in.inc(request.size)
+                keep_alive = request.keep_alive and self.running  # draining: close after this one
+                if request.chunks is None:
+                    self.stats.read.observe_ns(request.read_ns)
+                    if connection:
+                        self.capture.record(connection, HTTP_REQUEST, http_request_bytes(request))
+                    response = asyncio.ensure_future(self.respond(request, keep_alive))
+                    unanswered.add(response)
+                    response.add_done_callback(unanswered.discard)
+                    await responses.put(response)
+                else:
+                    try:
+                        if not await self.read_streamed(request, keep_alive, responses):
+                            break
+                    except HTTPError as e:  # malformed before anything was queued for the request
+                        log.error("Bad request body: %s", e)
+                        self.stats.error('bad_request')
+                        await responses.put(self._answered(
+                            render_response(e.status, json_body({"error": str(e)}), keep_alive=False)))
+                        break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            log.error("Connection handler error: %s", e)
+            self.stats.error('handler_exception')
+        finally:
+            if not sender.done():
+                await responses.put(None)
+                await sender
+            discard_pending(responses)
+            self.deadlines.forget(writer)
+            if connection:
+                self.capture.close(writer)
+            writer.close()
+            self.admission.close_connection()
+            self.stats.connections.add(-1)
+
+    def overloaded(self, reason, status, keep_alive):
+        """Count a shed request or connection and render its OVERLOADED response."""
+        self.stats.rejected(reason)
+        return render_response(status, json_body(self.admission.rejection("unknown", reason)), keep_alive,
+                               headers=(('Retry-After', self.admission.retry_after_seconds),))
+
+    async def read_streamed(self, request, keep_alive, responses):
+        """Dispatch a streamed /validate on its first line, then feed it the rest of the body.
+
+        Exactly one response is queued for the request. Returns False if the body
+        turned out malformed after that, in which case the connection must close.
+        """
+        lines = read_lines(self.count_bytes(request.chunks), self.admission.max_frame_size)
+        stream = None
+        try:
+            first = await anext(lines, b'')
+            message = json.loads(first) if first else {}
+            if not isinstance(message, dict):
+                raise StreamError("The first line of a streamed request must be a JSON object")
+            stream = open_stream(message)
+        except (ValueError, UnicodeDecodeError) as e:
+            self.stats.error('invalid_stream' if isinstance(e, StreamError) else 'invalid_json')
+            code = "INVALID_STREAM" if isinstance(e, StreamError) else "INVALID_JSON"
+            await responses.put(self._answered(render_response(
+                200, json_body(error_response("unknown", code, str(e))), keep_alive)))
+            return await self.discard_body(lines)
+        if not self.admission.begin():
+            message_log.info("%s %s %d", request.method, request.path, 503)
+            await responses.put(self._answered(self.overloaded(TOO_MANY_IN_FLIGHT, 503, keep_alive)))
+            return await self.discard_body(lines)  # the shed request's body is read and dropped
+        validation = asyncio.ensure_future(self.respond_streamed(request, message, keep_alive))
+        # the queued answer is the validation's response, unless the body turns out malformed first
+        answer = self.loop.create_future()
+        validation.add_done_callback(lambda task: answer.done() or _settle(answer, task))
+        answer.add_done_callback(lambda future: future.cancelled() and validation.cancel())
+        await responses.put(answer)
+        try:
+            try:
+                async for line in lines:
+                    if stream is None:
+                        continue  # an ordinary request sent chunked: nothing to feed
+                    items = json.loads(line)
+                    if not isinstance(items, list):
+                        raise ValueError("Each line after the first must be a JSON array")
+                    await feed_async(stream, items, self.loop)
+            except (ValueError, UnicodeDecodeError) as e:
+                log.error("Aborting streamed request: %s", e)
+                self.stats.error('invalid_stream')
+                stream.abort()
+                return await self.discard_body(lines)
+        except HTTPError as e:
+            if stream:
+                stream.abort()
+            log.error("Bad request body: %s", e)
+            self.stats.error('bad_request')
+            if not answer.done():
+                answer.set_result(render_response(e.status, json_body({"error": str(e)}), keep_alive=False))
+            return False
+        except BaseException:
+            if stream:
+                stream.abort()
+            raise
+        if stream:
+            stream.end()
+        return True
+
+    async def discard_body(self, lines):
+        """Read and drop the rest of an already answered streamed body; False if it is malformed."""
+        try:
+            async for _ in lines:
+                pass
+        except HTTPError as e:
+            log.error("Bad request body: %s", e)
+            self.stats.error('bad_request')
+            return False
+        return True
+
+    async def count_bytes(self, chunks):
+        async for chunk in chunks:
+            self.stats.bytes_in.inc(len(chunk))
+            yield chunk
+
+    async def respond_streamed(self, request, message, keep_alive):
+        """Validate a streamed request on its own thread while its body is still being read."""
+        try:
+            status, body = 200, await asyncio.wrap_future(run_in_thread(self.validate_message, message))
+        except Exception as e:
+            log.error("Handler error for %s %s: %s", request.method, request.path, e)
+            self.stats.error('handler_exception')
+            status, body = 500, json_body({"error": str(e)})
+        finally:
+            self.admission.end()
+        message_log.info("%s %s %d", request.method, request.path, status)
+        body, headers = await self.compress_body(request, body)
+        return render_response(status, body, keep_alive, headers=headers)
+
+    def _answered(self, response):
+        future = self.loop.create_future()
+        future.set_result(response)
+        return future
+
+    async def send_responses(self, writer, responses):
+        """Write responses in request order as each one completes."""
+        try:
+            while True:
+                pending = await responses.get()
+                if pending is None:
+                    break
+                response = await pending
+                deadline = self.deadlines.get(writer) if self.deadlines else None
+                start = time.perf_counter_ns()
+                writer.write(response)
+                if deadline:
+                    deadline.writing()
+                await writer.drain()
+                if deadline:
+                    deadline.written()
+                self.stats.send.observe_ns(time.perf_counter_ns() - start)
+                self.stats.bytes_out.inc(len(response))
+                if self.capture:
+                    self.capture.response(writer)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            # the reader must never be left blocked on a full queue
+            discard_pending(responses)
+
+    async def respond(self, request, keep_alive):
+        """Build the serialized response for one request."""
+        content_type = 'application/json'
+        headers = ()
+        try:
+            if request.method == 'POST' and request.path == '/validate':
+                encoding = request.headers.get('content-encoding', 'identity').strip().lower()
+                if encoding not in HTTP_ENCODINGS + ('identity',):
+                    self.stats.error('invalid_compression')
+                    message_log.info("%s %s %d", request.method, request.path, 415)
+                    return render_response(415, json_body({"error": f"Unsupported Content-Encoding: {encoding[:20]}"}),
+                                           keep_alive)
+                if not self.admission.begin():
+                    message_log.info("%s %s %d", request.method, request.path, 503)
+                    return self.overloaded(TOO_MANY_IN_FLIGHT, 503, keep_alive)
+                timer = ServerTiming(read=request.read_ns)
+                try:
+                    status, body = 200, await self.loop.run_in_executor(
+                        self.executor, self.validate_body, request.body, encoding, timer)
+                except DecompressedTooLargeError:
+                    message_log.info("%s %s %d", request.method, request.path, 413)
+                    return self.overloaded(FRAME_TOO_LARGE, 413, keep_alive)
+                except CompressionError as e:
+                    self.stats.error('invalid_compression')
+                    status, body = 400, json_body({"error": str(e)})
+                finally:
+                    self.admission.end()
+                body, headers = await self.compress_body(request, body)
+                if self.server_timing or timer.requested:
+                    headers += (('Server-Timing', timer.header()),)
+            elif request.method == 'GET':
+                if request.path == '/health':
+                    status, body = 200, json_body({"status": "ok", "server": SERVER_NAME})
+                elif request.path == '/metrics':
+                    status, body = 200, self.metrics.render_prometheus().encode('utf-8')
+                    content_type = PROMETHEUS_CONTENT_TYPE
+                else:
+                    status, body = 404, json_body({"error": "Not found"})
+            elif request.method == 'POST':
+                if request.path == '/echo':
+                    status, body = 200, request.body or json_body({"echo": ""})
+                elif urlsplit(request.path).path == '/profile':
+                    status, body = self.profile(request.path)
+                else:
+                    status, body = 404, json_body({"error": f"Endpoint {request.path} not found"})
+            else:
+                status, body = 501, json_body({"error": f"Unsupported method ({request.method})"})
+        except Exception as e:
+            log.error("Handler error for %s %s: %s", request.method, request.path, e)
+            self.stats.error('handler_exception')
+            status, body = 500, json_body({"error": str(e)})
+            content_type = 'application/json'
+        message_log.info("%s %s %d", request.method, request.path, status)
+        return render_response(status, body, keep_alive and self.running, content_type, headers)
+
+    def profile(self, target):
+        """Start a profile for POST /profile?seconds=N; returns (status, body)."""
+        seconds = parse_qs(urlsplit(target).query).get('seconds', [None])[0]
+        response = self.profiler.respond({"attributes": {"seconds": seconds}})
+        return (400 if response["type"] == "ERROR" else 202), json_body(response)
+
+    async def compress_body(self, request, body):
+        """Compress a response body as the request's Accept-Encoding allows; returns (body, headers)."""
+        accept_encoding = request.headers.get('accept-encoding')
+        if not accept_encoding or len(body) < self.compression.min_size:
+            return body, ()
+        body, encoding = await self.loop.run_in_executor(
+            self.executor, self.compression.encode_body, body, accept_encoding)
+        return body, (('Content-Encoding', encoding), ('Vary', 'Accept-Encoding')) if encoding else ()
+
+    def validate_body(self, body, content_encoding='identity', timer=None):
+        """Decompress, decode, validate and encode one /validate body (runs on the handler pool).
+
+        A ServerTiming `timer` collects the decode, validate and encode durations.
+        """
+        if content_encoding != 'identity':
+            body = self.compression.decode_body(body, content_encoding, self.admission.max_frame_size)
+        start = time.perf_counter_ns()
+        try:
+            message = json.loads(body) if body else {}
+        except (ValueError, UnicodeDecodeError) as e:
+            self.stats.error('invalid_json')
+            return self.encode(error_response("unknown", "INVALID_JSON", "Invalid JSON received: " + str(e)),
+                               timer)
+        elapsed = time.perf_counter_ns() - start
+        self.stats.decode.observe_ns(elapsed)
+        if timer:
+            timer.add('decode', elapsed)
+        return self.validate_message(message, timer)
+
+    def validate_message(self, message, timer=None):
+        """Validate and encode one decoded /validate request (runs off the event loop)."""
+        start = time.perf_counter_ns()
+        response = self.validation.handle(message, self.default_response)
+        elapsed = time.perf_counter_ns() - start
+        self.stats.validate.observe_ns(elapsed)
+        if timer:
+            timer.add('validate', elapsed)
+            if wants_server_timing(message):
+                timer.requested = True
+                response = timer.attach(response)
+        return self.encode(response, timer)
+
+    def encode(self, response, timer=None):
+        start = time.perf_counter_ns()
+        encoded = json_body(response)
+        elapsed = time.perf_counter_ns() - start
+        self.stats.encode.observe_ns(elapsed)
+        if timer:
+            timer.add('encode', elapsed)
+        return encoded
+
+    def default_response(self, message):
+        """Build the built-in VALIDATION_RESPONSE for requests no validator claims."""
+        return validation_response(message.get("message_id", "unknown"), self.response_text)
+
+    def drain(self, timeout):
+        """Stop accepting and let open connections finish within `timeout` seconds, then stop (SIGTERM)."""
+        log.info("%s server draining (up to %gs)...", self.name, timeout, extra=SHUTDOWN)
+        self.drain_deadline = time.monotonic() + timeout
+        self.stop()
+
+    def stop(self):
+        """Stop the server (safe to call from any thread)."""
+        self.running = False
+        if self.loop and self._stopped and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stopped.set)
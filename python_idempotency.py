@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+message_id idempotency for retried requests.
+
+An Eiffel bridge that times out retries the same request with the same
+message_id, and without help the server validates it all over again, even
+while the first attempt is still running. With --idempotency-window S the
+ValidationService (and so every server sharing it: HTTP, IPC and gRPC) runs
+each request through an IdempotencyJournal keyed by (type, message_id):
+
+  in flight  - a request whose key is being validated waits for that
+               validation and is answered with its response instead of
+               starting new work
+  journal    - a request whose key completed within the last S seconds is
+               answered with the recorded response, without validating
+
+The journal holds at most --idempotency-size responses, the oldest dropped
+first. ERROR responses are shared with requests attached while in flight but
+never journaled, so a retry after VALIDATION_TIMEOUT runs again. Requests
+without a message_id (or "unknown") and streamed requests are never
+deduplicated.
+
+Duplicates are recognized by message_id alone, not by content: a client must
+not reuse a message_id for a different request within the window. Unlike the
+ResultCache, the journal never hashes the request, so a duplicate costs one
+dict lookup. Answered duplicates are counted in
+duplicate_requests_total{outcome="in_flight"|"journal"}.
+"""
+
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+
+DEFAULT_WINDOW = 60.0
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class IdempotencyJournal:
+    """Requests in flight and recently answered, keyed by (type, message_id)."""
+
+    def __init__(self, window=DEFAULT_WINDOW, max_entries=DEFAULT_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self.in_flight = {}
+        self.completed = OrderedDict()  # completion order, so the oldest entries come first
+        self.lock = Lock()
+        self.attached = None
+        self.replayed = None
+
+    def bind_metrics(self, registry):
+        """Count answered duplicates in `registry` (the servers sharing a journal share a registry)."""
+        help_text = 'Retried requests answered without validating again'
+        self.attached = registry.counter('duplicate_requests_total', help_text, outcome='in_flight')
+        self.replayed = registry.counter('duplicate_requests_total', help_text, outcome='journal')
+
+    def description(self):
+        """Describe the journal settings for the startup line."""
+        return f"idempotency={self.max_entries}x{self.window:g}s"
+
+    @staticmethod
+    def key(message):
+        """The journal key of a request, or None if it cannot be deduplicated."""
+        message_id = message.get("message_id")
+        if message_id is None or message_id == "unknown":
+            return None
+        try:
+            hash(message_id)
+        except TypeError:
+            return None
+        return message.get("type"), message_id
+
+    def run(self, message, handler):
+        """Answer `message` with handler(message), unless its key is in flight or journaled."""
+        key = self.key(message)
+        if key is None:
+            return handler(message)
+        with self.lock:
+            response = self._lookup(key)
+            if response is None:
+                pending = self.in_flight.get(key)
+                owner = pending is None
+                if owner:
+                    pending = self.in_flight[key] = Future()
+        if response is not None:
+            if self.replayed:
+                self.replayed.inc()
+            return response
+        if not owner:
+            if self.attached:
+                self.attached.inc()
+            return pending.result()
+
+        try:
+            response = handler(message)
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            pending.set_exception(e)
+            raise
+        with self.lock:
+            del self.in_flight[key]
+            if response.get("type") != "ERROR":
+                self._record(key, response)
+        pending.set_result(response)
+        return response
+
+    def _lookup(self, key):
+        entry = self.completed.get(key)
+        if entry is None:
+            return None
+        expires, response = entry
+        if expires < time.monotonic():
+            del self.completed[key]
+            return None
+        return response
+
+    def _record(self, key, response):
+        now = time.monotonic()
+        self.completed.pop(key, None)
+        self.completed[key] = (now + self.window, response)
+        while self.completed:
+            oldest_key, (expires, _) = next(iter(self.completed.items()))
+            if expires >= now and len(self.completed) <= self.max_entries:
+                break
+            del self.completed[oldest_key]
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Graceful drain (SIGTERM) and hot reload (SIGHUP) for the HTTP, IPC and gRPC servers.
+
+SIGTERM drains a server instead of killing it mid-response:
+
+  1. the listening socket is closed, so no new connection is accepted
+  2. connections waiting for their next frame or HTTP request stop being read
+     and close once the responses they are still owed have been written;
+     connections in the middle of one finish reading it, are answered and close
+  3. after --drain-timeout seconds whatever is still open is closed (counted in
+     reclaimed_connections_total{reason="drain"}) and the server exits
+
+SIGHUP reloads the validation code without closing a connection: the
+--validators modules are re-imported into a new registry and, in process
+mode, a new worker pool is started and warmed; both replace the running ones
+only once ready, and the old workers finish the requests they already have
+(see ValidationService.reload). Requests are answered by the old code until the
+swap. The result cache is cleared; a module that fails to import leaves the
+running validators in place.
+
+With --workers the master forwards SIGHUP to every worker and, on SIGTERM,
+gives its workers --drain-timeout seconds to drain before killing them.
+"""
+
+import asyncio
+import signal
+import time
+from threading import Thread
+
+from python_logging import SHUTDOWN, log
+
+DEFAULT_DRAIN_TIMEOUT = 10.0
+DRAIN_POLL = 0.05
+STOP_GRACE = 2.0  # how long a master waits beyond --drain-timeout before killing a worker
+
+
+def install_signal_handlers(drain, reload):
+    """Run drain() on SIGTERM and reload() on a thread of its own on SIGHUP (main thread only)."""
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: drain())
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP,
+                          lambda signum, frame: Thread(target=reload, name="reload", daemon=True).start())
+    except ValueError:
+        pass  # not the main thread
+
+
+def drain_connections(deadlines, deadline):
+    """Stop reading connections as they go idle until none is left or `deadline` passes, then close the rest."""
+    while deadlines.connections and time.monotonic() < deadline:
+        deadlines.stop_idle()
+        time.sleep(DRAIN_POLL)
+    _close_remaining(deadlines)
+
+
+async def drain_connections_async(deadlines, deadline):
+    """drain_connections() on the event loop."""
+    while deadlines.connections and time.monotonic() < deadline:
+        deadlines.stop_idle()
+        await asyncio.sleep(DRAIN_POLL)
+    _close_remaining(deadlines)
+
+
+def _close_remaining(deadlines):
+    if deadlines.connections:
+        log.warning("Drain timeout: closing %d connections", len(deadlines.connections), extra=SHUTDOWN)
+        deadlines.close_all('drain')
+
+
+def add_lifecycle_arguments(parser):
+    """Add the drain command-line option shared by every server."""
+    parser.add_argument("--drain-timeout", type=float, default=DEFAULT_DRAIN_TIMEOUT,
+                        help=f"Seconds SIGTERM lets open connections finish before closing them "
+                             f"(default: {DEFAULT_DRAIN_TIMEOUT:g})")
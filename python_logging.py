@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Queue-backed logging for the HTTP, IPC and gRPC servers.
+
+Handler threads and the event loop only build a LogRecord and put it on a
+queue; a QueueListener thread formats and writes it, so no request path ever
+waits on stderr or its lock. Records are formatted on the listener thread, not
+by the QueueHandler, to keep string formatting off the hot path as well.
+
+Two loggers are used:
+  log          - 'simple_python': startup, connection and error lines
+  message_log  - 'simple_python.messages': one line per request, sampled so
+                 that only every Nth line is emitted (--log-sample N)
+
+Levels are chosen with --log-level (or SIMPLE_PYTHON_LOG_LEVEL) and can be
+changed while running: set_level(), or SIGUSR2 to toggle DEBUG on and off.
+Debug lines use lazy %-style arguments, so when DEBUG is off they cost one
+level check.
+
+--log-format text keeps the existing "[LEVEL] message" lines; --log-format json
+writes one JSON object per line with time, level, logger, message and any
+structured fields passed with extra=fields(...).
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import signal
+import sys
+import time
+
+LOGGER_NAME = 'simple_python'
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+FORMATS = ('text', 'json')
+LEVEL_ENV = 'SIMPLE_PYTHON_LOG_LEVEL'
+
+# `event` tags startup and shutdown lines so the text format can keep its
+# [STARTUP] / [SHUTDOWN] prefixes
+STARTUP = {'event': 'startup'}
+SHUTDOWN = {'event': 'shutdown'}
+
+log = logging.getLogger(LOGGER_NAME)
+
+
+def fields(**values):
+    """Structured fields for a log call: log.info("...", extra=fields(peer=addr))."""
+    return {'fields': values}
+
+
+class SampledLogger:
+    """Logger wrapper that emits only every `every`-th enabled line."""
+
+    def __init__(self, logger, every=1):
+        self.logger = logger
+        self.every = every
+        self._count = itertools.count()
+
+    def _sampled(self, level):
+        if not self.logger.isEnabledFor(level):
+            return False
+        # itertools.count is atomic under the GIL, so no lock is needed
+        return self.every <= 1 or next(self._count) % self.every == 0
+
+    def debug(self, msg, *args, **values):
+        if self._sampled(logging.DEBUG):
+            self.logger.debug(msg, *args, extra={'fields': values} if values else None)
+
+    def info(self, msg, *args, **values):
+        if self._sampled(logging.INFO):
+            self.logger.info(msg, *args, extra={'fields': values} if values else None)
+
+
+message_log = SampledLogger(logging.getLogger(LOGGER_NAME + '.messages'))
+
+
+class TextFormatter(logging.Formatter):
+    """"[LEVEL] message key=value ..." lines, matching the servers' original output."""
+
+    def format(self, record):
+        tag = getattr(record, 'event', record.levelname).upper()
+        line = f"[{tag}] {record.getMessage()}"
+        values = getattr(record, 'fields', None)
+        if values:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in values.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+                    + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if hasattr(record, 'event'):
+            entry["event"] = record.event
+        values = getattr(record, 'fields', None)
+        if values:
+            entry.update(values)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() formats the record in the logging thread so it can be
+    pickled; our queue never leaves the process.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class BatchFlushHandler(logging.StreamHandler):
+    """StreamHandler that flushes once the queue is drained rather than after every record."""
+
+    def __init__(self, stream, records):
+        super().__init__(stream)
+        self.records = records
+
+    def flush(self):
+        if self.records.empty():
+            super().flush()
+
+
+_listener = None
+_configured_level = logging.INFO
+
+
+def configure_logging(level='INFO', format='text', sample=1, stream=None):
+    """Route the servers' loggers through a queue to a background writer thread."""
+    global _listener, _configured_level
+    if _listener is not None:
+        _listener.stop()
+    else:
+        atexit.register(shutdown_logging)
+
+    records = queue.SimpleQueue()
+    handler = BatchFlushHandler(stream or sys.stderr, records)
+    handler.setFormatter(JSONFormatter() if format == 'json' else TextFormatter())
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+
+    # skip record fields nobody formats (logging HOWTO, "Optimization")
+    logging._srcfile = None
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False
+
+    log.handlers[:] = [DeferredQueueHandler(records)]
+    log.propagate = False
+    _configured_level = logging.getLevelName(level.upper())
+    log.setLevel(_configured_level)
+    message_log.every = max(1, sample)
+
+    if hasattr(signal, 'SIGUSR2'):
+        try:
+            signal.signal(signal.SIGUSR2, toggle_debug)
+        except ValueError:
+            pass  # not the main thread; the level can still be changed with set_level()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            logging.StreamHandler.flush(handler)
+        _listener = None
+
+
+def set_level(level):
+    """Change the log level of a running server."""
+    log.setLevel(logging.getLevelName(level.upper()) if isinstance(level, str) else level)
+
+
+def toggle_debug(signum=None, frame=None):
+    """Switch between DEBUG and the configured level (SIGUSR2 handler)."""
+    if log.level == logging.DEBUG and _configured_level != logging.DEBUG:
+        set_level(_configured_level)
+    else:
+        set_level(logging.DEBUG)
+    log.warning("Log level is now %s", logging.getLevelName(log.level))
+
+
+def add_logging_arguments(parser):
+    """Add the logging command-line options shared by every server."""
+    parser.add_argument("--log-level", choices=LEVELS, type=str.upper,
+                        default=os.environ.get(LEVEL_ENV, 'INFO').upper(),
+                        help=f"Minimum level to log (default: ${LEVEL_ENV} or INFO; SIGUSR2 toggles DEBUG)")
+    parser.add_argument("--log-format", choices=FORMATS, default='text',
+                        help="text = [LEVEL] lines, json = one JSON object per line (default: text)")
+    parser.add_argument("--log-sample", type=int, default=1, metavar='N',
+                        help="Log only every Nth per-message line (default: 1 = all)")
+
+
+def configure_logging_from_args(args):
+    """Configure logging from parsed command-line arguments."""
+    configure_logging(args.log_level, args.log_format, args.log_sample)
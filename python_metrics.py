@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+In-process metrics shared by the HTTP, IPC and gRPC servers.
+
+A MetricsRegistry hands out counter, gauge and histogram handles. Recording
+never takes a lock: every thread (handler thread, connection thread or the
+event loop) writes into its own shard, and snapshot() sums the shards. Shards
+of threads that have exited are folded into one retired shard on the next
+snapshot, so thread-per-connection servers do not accumulate them.
+
+Histograms are HDR-style log-linear: values (nanoseconds) below 32 get exact
+buckets, larger values get 16 sub-buckets per power of two, i.e. every
+recorded value is within 1/16 (~6%) of its bucket bound, from 1 ns up to
+about 4.9 hours, in a fixed array of counts.
+
+The HTTP server renders a registry as Prometheus text at GET /metrics; the
+socket servers answer a STATS frame with a STATS_RESPONSE whose attributes
+hold snapshot().
+
+Every request is timed per stage with perf_counter_ns into stage_seconds:
+read (the frame payload or HTTP body, once its length prefix or head has
+arrived), decode, validate, encode and send. A request with a top-level
+"server_timing": true gets its own read/decode/validate durations back as a
+server_timing entry of the response's attributes, {"read": 0.012, ...} in
+milliseconds; HTTP responses carry them (plus encode) in a Server-Timing
+header as well, for every /validate when the server runs with --server-timing.
+
+In --workers mode each worker publishes export_state() (raw counts, not
+quantiles) and sets `peers` to a callable returning the other workers' states,
+which snapshot() and render_prometheus() sum in (see python_workers).
+"""
+
+import threading
+import time
+from threading import Lock
+
+STATS_TYPE = 'STATS'
+STATS_RESPONSE_TYPE = 'STATS_RESPONSE'
+NAMESPACE = 'simple_python'
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+MAX_VALUE_BITS = 44  # 2**44 ns ~ 4.9 hours
+QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999))
+PROMETHEUS_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                      0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGES = ('read', 'decode', 'validate', 'encode', 'send')
+SERVER_TIMING_FIELD = 'server_timing'
+
+
+def bucket_index(value):
+    """Log-linear bucket of a non-negative integer value."""
+    bits = value.bit_length()
+    if bits <= SUB_BUCKET_BITS:
+        return value
+    shift = bits - SUB_BUCKET_BITS
+    return (shift * SUB_BUCKETS) + (value >> shift)
+
+
+def bucket_upper_bound(index):
+    """Highest value that lands in bucket `index`."""
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index - shift * SUB_BUCKETS + 1) << shift) - 1
+
+
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+BUCKET_COUNT = bucket_index(MAX_VALUE) + 1
+
+
+class _HistogramCells:
+    __slots__ = ('counts', 'total', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.total = 0
+        self.maximum = 0
+
+    def merge(self, other):
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+
+class _Shard:
+    """One thread's private counters and histogram cells."""
+
+    __slots__ = ('thread', 'values', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.values = {}
+        self.histograms = {}
+
+    def merge_into(self, values, histograms):
+        for key, value in self.values.copy().items():
+            values[key] = values.get(key, 0) + value
+        for key, cells in self.histograms.copy().items():
+            merged = histograms.get(key)
+            if merged is None:
+                merged = histograms[key] = _HistogramCells()
+            merged.merge(cells)
+
+
+class Counter:
+    """Monotonic count; gauges use the same cells with negative increments."""
+
+    __slots__ = ('registry', 'key')
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def inc(self, value=1):
+        values = self.registry._shard().values
+        values[self.key] = values.get(self.key, 0) + value
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def add(self, delta):
+        self.inc(delta)
+
+
+class Histogram:
+    """Latency distribution recorded in nanoseconds, reported in seconds."""
+
+    __slots__ = ('registry', 'key')
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def observe_ns(self, value):
+        histograms = self.registry._shard().histograms
+        cells = histograms.get(self.key)
+        if cells is None:
+            cells = histograms[self.key] = _HistogramCells()
+        if value > MAX_VALUE:
+            value = MAX_VALUE
+        cells.counts[bucket_index(value)] += 1
+        cells.total += value
+        if value > cells.maximum:
+            cells.maximum = value
+
+
+class MetricsRegistry:
+    """Named metrics with per-thread recording and merged snapshots."""
+
+    def __init__(self, namespace=NAMESPACE):
+        self.namespace = namespace
+        self.started = time.time()
+        self.families = {}  # name -> (type, help)
+        self.handles = {}
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = Lock()
+        self.peers = None  # callable returning other processes' export_state() dicts
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _handle(self, cls, kind, name, help_text, labels):
+        name = f"{self.namespace}_{name}"
+        key = (name, tuple(sorted(labels.items())))
+        handle = self.handles.get(key)
+        if handle is None:
+            with self._lock:
+                self.families.setdefault(name, (kind, help_text))
+                handle = self.handles.setdefault(key, cls(self, key))
+        return handle
+
+    def counter(self, name, help_text='', **labels):
+        return self._handle(Counter, 'counter', name, help_text, labels)
+
+    def gauge(self, name, help_text='', **labels):
+        return self._handle(Gauge, 'gauge', name, help_text, labels)
+
+    def histogram(self, name, help_text='', **labels):
+        return self._handle(Histogram, 'histogram', name, help_text, labels)
+
+    def _merged(self, include_peers=True):
+        """Sum every shard, retiring those of threads that have exited."""
+        values = {}
+        histograms = {}
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    shard.merge_into(self._retired.values, self._retired.histograms)
+            self._shards = live
+            self._retired.merge_into(values, histograms)
+            for shard in live:
+                shard.merge_into(values, histograms)
+        if include_peers and self.peers is not None:
+            for state in self.peers():
+                self._merge_state(state, values, histograms)
+        return values, histograms
+
+    def export_state(self):
+        """This process's raw values and histogram counts as a JSON-able dict."""
+        values, histograms = self._merged(include_peers=False)
+        return {
+            "families": {name: list(family) for name, family in self.families.items()},
+            "values": [[name, [list(label) for label in labels], value]
+                       for (name, labels), value in values.items()],
+            "histograms": [[name, [list(label) for label in labels],
+                            {str(index): count for index, count in enumerate(cells.counts) if count},
+                            cells.total, cells.maximum]
+                           for (name, labels), cells in histograms.items()],
+        }
+
+    def _merge_state(self, state, values, histograms):
+        """Add another process's export_state() into merged values and histograms."""
+        with self._lock:
+            for name, family in state["families"].items():
+                self.families.setdefault(name, tuple(family))
+        for name, labels, value in state["values"]:
+            key = self._peer_key(name, labels, Counter)
+            values[key] = values.get(key, 0) + value
+        for name, labels, counts, total, maximum in state["histograms"]:
+            key = self._peer_key(name, labels, Histogram)
+            cells = histograms.get(key)
+            if cells is None:
+                cells = histograms[key] = _HistogramCells()
+            for index, count in counts.items():
+                cells.counts[int(index)] += count
+            cells.total += total
+            cells.maximum = max(cells.maximum, maximum)
+
+    def _peer_key(self, name, labels, cls):
+        key = (name, tuple(tuple(label) for label in labels))
+        if key not in self.handles:
+            with self._lock:
+                self.handles.setdefault(key, cls(self, key))
+        return key
+
+    def snapshot(self):
+        """Plain-dict view of every metric (the STATS_RESPONSE attributes)."""
+        values, histograms = self._merged()
+        snapshot = {"uptime_seconds": round(time.time() - self.started, 3),
+                    "counters": [], "gauges": [], "histograms": []}
+        for key, handle in sorted(self.handles.items()):
+            name, labels = key
+            kind = self.families[name][0]
+            entry = {"name": name, "labels": dict(labels)}
+            if kind == 'histogram':
+                cells = histograms.get(key) or _HistogramCells()
+                entry.update(histogram_summary(cells))
+                snapshot["histograms"].append(entry)
+            else:
+                entry["value"] = values.get(key, 0)
+                snapshot[kind + "s"].append(entry)
+        return snapshot
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        values, histograms = self._merged()
+        by_family = {}
+        for key in sorted(self.handles):
+            by_family.setdefault(key[0], []).append(key)
+
+        lines = []
+        for name, keys in by_family.items():
+            kind, help_text = self.families[name]
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in keys:
+                labels = key[1]
+                if kind != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {values.get(key, 0)}")
+                    continue
+                cells = histograms.get(key) or _HistogramCells()
+                cumulative = _cumulative_buckets(cells)
+                for bound, count in zip(PROMETHEUS_BUCKETS, cumulative):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {count}")
+                count = sum(cells.counts)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {cells.total / 1e9:.9f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _cumulative_buckets(cells):
+    bounds_ns = [bound * 1e9 for bound in PROMETHEUS_BUCKETS]
+    cumulative = [0] * len(bounds_ns)
+    position = 0
+    running = 0
+    for index, count in enumerate(cells.counts):
+        if not count:
+            continue
+        upper = bucket_upper_bound(index)
+        while position < len(bounds_ns) and upper > bounds_ns[position]:
+            cumulative[position] = running
+            position += 1
+        running += count
+    for position in range(position, len(bounds_ns)):
+        cumulative[position] = running
+    return cumulative
+
+
+def histogram_summary(cells):
+    """Count, sum, max and quantiles (seconds) of merged histogram cells."""
+    count = sum(cells.counts)
+    summary = {"count": count,
+               "sum_seconds": cells.total / 1e9,
+               "max_seconds": cells.maximum / 1e9}
+    targets = [(label, quantile * count) for label, quantile in QUANTILES]
+    running = 0
+    for index, bucket_count in enumerate(cells.counts):
+        if not bucket_count:
+            continue
+        running += bucket_count
+        while targets and running >= targets[0][1]:
+            label = targets.pop(0)[0]
+            summary[label + "_seconds"] = min(bucket_upper_bound(index), cells.maximum) / 1e9
+        if not targets:
+            break
+    for label, _ in targets:
+        summary[label + "_seconds"] = 0.0
+    return summary
+
+
+class TransportMetrics:
+    """The handles one server records into, labelled with its transport (and server, if given)."""
+
+    def __init__(self, registry, transport, server=None):
+        self.registry = registry
+        self.transport = transport
+        self.labels = {'transport': transport}
+        if server:
+            # servers sharing one registry (python_servers) stay distinguishable
+            self.labels['server'] = server
+        labels = self.labels
+        self.requests = registry.counter('requests_total', 'Requests received', **labels)
+        self.bytes_in = registry.counter('received_bytes_total', 'Request bytes read', **labels)
+        self.bytes_out = registry.counter('sent_bytes_total', 'Response bytes written', **labels)
+        self.connections = registry.gauge('active_connections', 'Open client connections', **labels)
+        self.read, self.decode, self.validate, self.encode, self.send = (
+            registry.histogram('stage_seconds', 'Time spent per request stage', stage=stage, **labels)
+            for stage in STAGES)
+
+    def error(self, kind):
+        """Count one error of `kind` (invalid_json, incomplete_message, handler_exception, ...)."""
+        self.registry.counter('errors_total', 'Errors by kind', kind=kind, **self.labels).inc()
+
+    def rejected(self, reason):
+        """Count one request or connection shed by admission control (max_in_flight, ...)."""
+        self.registry.counter('rejected_total', 'Requests and connections shed by admission control',
+                              reason=reason, **self.labels).inc()
+
+    def reclaimed(self, reason):
+        """Count one connection closed by its idle, read or write timeout (see python_timeouts)."""
+        self.registry.counter('reclaimed_connections_total', 'Connections closed by a timeout',
+                              reason=reason, **self.labels).inc()
+
+
+def wants_server_timing(message):
+    """True if a request asks for its stage timings in the response."""
+    return message.get(SERVER_TIMING_FIELD) is True
+
+
+class ServerTiming:
+    """One request's stage durations in nanoseconds, in the order they were recorded."""
+
+    __slots__ = ('stages', 'requested')
+
+    def __init__(self, **stages):
+        self.stages = stages
+        self.requested = False
+
+    def add(self, stage, nanoseconds):
+        self.stages[stage] = nanoseconds
+
+    def milliseconds(self):
+        return {stage: round(nanoseconds / 1e6, 3) for stage, nanoseconds in self.stages.items()}
+
+    def attach(self, response):
+        """A copy of `response` carrying the stages so far as attributes["server_timing"]."""
+        attributes = response.get("attributes")
+        attributes = dict(attributes) if isinstance(attributes, dict) else {}
+        attributes[SERVER_TIMING_FIELD] = self.milliseconds()
+        return dict(response, attributes=attributes)
+
+    def header(self):
+        """The Server-Timing header value, e.g. "read;dur=0.012, decode;dur=0.031"."""
+        return ', '.join(f"{stage};dur={value}" for stage, value in self.milliseconds().items())
+
+
+def is_stats_request(message):
+    """True if the message asks for a STATS snapshot."""
+    return message.get("type") == STATS_TYPE
+
+
+def stats_response(message, registry):
+    """Build the STATS_RESPONSE for a STATS request."""
+    return {
+        "type": STATS_RESPONSE_TYPE,
+        "message_id": message.get("message_id", "unknown"),
+        "attributes": registry.snapshot()
+    }
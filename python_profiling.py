@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+On-demand sampling profiler for the HTTP, IPC and gRPC servers.
+
+A StackSampler samples the stack of every thread (sys._current_frames())
+every `interval` seconds for the requested duration, then writes the counts in
+the collapsed-stack format that flamegraph.pl, speedscope and inferno read,
+one line per distinct stack:
+
+    MainThread;_run_once (base_events.py:1845);handle_stream (python_frame_server.py:262) 42
+
+Sampling runs on its own thread and costs nothing when idle, so a profile can
+be taken from a running server without restarting it:
+
+  - SIGUSR1 profiles for --profile-seconds (the --workers master forwards it
+    to every worker)
+  - POST /profile?seconds=N on the HTTP server
+  - a PROFILE frame ({"type": "PROFILE", "attributes": {"seconds": N}}) on the
+    IPC and gRPC servers, answered with a PROFILE_RESPONSE
+
+Each answer carries the path of the profile being written:
+<--profile-dir>/profile-<pid>-<start time>.collapsed, complete once `seconds`
+have passed. One profile runs at a time; a request while one is running gets
+that profile's path.
+
+Samples are wall-clock: threads waiting in select() or on a lock are counted
+too, which is what shows where a slow request spent its time.
+"""
+
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from python_logging import log
+from python_validation import error_response
+
+PROFILE_TYPE = 'PROFILE'
+PROFILE_RESPONSE_TYPE = 'PROFILE_RESPONSE'
+DEFAULT_SECONDS = 10.0
+DEFAULT_INTERVAL = 0.005
+MAX_SECONDS = 600.0
+
+
+class StackSampler:
+    """Samples every thread's stack on demand and writes collapsed stacks."""
+
+    def __init__(self, directory=None, default_seconds=DEFAULT_SECONDS, interval=DEFAULT_INTERVAL):
+        self.directory = directory or tempfile.gettempdir()
+        self.default_seconds = default_seconds
+        self.interval = interval
+        self.lock = threading.RLock()  # start() may run in a signal handler
+        self.path = None  # the profile being written
+
+    def start(self, seconds=None):
+        """Start a profile of `seconds`; returns (path, started) - started is False if one was running."""
+        seconds = min(float(seconds or self.default_seconds), MAX_SECONDS)
+        with self.lock:
+            if self.path is not None:
+                return self.path, False
+            os.makedirs(self.directory, exist_ok=True)
+            now = time.time()
+            name = f"profile-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}" \
+                   f"{int(now * 1000) % 1000:03d}.collapsed"
+            path = self.path = os.path.join(self.directory, name)
+        threading.Thread(target=self._run, args=(seconds, path), name="stack-sampler", daemon=True).start()
+        log.info("Profiling for %gs into %s", seconds, path)
+        return path, True
+
+    def _run(self, seconds, path):
+        counts = Counter()
+        own = threading.get_ident()
+        names = {}
+        samples = 0
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                frames = sys._current_frames()
+                if any(ident not in names for ident in frames):
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in frames.items():
+                    if ident != own:
+                        counts[self._collapse(names.get(ident, str(ident)), frame)] += 1
+                samples += 1
+                frames = frame = None
+                time.sleep(self.interval)
+            with open(path, 'w') as profile:
+                for stack, count in counts.most_common():
+                    profile.write(f"{stack} {count}\n")
+            log.info("Profile written to %s (%d samples, %d stacks)", path, samples, len(counts))
+        except OSError as e:
+            log.error("Could not write profile %s: %s", path, e)
+        finally:
+            with self.lock:
+                self.path = None
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack.append(thread_name.replace(' ', '_'))
+        return ';'.join(reversed(stack)).replace('\n', ' ')
+
+    def install_signal_handler(self):
+        """Profile for default_seconds on SIGUSR1 (POSIX; main thread only)."""
+        if hasattr(signal, 'SIGUSR1'):
+            try:
+                signal.signal(signal.SIGUSR1, lambda signum, frame: self.start())
+            except ValueError:
+                pass  # not the main thread
+
+    def respond(self, message):
+        """Answer a PROFILE frame: start (or report) a profile."""
+        message_id = message.get("message_id", "unknown")
+        attributes = message.get("attributes") or {}
+        try:
+            seconds = float(attributes.get("seconds") or self.default_seconds)
+        except (TypeError, ValueError):
+            seconds = None
+        if seconds is None or not seconds > 0:
+            return error_response(message_id, "INVALID_PROFILE", "attributes.seconds must be a positive number")
+        path, started = self.start(seconds)
+        return {
+            "type": PROFILE_RESPONSE_TYPE,
+            "message_id": message_id,
+            "attributes": {"profile": path, "seconds": seconds, "started": started}
+        }
+
+
+def is_profile_request(message):
+    return message.get("type") == PROFILE_TYPE
+
+
+def add_profiling_arguments(parser):
+    """Add the profiler command-line options shared by every server."""
+    parser.add_argument("--profile-dir", default=None,
+                        help="Directory for collapsed-stack profiles (default: the system temp directory)")
+    parser.add_argument("--profile-seconds", type=float, default=DEFAULT_SECONDS,
+                        help=f"Length of a SIGUSR1-triggered profile (default: {DEFAULT_SECONDS:g})")
+
+
+def profiler_from_args(args):
+    """Build the process's StackSampler and let SIGUSR1 trigger it."""
+    profiler = StackSampler(args.profile_dir, args.profile_seconds)
+    profiler.install_signal_handler()
+    return profiler
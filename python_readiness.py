@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Readiness signalling between the servers and the start_*_blocking launchers.
+
+A server tells whoever started it that it is listening, the moment its socket
+is bound, instead of being polled with connect attempts:
+
+  --ready-fd FD         write one "READY <address>\\n" line to an inherited file
+                        descriptor (1 = stdout) and close it
+  --notify-socket PATH  send a systemd-style "READY=1" datagram to an AF_UNIX
+                        socket ('@name' = abstract namespace); $NOTIFY_SOCKET is
+                        used when the option is not given, so the servers work
+                        as Type=notify services
+
+<address> is the bound TCP port - the real one when the server was asked for
+port 0 - or the Unix socket / shared-memory path. A server with several
+listeners (python_servers.py) reports one address per listener on the same
+line, in http, ipc, grpc order.
+
+launch() is the launcher side: it starts a server with --ready-fd on a pipe
+and blocks in readline() until the READY line arrives, the server exits, or
+the timeout passes - no connect polling, so it wakes as soon as the port is
+bound.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+READY = 'READY'
+NOTIFY_SOCKET_ENV = 'NOTIFY_SOCKET'
+DEFAULT_TIMEOUT = 15.0
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# protocol -> (server script, port option; None = positional port)
+SERVER_SCRIPTS = {
+    'http': ('python_test_server.py', '--port'),
+    'ipc': ('python_ipc_server.py', None),
+    'grpc': ('python_grpc_server.py', None),
+}
+
+
+class ReadyNotifier:
+    """Reports a server's bound addresses once, on every configured channel."""
+
+    def __init__(self, ready_fd=None, notify_socket=None):
+        self.ready_fd = ready_fd
+        self.notify_socket = notify_socket
+        self.notified = False
+
+    def __call__(self, *addresses):
+        if self.notified:
+            return
+        self.notified = True
+        line = ' '.join([READY] + [str(address) for address in addresses]) + '\n'
+        if self.ready_fd is not None:
+            try:
+                os.write(self.ready_fd, line.encode('ascii'))
+                if self.ready_fd > 2:
+                    os.close(self.ready_fd)
+            except OSError:
+                pass  # nobody is waiting any more
+        if self.notify_socket:
+            self._notify(addresses)
+
+    def _notify(self, addresses):
+        target = self.notify_socket
+        if target.startswith('@'):
+            target = '\0' + target[1:]
+        message = f"READY=1\nMAINPID={os.getpid()}\nSTATUS=listening on {' '.join(map(str, addresses))}\n"
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(message.encode('utf-8'), target)
+        except OSError:
+            pass
+
+
+def collect(notify, count):
+    """A callback that calls `notify` once all `count` listeners have reported."""
+    addresses = [None] * count
+    reported = set()
+    lock = threading.Lock()
+
+    def ready(index, address):
+        with lock:
+            addresses[index] = address
+            reported.add(index)
+            complete = len(reported) == count
+        if complete:
+            notify(*addresses)
+    return ready
+
+
+def add_readiness_arguments(parser):
+    """Add the readiness command-line options shared by every server."""
+    parser.add_argument("--ready-fd", type=int, default=None, metavar='FD',
+                        help="Write 'READY <port>' to this inherited file descriptor once listening (1 = stdout)")
+    parser.add_argument("--notify-socket", default=os.environ.get(NOTIFY_SOCKET_ENV), metavar='PATH',
+                        help=f"Send a READY=1 datagram to this AF_UNIX socket once listening (default: ${NOTIFY_SOCKET_ENV})")
+
+
+def notifier_from_args(args):
+    """Build a ReadyNotifier from parsed arguments, or None if nothing listens for readiness."""
+    if args.ready_fd is None and not args.notify_socket:
+        return None
+    return ReadyNotifier(args.ready_fd, args.notify_socket)
+
+
+def server_argv(protocol, port, extra_args=()):
+    """Command line starting the `protocol` server on `port`."""
+    script, port_flag = SERVER_SCRIPTS[protocol]
+    port_args = [port_flag, str(port)] if port_flag else [str(port)]
+    return [sys.executable, os.path.join(SCRIPT_DIR, script)] + port_args + list(extra_args)
+
+
+def detach_options():
+    """Popen options that let a server outlive the launcher that started it."""
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def launch(argv, timeout=DEFAULT_TIMEOUT, cwd=None, stderr=subprocess.DEVNULL, kill_on_timeout=True):
+    """Start a server and wait for its READY line; returns (process, addresses).
+
+    The server reports on a private pipe passed as --ready-fd (stdout on
+    Windows, which cannot pass other descriptors). Raises TimeoutError if it is
+    not listening within `timeout` seconds and RuntimeError if it exits first.
+    """
+    if os.name == 'posix':
+        ready_read, ready_write = os.pipe()
+        options = {'stdout': subprocess.DEVNULL, 'pass_fds': (ready_write,)}
+    else:
+        ready_read, ready_write = None, 1
+        options = {'stdout': subprocess.PIPE}
+    try:
+        process = subprocess.Popen(list(argv) + ['--ready-fd', str(ready_write)], stderr=stderr,
+                                   stdin=subprocess.DEVNULL, cwd=cwd, **options, **detach_options())
+    finally:
+        if ready_read is not None:
+            os.close(ready_write)
+    pipe = os.fdopen(ready_read, 'rb') if ready_read is not None else process.stdout
+    lines = []
+    # readline() returns the moment the server writes, or at EOF when it exits
+    reader = threading.Thread(target=lambda: lines.append(pipe.readline()), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    if not lines:
+        if kill_on_timeout:
+            process.kill()
+        raise TimeoutError(f"server did not report readiness within {timeout:g} seconds")
+    pipe.close()
+    fields = lines[0].decode('ascii', 'replace').split()
+    if not fields or fields[0] != READY:
+        code = process.wait()
+        raise RuntimeError(f"server exited with code {code} before it was listening")
+    return process, fields[1:]
+
+
+def run_launcher(protocol, default_port, description):
+    """Command-line body of the start_*_blocking launchers.
+
+    `--supervise N` starts a python_supervisor pool of N servers instead of a
+    single server and waits until the whole pool is up.
+    """
+    parser = argparse.ArgumentParser(description=f"Start the {description} and wait until it is listening")
+    parser.add_argument("port", nargs='?', type=int, default=default_port,
+                        help=f"Port to listen on, 0 = any free port (default: {default_port})")
+    parser.add_argument("--supervise", type=int, default=0, metavar='N',
+                        help="Run a supervised pool of N servers (see python_supervisor.py)")
+    args = parser.parse_args()
+    if args.supervise:
+        argv = [sys.executable, os.path.join(SCRIPT_DIR, 'python_supervisor.py'), protocol,
+                '--port', str(args.port), '--pool', str(args.supervise)]
+        description = f"supervised pool of {args.supervise} {description}s"
+    else:
+        argv = server_argv(protocol, args.port)
+    print(f"[LAUNCHER] Starting {description} on port {args.port}...", file=sys.stderr)
+    print(f"[LAUNCHER] Command: {' '.join(argv[1:])}", file=sys.stderr)
+    sys.stderr.flush()
+    try:
+        process, addresses = launch(argv, cwd=SCRIPT_DIR)
+    except (OSError, RuntimeError, TimeoutError) as e:
+        print(f"[LAUNCHER] ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[LAUNCHER] Server (PID {process.pid}) is listening on {' '.join(addresses)}", file=sys.stderr)
+    sys.stderr.flush()
+    print(' '.join([READY] + addresses))  # signal the caller, with the port actually bound
+    sys.stdout.flush()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of validation responses.
+
+Responses are keyed by a SHA-256 of the canonical JSON of (type, attributes),
+so a retried or re-submitted request with the same payload is answered without
+running its validator again. Entries are evicted least-recently-used beyond
+`max_entries` and expire `ttl` seconds after they were stored.
+
+A hit returns the stored response with only the message_id (and, if present,
+attributes.echoed_message_id) rewritten for the new request.
+
+Once bound to a server's metrics registry the cache counts lookups in
+result_cache_lookups_total{outcome="hit"|"miss"}, dropped entries in
+result_cache_evictions_total{reason="lru"|"expired"} and its size in the
+result_cache_entries gauge.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class ResultCache:
+    """Bounded LRU + TTL cache with hit/miss/eviction metrics."""
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = None
+        self.misses = None
+        self.evictions = None
+        self.expirations = None
+        self.size = None
+
+    def bind_metrics(self, registry):
+        """Count lookups, evictions and entries in `registry` (the servers sharing a cache share a registry)."""
+        lookups = 'Result cache lookups'
+        evictions = 'Result cache entries dropped (lru: beyond max_entries, expired: past the ttl)'
+        self.hits = registry.counter('result_cache_lookups_total', lookups, outcome='hit')
+        self.misses = registry.counter('result_cache_lookups_total', lookups, outcome='miss')
+        self.evictions = registry.counter('result_cache_evictions_total', evictions, reason='lru')
+        self.expirations = registry.counter('result_cache_evictions_total', evictions, reason='expired')
+        self.size = registry.gauge('result_cache_entries', 'Responses held in the result cache')
+
+    @staticmethod
+    def key(message):
+        """Canonical hash of a request's type and attributes."""
+        canonical = json.dumps([message.get("type"), message.get("attributes")],
+                               sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).digest()
+
+    def get(self, key, message_id):
+        """Return the cached response re-addressed to `message_id`, or None."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if self.misses:
+                    self.misses.inc()
+                return None
+            expires, response = entry
+            if expires < now:
+                del self.entries[key]
+                if self.misses:
+                    self.misses.inc()
+                    self.expirations.inc()
+                    self.size.add(-1)
+                return None
+            self.entries.move_to_end(key)
+            if self.hits:
+                self.hits.inc()
+
+        hit = dict(response)
+        hit["message_id"] = message_id
+        attributes = response.get("attributes")
+        if isinstance(attributes, dict) and "echoed_message_id" in attributes:
+            hit["attributes"] = dict(attributes, echoed_message_id=message_id)
+        return hit
+
+    def put(self, key, response):
+        """Store a response, evicting the least recently used entries."""
+        with self.lock:
+            size = len(self.entries)
+            self.entries[key] = (time.monotonic() + self.ttl, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                if self.evictions:
+                    self.evictions.inc()
+            if self.size:
+                self.size.add(len(self.entries) - size)
+
+    def clear(self):
+        """Drop every entry (the validators that produced them were reloaded)."""
+        with self.lock:
+            if self.size:
+                self.size.add(-len(self.entries))
+            self.entries.clear()
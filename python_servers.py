@@ -1,247 +1,190 @@
 #!/usr/bin/env python3
 """
-Python test servers for simple_python Eiffel-Python bridge validation.
-
-Implements three protocols:
-- HTTP: JSON over HTTP/1.1
-- IPC: Windows named pipes
-- gRPC: (placeholder for Phase 2)
+Unified simple_python test server: HTTP, IPC and gRPC from one process.
+
+Every enabled protocol listens on the same asyncio event loop:
+- HTTP: JSON over keep-alive HTTP/1.1 (POST /validate, POST /echo, GET /health,
+  GET /metrics; see python_http_server)
+- IPC:  4-byte length prefix + JSON frames on port 9001 (see python_ipc_server)
+- gRPC: the same framing on port 9002 (see python_grpc_server)
+
+The listeners share one ValidationService (validator modules are loaded and
+warmed once, with one process pool, one result cache and one idempotency
+journal, so a retry answers from it whichever protocol it arrives on), one
+handler thread pool, one metrics registry (series are labelled by transport and
+server) and one set of admission limits, compression settings and timeouts, instead of
+three interpreters each holding their own copy. One profiler samples every
+listener (SIGUSR1, POST /profile or a PROFILE frame; see python_profiling).
+SIGTERM drains every listener at once and SIGHUP reloads the shared validators
+(see python_lifecycle).
+
+Usage: python3 python_servers.py [http] [ipc] [grpc] [options]    (see --help)
+With no protocol named, all three are served.
 """
 
-import json
-import struct
-import threading
-import socket
-import sys
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from datetime import datetime
-
-
-class SimplepythonHTTPHandler(BaseHTTPRequestHandler):
-    """HTTP handler implementing simple_python protocol."""
-
-    def log_message(self, format, *args):
-        """Suppress default HTTP logging."""
-        pass
-
-    def do_POST(self):
-        """Handle POST request with simple_python message."""
-        try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                self.send_error(400, "Missing Content-Length")
-                return
-
-            body = self.rfile.read(content_length)
-
-            # Decode message (4-byte length prefix + JSON)
-            if len(body) < 4:
-                self.send_error(400, "Message too short")
-                return
-
-            length = struct.unpack('>I', body[:4])[0]
-            if len(body) < 4 + length:
-                self.send_error(400, "Incomplete message")
-                return
-
-            json_data = body[4:4+length].decode('utf-8')
-            request = json.loads(json_data)
-
-            print(f"[HTTP] Received request: {request.get('message_id')}")
-
-            # Validate request structure
-            if 'message_id' not in request or 'type' not in request:
-                self.send_error(400, "Missing required fields")
-                return
-
-            # Echo back as validation_response
-            response = {
-                'message_id': request['message_id'],
-                'type': 'validation_response',
-                'timestamp': datetime.now().isoformat(),
-                'attributes': {
-                    'result': 'PASS',
-                    'score': 0.95,
-                    'message': 'Validation passed'
-                }
-            }
-
-            # Send response with 4-byte length prefix
-            response_json = json.dumps(response)
-            response_bytes = struct.pack('>I', len(response_json)) + response_json.encode('utf-8')
-
-            self.send_response(200)
-            self.send_header('Content-Length', str(len(response_bytes)))
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(response_bytes)
-
-            print(f"[HTTP] Sent response: {response.get('message_id')}")
-
-        except json.JSONDecodeError:
-            self.send_error(400, "Invalid JSON")
-        except Exception as e:
-            print(f"[HTTP] Error: {e}")
-            self.send_error(500, str(e))
-
-
-class SimplepythonIPCServer:
-    """IPC server using Windows named pipes."""
-
-    def __init__(self, pipe_name):
-        """Initialize IPC server with pipe name."""
-        self.pipe_name = pipe_name
-        self.running = False
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from python_admission import AdmissionControl, add_admission_arguments, admission_from_args
+from python_capture import add_capture_arguments, capture_from_args
+from python_compression import CompressionSettings, add_compression_arguments, compression_from_args
+from python_frame_server import DEFAULT_BACKLOG
+from python_grpc_server import GRPCServer
+from python_http_server import DEFAULT_MAX_PIPELINE, HTTPValidationServer
+from python_ipc_server import IPCServer
+from python_lifecycle import DEFAULT_DRAIN_TIMEOUT, add_lifecycle_arguments, install_signal_handlers
+from python_logging import SHUTDOWN, STARTUP, add_logging_arguments, configure_logging_from_args, log
+from python_metrics import MetricsRegistry
+from python_profiling import StackSampler, add_profiling_arguments, profiler_from_args
+from python_readiness import add_readiness_arguments, collect, notifier_from_args
+from python_timeouts import ConnectionTimeouts, add_timeout_arguments, timeouts_from_args
+from python_validators import ValidationService, add_validation_arguments, validation_service_from_args
+
+PROTOCOLS = ('http', 'ipc', 'grpc')
+DEFAULT_PORTS = {'http': 8080, 'ipc': 9001, 'grpc': 9002}
+
+
+class UnifiedServer:
+    """HTTP, IPC and gRPC listeners on one event loop with shared validation and metrics."""
+
+    name = 'simple_python'
+
+    def __init__(self, protocols=PROTOCOLS, host='127.0.0.1', ports=None, backlog=DEFAULT_BACKLOG,
+                 handler_threads=None, max_pipeline=DEFAULT_MAX_PIPELINE, multiplex=False,
+                 validation=None, metrics=None, admission=None, compression=None, capture=None, profiler=None,
+                 server_timing=False, timeouts=None, on_ready=None):
+        ports = dict(DEFAULT_PORTS, **(ports or {}))
+        self.validation = validation or ValidationService()
+        self.metrics = metrics or MetricsRegistry()
+        self.admission = admission or AdmissionControl()
+        self.compression = compression or CompressionSettings()
+        self.capture = capture
+        self.profiler = profiler or StackSampler()
+        self.timeouts = timeouts or ConnectionTimeouts()
+        self.handler_threads = handler_threads
+        self.executor = None
+        shared = {'validation': self.validation, 'metrics': self.metrics, 'admission': self.admission,
+                  'compression': self.compression, 'capture': self.capture, 'profiler': self.profiler,
+                  'timeouts': self.timeouts}
+        self.servers = []
+        if 'http' in protocols:
+            self.servers.append(HTTPValidationServer(ports['http'], host, backlog=backlog,
+                                                     max_pipeline=max_pipeline, server_timing=server_timing,
+                                                     **shared))
+        if 'ipc' in protocols:
+            self.servers.append(IPCServer(ports['ipc'], host=host, backlog=backlog, multiplex=multiplex, **shared))
+        if 'grpc' in protocols:
+            self.servers.append(GRPCServer(ports['grpc'], host=host, backlog=backlog, multiplex=multiplex,
+                                           **shared))
+        if on_ready:
+            # one readiness report, listing every listener's address, once all are bound
+            ready = collect(on_ready, len(self.servers))
+            for index, server in enumerate(self.servers):
+                server.on_ready = lambda address, index=index: ready(index, address)
 
     def start(self):
-        """Start IPC server (stub for demonstration)."""
-        print(f"[IPC] Starting server on {self.pipe_name}")
-        print("[IPC] Note: Full IPC implementation requires Win32 API (pywin32)")
-        # In production, use:
-        # import win32pipe, win32file, pywintypes
-        # Named pipe communication here
-        self.running = True
-
-    def stop(self):
-        """Stop IPC server."""
-        self.running = False
-        print("[IPC] Server stopped")
-
-    def handle_connection(self, pipe):
-        """Handle single pipe connection."""
+        """Start every listener (blocks until stopped)."""
+        self.validation.start()
+        self.executor = ThreadPoolExecutor(max_workers=self.handler_threads,
+                                           thread_name_prefix=f"{self.name}-handler")
+        for server in self.servers:
+            # frame servers validate on the loop unless their mode needs the pool
+            if isinstance(server, HTTPValidationServer) or server.uses_handler_pool():
+                server.executor = self.executor
         try:
-            # Read 4-byte length prefix
-            length_bytes = pipe.read(4)
-            if len(length_bytes) < 4:
-                return
-
-            length = struct.unpack('>I', length_bytes)[0]
-
-            # Read payload
-            json_data = pipe.read(length).decode('utf-8')
-            request = json.loads(json_data)
-
-            print(f"[IPC] Received request: {request.get('message_id')}")
-
-            # Send response
-            response = {
-                'message_id': request['message_id'],
-                'type': 'validation_response',
-                'timestamp': datetime.now().isoformat(),
-                'attributes': {
-                    'result': 'PASS',
-                    'latency_ms': 5  # IPC is ultra-fast
-                }
-            }
+            asyncio.run(self.serve_async())
+        finally:
+            self.executor.shutdown(wait=False)
+            self.validation.shutdown()
+            if self.capture:
+                self.capture.shutdown()
+
+    async def serve_async(self):
+        log.info("%s unified server: %s (%s)", self.name,
+                 ', '.join(f"{server.name} on {server.port}" for server in self.servers),
+                 self.validation.description(), extra=STARTUP)
+        await asyncio.gather(*(server.serve_async() for server in self.servers))
+
+    def drain(self, timeout):
+        """Drain every listener within `timeout` seconds, then stop (SIGTERM)."""
+        for server in self.servers:
+            server.drain(timeout)
 
-            response_json = json.dumps(response)
-            response_bytes = struct.pack('>I', len(response_json)) + response_json.encode('utf-8')
-            pipe.write(response_bytes)
-
-            print(f"[IPC] Sent response: {response.get('message_id')}")
-
-        except Exception as e:
-            print(f"[IPC] Connection error: {e}")
-
-
-class SimplepythonGRPCServer:
-    """gRPC server (Phase 2 placeholder)."""
+    def stop(self):
+        """Stop every listener (safe to call from any thread)."""
+        for server in self.servers:
+            server.stop()
 
-    def __init__(self, host, port):
-        """Initialize gRPC server."""
-        self.host = host
-        self.port = port
 
-    def start(self):
-        """Start gRPC server (stub)."""
-        print(f"[gRPC] Starting server on {self.host}:{self.port}")
-        print("[gRPC] Note: Full gRPC implementation requires grpcio and protobuf")
-        # In production, use:
-        # from concurrent import futures
-        # import grpc
-        # Define service with simple_python.proto
-
-
-def run_http_server(host='localhost', port=8080):
-    """Run HTTP test server."""
-    print(f"\n{'='*60}")
-    print(f"simple_python HTTP Test Server")
-    print(f"{'='*60}")
-    print(f"Listening on {host}:{port}")
-    print("Waiting for validation requests...")
-    print("(Press Ctrl+C to stop)\n")
-
-    server = HTTPServer((host, port), SimplepythonHTTPHandler)
+def run_servers(protocols=PROTOCOLS, drain_timeout=DEFAULT_DRAIN_TIMEOUT, **options):
+    """Serve `protocols` from one process until interrupted or drained."""
+    server = UnifiedServer(protocols, **options)
+    install_signal_handlers(lambda: server.drain(drain_timeout), server.validation.reload)
     try:
-        server.serve_forever()
+        server.start()
     except KeyboardInterrupt:
-        print("\n[HTTP] Shutting down...")
-        server.shutdown()
+        log.info("%s server shutting down...", server.name, extra=SHUTDOWN)
+        server.stop()
 
 
-def run_ipc_server(pipe_name=r'\\.\pipe\eiffel_python_ipc'):
-    """Run IPC test server."""
-    print(f"\n{'='*60}")
-    print(f"simple_python IPC Test Server")
-    print(f"{'='*60}")
-    print(f"Listening on {pipe_name}")
-    print("Waiting for validation requests...")
-    print("(Press Ctrl+C to stop)\n")
+def run_http_server(host='127.0.0.1', port=DEFAULT_PORTS['http']):
+    """Run only the HTTP listener."""
+    run_servers(('http',), host=host, ports={'http': port})
 
-    server = SimplepythonIPCServer(pipe_name)
-    server.start()
-    try:
-        while server.running:
-            # IPC pipe listening would go here
-            # (requires pywin32 for actual implementation)
-            threading.Event().wait(1)
-    except KeyboardInterrupt:
-        print("\n[IPC] Shutting down...")
-        server.stop()
 
+def run_ipc_server(host='127.0.0.1', port=DEFAULT_PORTS['ipc']):
+    """Run only the IPC listener."""
+    run_servers(('ipc',), host=host, ports={'ipc': port})
 
-def run_grpc_server(host='localhost', port=50051):
-    """Run gRPC test server."""
-    print(f"\n{'='*60}")
-    print(f"simple_python gRPC Test Server")
-    print(f"{'='*60}")
-    print(f"Listening on {host}:{port}")
-    print("Waiting for validation requests...")
-    print("(Press Ctrl+C to stop)\n")
 
-    server = SimplepythonGRPCServer(host, port)
-    server.start()
-    try:
-        threading.Event().wait()
-    except KeyboardInterrupt:
-        print("\n[gRPC] Shutting down...")
+def run_grpc_server(host='127.0.0.1', port=DEFAULT_PORTS['grpc']):
+    """Run only the gRPC listener."""
+    run_servers(('grpc',), host=host, ports={'grpc': port})
 
 
 def main():
-    """Run test servers based on command-line argument."""
-    if len(sys.argv) < 2:
-        print("Usage: python3 python_servers.py <protocol>")
-        print("\nProtocols:")
-        print("  http                 - HTTP/1.1 JSON server (default)")
-        print("  ipc                  - Windows named pipe server")
-        print("  grpc                 - gRPC server (Phase 2)")
-        print("\nExamples:")
-        print("  python3 python_servers.py http")
-        print("  python3 python_servers.py ipc")
-        print("  python3 python_servers.py grpc")
-        sys.exit(1)
-
-    protocol = sys.argv[1].lower()
-
-    if protocol == 'http':
-        run_http_server()
-    elif protocol == 'ipc':
-        run_ipc_server()
-    elif protocol == 'grpc':
-        run_grpc_server()
-    else:
-        print(f"Unknown protocol: {protocol}")
-        sys.exit(1)
+    """Serve the protocols named on the command line (default: all)."""
+    parser = argparse.ArgumentParser(description="simple_python HTTP, IPC and gRPC test servers in one process")
+    parser.add_argument("protocols", nargs='*', type=str.lower, metavar='protocol',
+                        help=f"Protocols to serve: {', '.join(PROTOCOLS)} (default: all)")
+    parser.add_argument("--host", default='127.0.0.1', help="Address to bind")
+    for protocol in PROTOCOLS:
+        parser.add_argument(f"--{protocol}-port", type=int, default=DEFAULT_PORTS[protocol],
+                            help=f"{protocol.upper()} port (default: {DEFAULT_PORTS[protocol]})")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help=f"Listen backlog (default: {DEFAULT_BACKLOG})")
+    parser.add_argument("--handler-threads", type=int, default=None,
+                        help="Shared handler pool size (default: executor default)")
+    parser.add_argument("--max-pipeline", type=int, default=DEFAULT_MAX_PIPELINE,
+                        help=f"Pipelined HTTP requests in flight per connection (default: {DEFAULT_MAX_PIPELINE})")
+    parser.add_argument("--multiplex", action='store_true',
+                        help="Process pipelined IPC/gRPC frames concurrently, reply in completion order")
+    add_validation_arguments(parser)
+    add_admission_arguments(parser)
+    add_compression_arguments(parser)
+    add_capture_arguments(parser)
+    add_profiling_arguments(parser)
+    parser.add_argument("--server-timing", action='store_true',
+                        help="Send a Server-Timing header with every HTTP /validate response")
+    add_timeout_arguments(parser)
+    add_lifecycle_arguments(parser)
+    add_readiness_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    unknown = [protocol for protocol in args.protocols if protocol not in PROTOCOLS]
+    if unknown:
+        parser.error(f"unknown protocol(s): {', '.join(unknown)}")
+    configure_logging_from_args(args)
+
+    run_servers(args.protocols or PROTOCOLS, host=args.host,
+                ports={protocol: getattr(args, f"{protocol}_port") for protocol in PROTOCOLS},
+                backlog=args.backlog, handler_threads=args.handler_threads, max_pipeline=args.max_pipeline,
+                multiplex=args.multiplex, validation=validation_service_from_args(args),
+                admission=admission_from_args(args), compression=compression_from_args(args),
+                capture=capture_from_args(args), profiler=profiler_from_args(args),
+                server_timing=args.server_timing, timeouts=timeouts_from_args(args),
+                drain_timeout=args.drain_timeout, on_ready=notifier_from_args(args))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Streamed requests: one large attribute sent as a sequence of continuation frames.
+
+A request whose top-level "stream" names one of its attributes is followed,
+on the same connection, by that attribute's items in continuation frames:
+
+    {"type": "VALIDATION_REQUEST", "message_id": "m1", "stream": "samples",
+     "attributes": {"board_id": "B-001"}}
+    {"type": "STREAM_CHUNK", "message_id": "m1", "items": [0.1, 0.2, ...]}
+    ...
+    {"type": "STREAM_END", "message_id": "m1"}
+
+The server validates the request as soon as its first frame arrives, with
+attributes[<stream>] set to an AttributeStream: an iterator that yields the
+items while later chunks are still being received. At most `window` chunks
+are buffered per stream; beyond that the connection stops reading, so TCP
+flow control throttles the sender and memory stays bounded by the window, not
+by the message size. Validators that accept a list accept a stream unchanged
+as long as they only iterate it once. Chunks arriving after the validator has
+returned are read and dropped; a connection lost mid-stream makes the
+iterator raise StreamAbortedError.
+
+Over HTTP the same request is a POST /validate with "Transfer-Encoding:
+chunked" and "Content-Type: application/x-ndjson": the first line of the body
+is the request, each following line a JSON array of items, and the body ends
+the stream.
+
+Streamed requests bypass the result cache; in process validation mode the
+stream is collected into a list before it is sent to a worker.
+"""
+
+import json
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+
+from python_framing import encode_payload
+from python_validation import BATCH_TYPE, error_response
+
+STREAM_CHUNK_TYPE = 'STREAM_CHUNK'
+STREAM_END_TYPE = 'STREAM_END'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+DEFAULT_WINDOW = 8
+DEFAULT_CHUNK_ITEMS = 4096
+
+_ENDED = 'ended'
+_ABORTED = 'aborted'
+
+
+class StreamAbortedError(ConnectionError):
+    """The sender went away before the end of the stream."""
+
+
+class StreamError(ValueError):
+    """A malformed streamed request or continuation frame."""
+
+
+class AttributeStream:
+    """Items of a streamed attribute, iterable while its chunks are still arriving."""
+
+    def __init__(self, name, window=DEFAULT_WINDOW):
+        self.name = name
+        self.window = window
+        self.chunks = deque()
+        self.closed = None
+        self.abandoned = False  # the validator is done; later chunks are dropped
+        self.waiters = []
+        self.condition = Condition()
+
+    def feed(self, items, block=True, waiter=None):
+        """Queue one chunk of items, waiting while `window` chunks are buffered.
+
+        With block=False, returns False instead of waiting and calls `waiter()`
+        (from the consuming thread) once there is room.
+        """
+        with self.condition:
+            while len(self.chunks) >= self.window and not self.abandoned:
+                if not block:
+                    if waiter:
+                        self.waiters.append(waiter)
+                    return False
+                self.condition.wait()
+            if not self.abandoned:
+                self.chunks.append(items)
+                self.condition.notify_all()
+            return True
+
+    def end(self):
+        """Mark the stream complete; iteration stops after the buffered items."""
+        self._close(_ENDED)
+
+    def abort(self):
+        """Fail the stream; iteration raises StreamAbortedError."""
+        self._close(_ABORTED)
+
+    def _close(self, state):
+        with self.condition:
+            if self.closed is None:
+                self.closed = state
+            self.condition.notify_all()
+
+    def abandon(self):
+        """Stop buffering: the consumer will not read any further."""
+        with self.condition:
+            self.abandoned = True
+            self.chunks.clear()
+            self._wake_feeders()
+
+    def _wake_feeders(self):
+        self.condition.notify_all()
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            waiter()
+
+    def __iter__(self):
+        while True:
+            with self.condition:
+                while not self.chunks and self.closed is None:
+                    self.condition.wait()
+                if self.chunks:
+                    items = self.chunks.popleft()
+                    self._wake_feeders()
+                elif self.closed == _ABORTED:
+                    raise StreamAbortedError(f"Stream '{self.name}' ended before STREAM_END")
+                else:
+                    return
+            yield from items
+
+
+async def feed_async(stream, items, loop):
+    """Feed a chunk from an event loop, awaiting (not blocking) while the window is full."""
+    while True:
+        space = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: space.done() or space.set_result(None))
+        if stream.feed(items, block=False, waiter=wake):
+            return
+        await space
+
+
+def open_stream(message, window=DEFAULT_WINDOW):
+    """Attach an AttributeStream to a request naming a "stream" attribute and return it.
+
+    Returns None for ordinary requests; raises StreamError for a malformed one.
+    """
+    name = message.get("stream")
+    if name is None:
+        return None
+    if not isinstance(name, str) or message.get("type") == BATCH_TYPE:
+        raise StreamError("'stream' must name one attribute of a single request")
+    attributes = message.setdefault("attributes", {})
+    if not isinstance(attributes, dict):
+        raise StreamError("A streamed request needs an attributes object")
+    stream = attributes[name] = AttributeStream(name, window)
+    return stream
+
+
+def streamed_attribute(message):
+    """The AttributeStream of a streamed request, or None."""
+    attributes = message.get("attributes")
+    if isinstance(attributes, dict):
+        value = attributes.get(message.get("stream"))
+        if isinstance(value, AttributeStream):
+            return value
+    return None
+
+
+def is_continuation(message):
+    """True for a STREAM_CHUNK or STREAM_END frame."""
+    return message.get("type") in (STREAM_CHUNK_TYPE, STREAM_END_TYPE)
+
+
+def chunk_items(message):
+    """The items of a STREAM_CHUNK frame (None for STREAM_END)."""
+    if message.get("type") == STREAM_END_TYPE:
+        return None
+    items = message.get("items")
+    if not isinstance(items, list):
+        raise StreamError("STREAM_CHUNK requires an items array")
+    return items
+
+
+def stream_error(message_id, error):
+    """The ERROR answering a malformed streamed request or an orphaned continuation frame."""
+    return error_response(message_id, "INVALID_STREAM", str(error))
+
+
+def run_in_thread(function, *args):
+    """Run `function` on a thread of its own and return a Future for its result.
+
+    Streamed validations wait on their connection for input, so they must not
+    occupy the bounded handler pool that other requests need to make progress.
+    """
+    future = Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+    Thread(target=run, name="stream-validator", daemon=True).start()
+    return future
+
+
+class StreamTable:
+    """The streams open on one connection, keyed by message_id, with their pending responses."""
+
+    def __init__(self):
+        self.streams = {}
+        self.responses = {}
+
+    def open(self, message, window=DEFAULT_WINDOW):
+        """Open the message's stream if it names one; returns the stream or None."""
+        stream = open_stream(message, window)
+        if stream is not None:
+            self.streams[message.get("message_id", "unknown")] = stream
+        return stream
+
+    def track(self, message, response):
+        """Remember the task or future answering a streamed request until its STREAM_END."""
+        self.responses[message.get("message_id", "unknown")] = response
+
+    def lookup(self, message):
+        """The open stream a continuation frame belongs to."""
+        stream = self.streams.get(message.get("message_id", "unknown"))
+        if stream is None:
+            raise StreamError(f"No open stream for message_id {message.get('message_id', 'unknown')!r}")
+        return stream
+
+    def close(self, message):
+        """End a stream on its STREAM_END; returns its tracked response, if any."""
+        message_id = message.get("message_id", "unknown")
+        self.streams.pop(message_id).end()
+        return self.responses.pop(message_id, None)
+
+    def abort_all(self):
+        """Fail every stream still open when the connection goes away."""
+        for stream in self.streams.values():
+            stream.abort()
+        self.streams.clear()
+        self.responses.clear()
+
+
+def iter_stream_frames(message, name, items, chunk_items=DEFAULT_CHUNK_ITEMS):
+    """Client side: yield the JSON payloads streaming `items` as attribute `name` of `message`."""
+    message_id = message.get("message_id", "unknown")
+    yield encode_payload(dict(message, stream=name))
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_items:
+            yield encode_payload({"type": STREAM_CHUNK_TYPE, "message_id": message_id, "items": chunk})
+            chunk = []
+    if chunk:
+        yield encode_payload({"type": STREAM_CHUNK_TYPE, "message_id": message_id, "items": chunk})
+    yield encode_payload({"type": STREAM_END_TYPE, "message_id": message_id})
+
+
+def iter_ndjson_body(message, name, items, chunk_items=DEFAULT_CHUNK_ITEMS):
+    """Client side: yield the lines of a chunked HTTP /validate body streaming `items`."""
+    yield json.dumps(dict(message, stream=name)).encode('utf-8') + b'\n'
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_items:
+            yield json.dumps(chunk).encode('utf-8') + b'\n'
+            chunk = []
+    if chunk:
+        yield json.dumps(chunk).encode('utf-8') + b'\n'
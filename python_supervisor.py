@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Supervisor keeping a pool of warm HTTP, IPC or gRPC servers alive.
+
+The start_*_blocking launchers start one detached server and exit, so a server
+that dies or wedges goes unnoticed until an Eiffel bridge times out. The
+supervisor instead owns --pool active servers plus --standby spare ones, all
+started through python_readiness.launch (so validator modules are loaded and
+warmed before a server counts as up), and every --probe-interval seconds:
+
+  - probes each server: GET /health for HTTP, a PING frame (answered with a
+    PONG) for IPC/gRPC, each bounded by --probe-timeout
+  - after --max-failures consecutive failed probes, or as soon as the process
+    exits, kills the server and restarts it with exponential backoff (reset
+    once a server has stayed up STABLE_AFTER seconds)
+  - promotes a warm standby in place of a failed active server, so failover
+    does not wait for a cold start
+
+The active servers are the first --pool servers that are up, in index order,
+so a restarted server takes its place back and the standby steps down again.
+
+The first active server listens on --port, the others on free ports. The live
+endpoint set (the active servers' ports, in order) is published atomically as
+JSON to --endpoints-file whenever it changes, and reported once through
+--ready-fd / --notify-socket when the initial pool is up:
+
+    {"protocol": "ipc", "host": "127.0.0.1", "endpoints": [9001, 40237],
+     "servers": [{"index": 0, "pid": 4242, "port": 9001, "state": "up",
+                  "active": true, "restarts": 0}, ...]}
+
+SIGHUP is forwarded to every server, reloading their validators; SIGTERM
+drains them (see python_lifecycle), killing a server still running
+--drain-timeout seconds later.
+
+Usage: python3 python_supervisor.py {http,ipc,grpc} [--pool N] [--standby N] [--port P]
+                                    [--server-args "..."] [--endpoints-file PATH]    (see --help)
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import time
+from threading import Lock, Thread
+
+from python_framing import FrameReader, encode_frame
+from python_lifecycle import DEFAULT_DRAIN_TIMEOUT, STOP_GRACE, add_lifecycle_arguments
+from python_logging import SHUTDOWN, STARTUP, add_logging_arguments, configure_logging_from_args, log
+from python_readiness import DEFAULT_TIMEOUT, SERVER_SCRIPTS, add_readiness_arguments, launch, notifier_from_args, \
+    server_argv
+from python_validation import PING_TYPE, PONG_TYPE
+from python_workers import MAX_RESTART_DELAY, POLL_INTERVAL, STABLE_AFTER, write_state
+
+DEFAULT_PROBE_INTERVAL = 1.0
+DEFAULT_PROBE_TIMEOUT = 1.0
+DEFAULT_MAX_FAILURES = 3
+
+# PooledServer.state values
+STARTING = 'starting'
+UP = 'up'
+DOWN = 'down'
+
+
+def probe(protocol, host, port, timeout=DEFAULT_PROBE_TIMEOUT):
+    """True if the server on `port` answers a health probe within `timeout` seconds."""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            if protocol == 'http':
+                sock.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                return sock.recv(64).startswith((b"HTTP/1.1 200", b"HTTP/1.0 200"))
+            sock.sendall(encode_frame({"type": PING_TYPE, "message_id": "supervisor-probe"}))
+            payload = FrameReader(sock).read_frame()
+            return payload is not None and json.loads(bytes(payload)).get("type") == PONG_TYPE
+    except (OSError, ValueError):
+        return False
+
+
+class PooledServer:
+    """One server process of the pool and its restart bookkeeping."""
+
+    def __init__(self, index, port):
+        self.index = index
+        self.port = port  # requested port; the bound one once up
+        self.requested_port = port
+        self.process = None
+        self.state = DOWN
+        self.active = False
+        self.failures = 0
+        self.restarts = 0
+        self.started = 0.0
+        self.restart_at = 0.0
+        self.backoff = 0.0
+
+    def description(self):
+        return {"index": self.index, "pid": self.process.pid if self.process else None, "port": self.port,
+                "state": self.state, "active": self.active, "restarts": self.restarts}
+
+
+class Supervisor:
+    """Starts, probes and restarts a pool of servers and publishes the live endpoints."""
+
+    def __init__(self, protocol, pool=1, standby=0, host='127.0.0.1', port=0, server_args=(),
+                 probe_interval=DEFAULT_PROBE_INTERVAL, probe_timeout=DEFAULT_PROBE_TIMEOUT,
+                 max_failures=DEFAULT_MAX_FAILURES, start_timeout=DEFAULT_TIMEOUT, endpoints_file=None,
+                 on_ready=None, drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+        self.protocol = protocol
+        self.pool = pool
+        self.host = host
+        self.server_args = list(server_args) + ['--drain-timeout', f"{drain_timeout:g}"]
+        self.drain_timeout = drain_timeout
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.max_failures = max_failures
+        self.start_timeout = start_timeout
+        self.endpoints_file = endpoints_file
+        self.on_ready = on_ready
+        self.servers = [PooledServer(index, port if index == 0 else 0) for index in range(pool + standby)]
+        self.lock = Lock()
+        self.endpoints = None
+        self.running = False
+
+    def run(self):
+        """Start the pool and supervise it until interrupted; returns an exit code."""
+        self.running = True
+        previous = signal.signal(signal.SIGTERM, self._terminate)
+        previous_hup = signal.signal(signal.SIGHUP, self._forward) if hasattr(signal, 'SIGHUP') else None
+        log.info("%s supervisor (pid %d) starting %d servers + %d standby", self.protocol.upper(), os.getpid(),
+                 self.pool, len(self.servers) - self.pool, extra=STARTUP)
+        try:
+            starters = [Thread(target=self._start, args=(server,)) for server in self.servers]
+            for starter in starters:
+                starter.start()
+            for starter in starters:
+                starter.join()
+            self._rebalance()
+            if self.on_ready and self.endpoints:
+                self.on_ready(*self.endpoints)
+            while self.running:
+                time.sleep(self.probe_interval)
+                self._check_servers()
+                self._rebalance()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            signal.signal(signal.SIGTERM, previous)
+            if previous_hup is not None:
+                signal.signal(signal.SIGHUP, previous_hup)
+            log.info("%s supervisor stopping %d servers...", self.protocol.upper(), len(self.servers),
+                     extra=SHUTDOWN)
+            self._stop_servers()
+        return 0
+
+    def _terminate(self, signum, frame):
+        self.running = False
+
+    def _forward(self, signum, frame):
+        for server in self.servers:
+            process = server.process
+            if process is not None and process.poll() is None:
+                process.send_signal(signum)
+
+    def _start(self, server):
+        """Launch one server and wait until it is listening (runs on its own thread)."""
+        with self.lock:
+            server.state = STARTING
+        try:
+            process, addresses = launch(server_argv(self.protocol, server.requested_port, self.server_args),
+                                        timeout=self.start_timeout, cwd=None, stderr=None)
+        except (OSError, RuntimeError, TimeoutError) as e:
+            log.warning("Server %d failed to start: %s", server.index, e)
+            with self.lock:
+                self._schedule_restart(server)
+            return
+        with self.lock:
+            if not self.running:  # stopped while this server was starting
+                process.terminate()
+                process.wait()
+                return
+            server.process = process
+            server.port = int(addresses[0])
+            server.state = UP
+            server.failures = 0
+            server.started = time.monotonic()
+        log.info("Server %d up (pid %d, port %d)", server.index, process.pid, server.port)
+
+    def _check_servers(self):
+        now = time.monotonic()
+        for server in self.servers:
+            if server.state == UP:
+                code = server.process.poll()
+                if code is not None:
+                    log.warning("Server %d (pid %d) exited with code %s", server.index, server.process.pid, code)
+                elif probe(self.protocol, self.host, server.port, self.probe_timeout):
+                    server.failures = 0
+                    continue
+                else:
+                    server.failures += 1
+                    log.warning("Server %d (pid %d) failed health probe %d/%d", server.index,
+                                server.process.pid, server.failures, self.max_failures)
+                    if server.failures < self.max_failures:
+                        continue
+                self._kill(server)
+                with self.lock:
+                    if now - server.started >= STABLE_AFTER:
+                        server.backoff = 0.0
+                    self._schedule_restart(server)
+                log.warning("Restarting server %d in %.1fs", server.index, server.backoff)
+            elif server.state == DOWN and self.running and now >= server.restart_at:
+                server.restarts += 1
+                server.state = STARTING
+                Thread(target=self._start, args=(server,), daemon=True).start()
+
+    def _schedule_restart(self, server):
+        server.state = DOWN
+        server.active = False
+        server.process = None
+        server.port = server.requested_port
+        server.backoff = min(MAX_RESTART_DELAY, server.backoff * 2 or POLL_INTERVAL)
+        server.restart_at = time.monotonic() + server.backoff
+
+    def _rebalance(self):
+        """Make the first `pool` servers that are up active (promoting standbys) and publish changes."""
+        with self.lock:
+            active = [server for server in self.servers if server.state == UP][:self.pool]
+            for server in self.servers:
+                if (server in active) != server.active:
+                    server.active = not server.active
+                    log.info("Server %d (port %d) is now %s", server.index, server.port,
+                             'active' if server.active else 'standby')
+            endpoints = [server.port for server in self.servers if server.active]
+            if endpoints != self.endpoints:
+                self.endpoints = endpoints
+                self._publish()
+
+    def _publish(self):
+        log.info("Endpoints: %s", ' '.join(map(str, self.endpoints)) or 'none')
+        if self.endpoints_file:
+            write_state(self.endpoints_file, {
+                "protocol": self.protocol, "host": self.host, "endpoints": self.endpoints,
+                "servers": [server.description() for server in self.servers]})
+
+    def _kill(self, server):
+        if server.process and server.process.poll() is None:
+            server.process.kill()
+            server.process.wait()
+
+    def _stop_servers(self):
+        live = [server.process for server in self.servers if server.process is not None]
+        for process in live:
+            if process.poll() is None:
+                process.terminate()
+        deadline = time.monotonic() + self.drain_timeout + STOP_GRACE  # SIGTERM drains each server
+        for process in live:
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if self.endpoints_file:
+            try:
+                os.unlink(self.endpoints_file)
+            except FileNotFoundError:
+                pass
+
+
+def main():
+    """Supervise a pool of servers of the protocol named on the command line."""
+    parser = argparse.ArgumentParser(description="Keep a pool of warm simple_python test servers alive")
+    parser.add_argument("protocol", type=str.lower, choices=SERVER_SCRIPTS, help="Server to run")
+    parser.add_argument("--pool", type=int, default=1, help="Active servers (default: 1)")
+    parser.add_argument("--standby", type=int, default=0,
+                        help="Warm spare servers promoted when an active one fails (default: 0)")
+    parser.add_argument("--host", default='127.0.0.1', help="Address the servers listen on (for probing)")
+    parser.add_argument("--port", type=int, default=0,
+                        help="Port of the first active server; the others use free ports (default: 0 = free)")
+    parser.add_argument("--server-args", default='', help="Extra arguments for every server, as one string")
+    parser.add_argument("--probe-interval", type=float, default=DEFAULT_PROBE_INTERVAL,
+                        help=f"Seconds between health probes (default: {DEFAULT_PROBE_INTERVAL:g})")
+    parser.add_argument("--probe-timeout", type=float, default=DEFAULT_PROBE_TIMEOUT,
+                        help=f"Seconds a probe may take (default: {DEFAULT_PROBE_TIMEOUT:g})")
+    parser.add_argument("--max-failures", type=int, default=DEFAULT_MAX_FAILURES,
+                        help=f"Consecutive failed probes before a restart (default: {DEFAULT_MAX_FAILURES})")
+    parser.add_argument("--start-timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Seconds a server may take to report readiness (default: {DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--endpoints-file", default=None, help="Publish the live endpoint set as JSON here")
+    add_lifecycle_arguments(parser)
+    add_readiness_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    if args.pool < 1 or args.standby < 0:
+        parser.error("--pool must be at least 1 and --standby at least 0")
+    configure_logging_from_args(args)
+
+    supervisor = Supervisor(args.protocol, args.pool, args.standby, args.host, args.port, args.server_args.split(),
+                            args.probe_interval, args.probe_timeout, args.max_failures, args.start_timeout,
+                            args.endpoints_file, on_ready=notifier_from_args(args),
+                            drain_timeout=args.drain_timeout)
+    raise SystemExit(supervisor.run())
+
+
+if __name__ == '__main__':
+    main()
@@ -2,30 +2,80 @@
 """
 Simple Python test server for simple_python HTTP integration tests.
 
-Provides three endpoints:
-  POST /validate      - Receive Eiffel message and echo back in PYTHON_MESSAGE format
+Provides four endpoints:
+  POST /validate      - Receive Eiffel message (or VALIDATION_BATCH) and echo back in PYTHON_MESSAGE format
   POST /echo          - Echo the request body back
+  POST /profile       - Profile the running server for ?seconds=N (asyncio engine; SIGUSR1 on both)
   GET /health         - Health check
+  GET /metrics        - Request, error, byte and latency metrics in Prometheus text format
+
+The default engine is the concurrent keep-alive HTTP/1.1 server in
+python_http_server.py; --engine legacy runs the original single-threaded
+http.server handler below (HTTP/1.0, one connection per request).
+
+Both engines accept a /validate body with "Content-Encoding: gzip", "deflate"
+or "xz" (415 for other encodings, 400 for a corrupt body, 413 beyond
+--max-frame-size once decompressed); only the asyncio engine compresses
+responses per Accept-Encoding.
+
+SIGTERM drains either engine (the legacy one finishes its current request) and
+SIGHUP reloads the --validators modules (see python_lifecycle).
 """
 
 import json
 import sys
+import time
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from pathlib import Path
+from threading import Thread
+
+from python_admission import FRAME_TOO_LARGE, AdmissionControl, add_admission_arguments, admission_from_args
+from python_capture import add_capture_arguments, capture_from_args
+from python_compression import (HTTP_ENCODINGS, CompressionError, CompressionSettings, DecompressedTooLargeError,
+                                add_compression_arguments, compression_from_args)
+from python_frame_server import DEFAULT_BACKLOG
+from python_http_server import DEFAULT_MAX_PIPELINE, PROMETHEUS_CONTENT_TYPE, HTTPValidationServer
+from python_lifecycle import add_lifecycle_arguments, install_signal_handlers
+from python_logging import (SHUTDOWN, STARTUP, add_logging_arguments, configure_logging_from_args,
+                            log, message_log)
+from python_metrics import MetricsRegistry, ServerTiming, TransportMetrics, wants_server_timing
+from python_profiling import add_profiling_arguments, profiler_from_args
+from python_readiness import add_readiness_arguments, notifier_from_args
+from python_timeouts import READ, add_timeout_arguments, timeouts_from_args
+from python_validation import error_response, validation_response
+from python_validators import ValidationService, add_validation_arguments, validation_service_from_args
+from python_workers import Worker, add_worker_arguments, run_master
+
+HTTP_ENGINES = ('asyncio', 'legacy')
+
 
 class SimpleHTTPHandler(BaseHTTPRequestHandler):
     """HTTP request handler for test server."""
 
+    def handle(self):
+        """Serve one connection, tracking it in the active-connections gauge."""
+        self.stats.connections.add(1)
+        try:
+            super().handle()
+        finally:
+            self.stats.connections.add(-1)
+
     def do_GET(self):
         """Handle GET requests."""
-        self.log_message("GET request to %s", self.path)
+        log.debug("GET request to %s", self.path)
+        self.stats.requests.inc()
         if self.path == '/health':
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
             response = json.dumps({"status": "ok", "server": "simple_python_test"})
             self.wfile.write(response.encode('utf-8'))
-            self.log_message("Health check: OK")
+            log.debug("Health check: OK")
+        elif self.path == '/metrics':
+            response = self.stats.registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.end_headers()
+            self.wfile.write(response)
         else:
             self.send_response(404)
             self.send_header('Content-Type', 'application/json')
@@ -35,77 +85,158 @@ class SimpleHTTPHandler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         """Handle POST requests."""
-        print("[DEBUG] do_POST called from NEW server version", file=sys.stderr)
-        print(f"[DEBUG] Request path: '{self.path}' (type: {type(self.path)})", file=sys.stderr)
-        sys.stderr.flush()
         content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode('utf-8')
-        self.log_message("POST request to %s with %d bytes", self.path, len(body))
-        self.log_message("Request body: %s", body[:200])  # Log first 200 chars
+        if self.admission.frame_too_large(content_length):
+            # refuse before reading a body the client may never stop sending
+            self.stats.rejected(FRAME_TOO_LARGE)
+            self.close_connection = True
+            self.send_response(413)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', str(self.admission.retry_after_seconds))
+            self.end_headers()
+            response = self.admission.rejection("unknown", FRAME_TOO_LARGE)
+            self.wfile.write(json.dumps(response).encode('utf-8'))
+            return
+        start = time.perf_counter_ns()
+        body = self.rfile.read(content_length)
+        timer = ServerTiming(read=time.perf_counter_ns() - start)
+        self.stats.read.observe_ns(timer.stages['read'])
+        self.stats.requests.inc()
+        self.stats.bytes_in.inc(content_length)
+        log.debug("POST request to %s with %d bytes", self.path, len(body))
+        log.debug("Request body: %.200s", body)  # first 200 chars, sliced only if DEBUG is on
 
         if self.path == '/validate':
             # Parse request and send back PYTHON_MESSAGE format (type, message_id, attributes)
-            print("[DEBUG] ENTERING /validate endpoint handler - SHOULD SEND VALIDATION_RESPONSE", file=sys.stderr)
-            sys.stderr.flush()
-            self.log_message("Processing /validate endpoint")
+            log.debug("Processing /validate endpoint")
+            encoding = self.headers.get('Content-Encoding', 'identity').strip().lower()
+            if encoding not in HTTP_ENCODINGS + ('identity',):
+                self.stats.error('invalid_compression')
+                self.send_json(415, {"error": f"Unsupported Content-Encoding: {encoding[:20]}"})
+                return
+            try:
+                body = self.compression.decode_body(body, encoding, self.admission.max_frame_size)
+            except DecompressedTooLargeError:
+                self.stats.rejected(FRAME_TOO_LARGE)
+                self.send_json(413, self.admission.rejection("unknown", FRAME_TOO_LARGE),
+                               (('Retry-After', str(self.admission.retry_after_seconds)),))
+                return
+            except CompressionError as e:
+                self.stats.error('invalid_compression')
+                self.send_json(400, {"error": str(e)})
+                return
+            start = time.perf_counter_ns()
             try:
                 data = json.loads(body) if body else {}
+                timer.add('decode', time.perf_counter_ns() - start)
+                self.stats.decode.observe_ns(timer.stages['decode'])
                 message_id = data.get("message_id", "unknown")
-                self.log_message("Received message_id: %s", message_id)
-
-                # Send back proper PYTHON_MESSAGE format
-                response = {
-                    "type": "VALIDATION_RESPONSE",
-                    "message_id": message_id,
-                    "attributes": {
-                        "result": "PASS",
-                        "message": "Message received and validated",
-                        "echoed_message_id": message_id
-                    }
-                }
-                self.log_message("Sending VALIDATION_RESPONSE with message_id: %s", message_id)
-            except json.JSONDecodeError as e:
-                self.log_message("JSON parse error: %s", str(e))
-                response = {
-                    "type": "ERROR",
-                    "message_id": "unknown",
-                    "attributes": {
-                        "error_code": "INVALID_JSON",
-                        "error_message": "Invalid JSON received: " + str(e)
-                    }
-                }
+                log.debug("Received message_id: %s", message_id)
+
+                # Send back proper PYTHON_MESSAGE format (or a VALIDATION_BATCH_RESPONSE)
+                start = time.perf_counter_ns()
+                response = self.validation.handle(data, self.default_response)
+                timer.add('validate', time.perf_counter_ns() - start)
+                self.stats.validate.observe_ns(timer.stages['validate'])
+                if wants_server_timing(data):
+                    timer.requested = True
+                    response = timer.attach(response)
+                log.debug("Sending %s with message_id: %s", response["type"], message_id)
+            except (ValueError, UnicodeDecodeError) as e:
+                log.warning("JSON parse error: %s", e)
+                self.stats.error('invalid_json')
+                response = error_response("unknown", "INVALID_JSON", "Invalid JSON received: " + str(e))
 
+            start = time.perf_counter_ns()
+            response_text = json.dumps(response)
+            response_body = response_text.encode('utf-8')
+            timer.add('encode', time.perf_counter_ns() - start)
+            self.stats.encode.observe_ns(timer.stages['encode'])
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
+            if timer.requested or getattr(self.server, 'server_timing', False):
+                self.send_header('Server-Timing', timer.header())
             self.end_headers()
-            response_body = json.dumps(response)
-            self.log_message("Response body: %s", response_body[:200])
-            self.wfile.write(response_body.encode('utf-8'))
-            self.log_message("Response sent successfully")
+            log.debug("Response body: %.200s", response_text)
+            start = time.perf_counter_ns()
+            self.wfile.write(response_body)
+            self.stats.send.observe_ns(time.perf_counter_ns() - start)
+            self.stats.bytes_out.inc(len(response_body))
+            log.debug("Response sent successfully")
 
         elif self.path == '/echo':
             # Echo the raw body back
-            self.log_message("Processing /echo endpoint")
+            log.debug("Processing /echo endpoint")
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
             if body:
-                self.wfile.write(body.encode('utf-8'))
+                self.wfile.write(body)
             else:
                 self.wfile.write(json.dumps({"echo": ""}).encode('utf-8'))
-            self.log_message("Echo response sent")
+            log.debug("Echo response sent")
         else:
-            self.log_message("Unknown endpoint: %s", self.path)
+            log.debug("Unknown endpoint: %s", self.path)
             self.send_response(404)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
             response = json.dumps({"error": f"Endpoint {self.path} not found"})
             self.wfile.write(response.encode('utf-8'))
 
+    @property
+    def validation(self):
+        """The ValidationService attached to the server (inline echo if none)."""
+        service = getattr(self.server, 'validation', None)
+        if service is None:
+            service = self.server.validation = ValidationService()
+        return service
+
+    def send_json(self, status, payload, headers=()):
+        """Send a JSON response body with `status`."""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(json.dumps(payload).encode('utf-8'))
+
+    @property
+    def compression(self):
+        """The CompressionSettings attached to the server (defaults if none)."""
+        compression = getattr(self.server, 'compression', None)
+        if compression is None:
+            compression = self.server.compression = CompressionSettings()
+        return compression
+
+    @property
+    def admission(self):
+        """The AdmissionControl attached to the server (default limits if none)."""
+        admission = getattr(self.server, 'admission', None)
+        if admission is None:
+            admission = self.server.admission = AdmissionControl()
+        return admission
+
+    @property
+    def stats(self):
+        """The TransportMetrics attached to the server (a private registry if none)."""
+        stats = getattr(self.server, 'stats', None)
+        if stats is None:
+            stats = self.server.stats = TransportMetrics(MetricsRegistry(), 'http')
+        return stats
+
+    def default_response(self, message):
+        """Build the built-in VALIDATION_RESPONSE for requests no validator claims."""
+        return validation_response(message.get("message_id", "unknown"), "Message received and validated")
+
     def log_message(self, format, *args):
-        """Log to stderr instead of stdout."""
-        sys.stderr.write("[%s] %s\n" % (self.log_date_time_string(), format % args))
-        sys.stderr.flush()
+        """Route http.server's per-request access lines to the sampled message log."""
+        message_log.info(format, *args, peer=self.address_string())
+
+    def log_error(self, format, *args):
+        if format.startswith("Request timed out"):
+            # http.server swallows the socket timeout (--read-timeout) after closing the connection
+            self.stats.reclaimed(READ)
+        log.error(format, *args)
 
 
 def main():
@@ -114,25 +245,94 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type=int, default=8888, help="Port to listen on")
+    parser.add_argument("--engine", choices=HTTP_ENGINES, default='asyncio',
+                        help="asyncio = keep-alive HTTP/1.1 event loop, legacy = single-threaded "
+                             "http.server (default: asyncio)")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help=f"Listen backlog of the asyncio engine (default: {DEFAULT_BACKLOG})")
+    parser.add_argument("--handler-threads", type=int, default=None,
+                        help="/validate handler pool size of the asyncio engine (default: executor default)")
+    parser.add_argument("--max-pipeline", type=int, default=DEFAULT_MAX_PIPELINE,
+                        help=f"Pipelined requests in flight per connection (default: {DEFAULT_MAX_PIPELINE})")
+    add_validation_arguments(parser)
+    add_admission_arguments(parser)
+    add_compression_arguments(parser)
+    add_capture_arguments(parser)
+    add_profiling_arguments(parser)
+    parser.add_argument("--server-timing", action='store_true',
+                        help="Send a Server-Timing header with every /validate response")
+    add_timeout_arguments(parser)
+    add_lifecycle_arguments(parser)
+    add_worker_arguments(parser)
+    add_readiness_arguments(parser)
+    add_logging_arguments(parser)
     args = parser.parse_args()
+    if args.capture and args.engine == 'legacy':
+        parser.error("--capture requires the asyncio engine")
+    configure_logging_from_args(args)
 
     host = "127.0.0.1"
     port = args.port
 
-    print(f"[STARTUP] Starting simple_python test server on http://{host}:{port}", file=sys.stderr)
-    print(f"[STARTUP] Endpoints: POST /validate, POST /echo, GET /health", file=sys.stderr)
-    sys.stderr.flush()
+    exit_code = run_master('HTTP', args, host, port)
+    if exit_code is not None:
+        sys.exit(exit_code)
+    worker = Worker.from_environ()
+    listen_socket = worker.listen_socket(host, port) if worker else None
+    metrics = worker.metrics_registry() if worker else MetricsRegistry()
+    on_ready = worker.notifier() if worker else notifier_from_args(args)
+
+    if args.engine == 'asyncio':
+        server = HTTPValidationServer(port, host, backlog=args.backlog, handler_threads=args.handler_threads,
+                                      max_pipeline=args.max_pipeline,
+                                      validation=validation_service_from_args(args),
+                                      metrics=metrics, admission=admission_from_args(args),
+                                      listen_socket=listen_socket, on_ready=on_ready,
+                                      compression=compression_from_args(args),
+                                      capture=capture_from_args(args), profiler=profiler_from_args(args),
+                                      server_timing=args.server_timing, timeouts=timeouts_from_args(args))
+        install_signal_handlers(lambda: server.drain(args.drain_timeout), server.validation.reload)
+        try:
+            server.start()
+        except KeyboardInterrupt:
+            log.info("Shutting down server...", extra=SHUTDOWN)
+        return
 
-    server = HTTPServer((host, port), SimpleHTTPHandler)
-    print(f"[STARTUP] Server initialized, listening for connections", file=sys.stderr)
-    sys.stderr.flush()
+    # one request per connection: a socket timeout on every recv and send stands in for the timeouts
+    SimpleHTTPHandler.timeout = args.read_timeout or None
+    if listen_socket:
+        server = HTTPServer((host, port), SimpleHTTPHandler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = listen_socket
+        server.server_activate()
+    else:
+        server = HTTPServer((host, port), SimpleHTTPHandler)
+    port = server.socket.getsockname()[1]  # the real port when asked for 0
+    log.info("Starting simple_python test server on http://%s:%d", host, port, extra=STARTUP)
+    log.info("Endpoints: POST /validate, POST /echo, GET /health, GET /metrics", extra=STARTUP)
+    server.stats = TransportMetrics(metrics, 'http')
+    server.validation = validation_service_from_args(args)
+    server.validation.bind_metrics(metrics)
+    server.admission = admission_from_args(args)
+    server.compression = compression_from_args(args)
+    server.server_timing = args.server_timing
+    profiler_from_args(args)
+    # serve_forever() finishes the request it is handling before it returns; shutdown() waits for that
+    install_signal_handlers(lambda: Thread(target=server.shutdown, name="drain").start(),
+                            server.validation.reload)
+    server.validation.start()
+    log.info("Server initialized, listening for connections (%s)", server.validation.description(),
+             extra=STARTUP)
+    if on_ready:
+        on_ready(port)
 
     try:
         server.serve_forever()
     except KeyboardInterrupt:
-        print("\n[SHUTDOWN] Shutting down server...", file=sys.stderr)
-        sys.stderr.flush()
+        log.info("Shutting down server...", extra=SHUTDOWN)
         server.shutdown()
+    finally:
+        server.validation.shutdown()
 
 
 if __name__ == '__main__':
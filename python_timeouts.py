@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Idle, read and write timeouts for the connections of the HTTP, IPC and gRPC servers.
+
+A client that stops talking holds its socket, a max_connections slot and, on
+the threaded engine, a thread for as long as the connection stays open; a
+half-open connection whose peer vanished does so forever. Three timeouts let
+a server reclaim them:
+
+  idle   (--idle-timeout)   nothing of the next frame or HTTP request has
+                            arrived this long after the previous one, while no
+                            request of the connection is still being answered
+  read   (--read-timeout)   a frame (length prefix and payload) or HTTP request
+                            (head and body) is not complete this long after its
+                            first byte arrived, so neither a trickled prefix nor
+                            a trickled payload can hold the connection
+  write  (--write-timeout)  a response is not written this long after the
+                            write began: the client stopped reading
+
+Every connection's deadline is kept in one heap per server, swept every tick
+(a tenth of the shortest timeout, at most a second) by a single thread on the
+threaded engine or a single task on the event loop, never a timer per
+connection. Moving a deadline later, which happens on every frame, only
+updates the connection's Deadline; the heap entry is re-queued when it comes
+due. A connection past its deadline is closed (socket shut down or transport
+aborted), which wakes whatever was blocked on it, and counted in
+reclaimed_connections_total{reason="idle"|"read"|"write"}. The heap's table of
+open connections and their states is kept with the timeouts off as well: a
+draining server uses it to stop reading the idle ones (see python_lifecycle).
+
+Read and write timeouts default to DEFAULT_TIMEOUT seconds; the idle timeout
+is off by default since Eiffel bridges keep their connections open between
+bursts. A streamed HTTP request body (python_streaming) is bounded by the read
+timeout for its head only, as the server stops reading while the validator
+catches up. The legacy http.server engine uses its socket timeout instead.
+"""
+
+import asyncio
+import heapq
+import itertools
+import socket
+import time
+from threading import Event, Lock, Thread
+
+from python_logging import fields, log
+
+IDLE = 'idle'
+READ = 'read'
+WRITE = 'write'
+DEFAULT_TIMEOUT = 30.0
+NEVER = float('inf')
+MIN_TICK = 0.01
+MAX_TICK = 1.0
+
+
+class ConnectionTimeouts:
+    """Idle, read and write timeouts in seconds (0 = off)."""
+
+    def __init__(self, idle_timeout=0.0, read_timeout=DEFAULT_TIMEOUT, write_timeout=DEFAULT_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+
+    @property
+    def enabled(self):
+        return bool(self.idle_timeout or self.read_timeout or self.write_timeout)
+
+    @property
+    def tick(self):
+        """How often deadlines are checked: a tenth of the shortest timeout, within [MIN_TICK, MAX_TICK]."""
+        shortest = min(timeout for timeout in (self.idle_timeout, self.read_timeout, self.write_timeout)
+                       if timeout)
+        return min(MAX_TICK, max(MIN_TICK, shortest / 10))
+
+    def description(self):
+        """Describe the timeouts for the startup line."""
+        if not self.enabled:
+            return "timeouts=off"
+        return (f"timeouts=idle:{self.idle_timeout or 'off'}/read:{self.read_timeout or 'off'}"
+                f"/write:{self.write_timeout or 'off'}")
+
+
+class Deadline:
+    """One connection's current deadline, moved by its handler and enforced by a DeadlineHeap."""
+
+    __slots__ = ('heap', 'close', 'stop_reading', 'peer', 'busy', 'state', 'due', 'write_due', 'scheduled',
+                 'expired')
+
+    def __init__(self, heap, close, stop_reading=None, peer=None, busy=None):
+        self.heap = heap
+        self.close = close
+        self.stop_reading = stop_reading  # ends the connection's reads but lets its responses be written
+        self.peer = peer
+        self.busy = busy  # callable: True while requests of the connection are being answered
+        self.state = None
+        self.due = NEVER
+        self.write_due = NEVER
+        self.scheduled = NEVER  # earliest time queued in the heap
+        self.expired = None  # the timeout that closed the connection
+
+    def idle(self):
+        """Waiting for the first byte of the next frame or request."""
+        self._set(IDLE, self.heap.timeouts.idle_timeout)
+
+    def reading(self):
+        """The first byte of a frame or request has arrived; the rest must follow within read_timeout."""
+        self._set(READ, self.heap.timeouts.read_timeout)
+
+    def done(self):
+        """A complete frame or request has been read."""
+        self.state = None
+        self.due = NEVER
+
+    def writing(self):
+        timeout = self.heap.timeouts.write_timeout
+        if timeout:
+            self.write_due = time.monotonic() + timeout
+            if self.write_due < self.scheduled:
+                self.heap.schedule(self, self.write_due)
+
+    def written(self):
+        self.write_due = NEVER
+
+    def cancel(self):
+        self.state = None
+        self.due = self.write_due = NEVER
+
+    def _set(self, state, timeout):
+        self.state = state
+        if not timeout:
+            self.due = NEVER
+            return
+        self.due = time.monotonic() + timeout
+        if self.due < self.scheduled:
+            self.heap.schedule(self, self.due)
+
+
+class DeadlineHeap:
+    """The deadlines of one server's connections, swept by one thread or event-loop task."""
+
+    def __init__(self, timeouts, stats=None):
+        self.timeouts = timeouts
+        self.stats = stats
+        self.heap = []
+        self.connections = {}
+        self.sequence = itertools.count()
+        self.lock = Lock()
+        self.stopped = Event()
+
+    def track(self, key, close, stop_reading=None, peer=None, busy=None):
+        """Start enforcing the deadlines of the connection `key` (its writer or socket); idle to begin with."""
+        deadline = self.connections[key] = Deadline(self, close, stop_reading, peer, busy)
+        deadline.idle()
+        return deadline
+
+    def get(self, key):
+        return self.connections.get(key)
+
+    def forget(self, key):
+        deadline = self.connections.pop(key, None)
+        if deadline is not None:
+            deadline.cancel()
+
+    def stop_idle(self):
+        """Stop reading every connection waiting for its next frame or request with nothing left to answer."""
+        for deadline in list(self.connections.values()):
+            if deadline.state == IDLE and deadline.stop_reading and not (deadline.busy and deadline.busy()):
+                try:
+                    deadline.stop_reading()
+                except OSError:
+                    pass
+
+    def close_all(self, reason):
+        """Close every open connection, counting each as reclaimed for `reason`."""
+        for deadline in list(self.connections.values()):
+            deadline.expired = reason
+            if self.stats:
+                self.stats.reclaimed(reason)
+            try:
+                deadline.close()
+            except OSError:
+                pass
+
+    def schedule(self, deadline, when):
+        with self.lock:
+            heapq.heappush(self.heap, (when, next(self.sequence), deadline))
+            deadline.scheduled = when
+
+    def expire(self, now):
+        """Close every connection whose deadline has passed."""
+        expired = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                when, _, deadline = heapq.heappop(self.heap)
+                if when != deadline.scheduled or deadline.expired:
+                    continue  # superseded by an earlier entry for the same connection
+                if deadline.write_due <= now:
+                    expired.append((deadline, WRITE))
+                    continue
+                if deadline.due <= now and deadline.state == IDLE and deadline.busy and deadline.busy():
+                    deadline.due = now + self.timeouts.idle_timeout  # not idle: still answering
+                if deadline.due <= now:
+                    expired.append((deadline, deadline.state))
+                    continue
+                deadline.scheduled = min(deadline.due, deadline.write_due)
+                if deadline.scheduled < NEVER:
+                    heapq.heappush(self.heap, (deadline.scheduled, next(self.sequence), deadline))
+        for deadline, reason in expired:
+            deadline.expired = reason
+            log.warning("Closing connection: %s timeout", reason, extra=fields(peer=deadline.peer))
+            if self.stats:
+                self.stats.reclaimed(reason)
+            try:
+                deadline.close()
+            except OSError:
+                pass
+
+    def run_thread(self, name):
+        """Sweep on a daemon thread until stop() (threaded engine)."""
+        def run():
+            while not self.stopped.wait(self.timeouts.tick):
+                self.expire(time.monotonic())
+        Thread(target=run, name=f"{name}-deadlines", daemon=True).start()
+
+    async def run_async(self):
+        """Sweep on the event loop until cancelled (asyncio engines)."""
+        while True:
+            await asyncio.sleep(self.timeouts.tick)
+            self.expire(time.monotonic())
+
+    def stop(self):
+        self.stopped.set()
+
+
+def shutdown_socket(sock, how=socket.SHUT_RDWR):
+    """The close (or, with SHUT_RD, stop_reading) action of a threaded connection; wakes blocked calls."""
+    return lambda: sock.shutdown(how)
+
+
+def stop_stream(reader, writer):
+    """The stop_reading action of an event-loop connection: its pending read sees a clean EOF."""
+    def stop():
+        writer.transport.pause_reading()
+        reader.feed_eof()
+    return stop
+
+
+def add_timeout_arguments(parser):
+    """Add the connection timeout command-line options shared by every server."""
+    parser.add_argument("--idle-timeout", type=float, default=0.0,
+                        help="Close connections idle for S seconds (default: 0 = never)")
+    parser.add_argument("--read-timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Close connections that take S seconds to send one frame or request "
+                             f"(default: {DEFAULT_TIMEOUT:g}; 0 = never)")
+    parser.add_argument("--write-timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Close connections that take S seconds to accept one response "
+                             f"(default: {DEFAULT_TIMEOUT:g}; 0 = never)")
+
+
+def timeouts_from_args(args):
+    """Build ConnectionTimeouts from parsed command-line arguments."""
+    return ConnectionTimeouts(args.idle_timeout, args.read_timeout, args.write_timeout)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Validation message handling shared by the HTTP, IPC and gRPC servers.
+
+A VALIDATION_BATCH message carries many requests in attributes.requests and is
+answered with one VALIDATION_BATCH_RESPONSE whose attributes.responses holds
+one response per request, in request order. A request that fails yields an
+ERROR entry at its position without failing the rest of the batch.
+
+A PING message is answered with a PONG without touching the validators; it is
+the socket servers' liveness probe (HTTP has GET /health).
+"""
+
+BATCH_TYPE = 'VALIDATION_BATCH'
+BATCH_RESPONSE_TYPE = 'VALIDATION_BATCH_RESPONSE'
+PING_TYPE = 'PING'
+PONG_TYPE = 'PONG'
+
+
+def validation_response(message_id, text):
+    """Build a passing VALIDATION_RESPONSE."""
+    return {
+        "type": "VALIDATION_RESPONSE",
+        "message_id": message_id,
+        "attributes": {
+            "result": "PASS",
+            "message": text,
+            "echoed_message_id": message_id
+        }
+    }
+
+
+def error_response(message_id, error_code, error_message):
+    """Build an ERROR message."""
+    return {
+        "type": "ERROR",
+        "message_id": message_id,
+        "attributes": {
+            "error_code": error_code,
+            "error_message": error_message
+        }
+    }
+
+
+def is_ping(message_json):
+    """True if the message is a PING liveness probe."""
+    return message_json.get("type") == PING_TYPE
+
+
+def pong_response(message_json):
+    """Build the PONG answering a PING."""
+    return {
+        "type": PONG_TYPE,
+        "message_id": message_json.get("message_id", "unknown"),
+        "attributes": {"status": "ok"}
+    }
+
+
+def is_batch(message_json):
+    """True if the message is a VALIDATION_BATCH."""
+    return message_json.get("type") == BATCH_TYPE
+
+
+def process_batch(message_json, validate, validate_many=None):
+    """Validate every request of a batch, isolating failures.
+
+    `validate_many`, if given, receives all well-formed requests at once so the
+    caller can validate them in parallel; otherwise `validate` runs per request.
+    """
+    batch_id = message_json.get("message_id", "unknown")
+    requests = (message_json.get("attributes") or {}).get("requests")
+    if not isinstance(requests, list):
+        return error_response(batch_id, "INVALID_BATCH",
+                              "VALIDATION_BATCH requires an attributes.requests array")
+
+    responses = []
+    valid = []
+    for index, request in enumerate(requests):
+        if not isinstance(request, dict):
+            responses.append(error_response("unknown", "INVALID_REQUEST",
+                                            f"Batch item {index} is not a JSON object"))
+        elif is_batch(request):
+            responses.append(error_response(request.get("message_id", "unknown"), "INVALID_REQUEST",
+                                            "Nested VALIDATION_BATCH messages are not supported"))
+        else:
+            responses.append(None)
+            valid.append((index, request))
+
+    if validate_many is not None:
+        results = validate_many([request for _, request in valid])
+    else:
+        results = [_validate_isolated(validate, request) for _, request in valid]
+    for (index, _), response in zip(valid, results):
+        responses[index] = response
+
+    errors = sum(1 for response in responses if response.get("type") == "ERROR")
+    return {
+        "type": BATCH_RESPONSE_TYPE,
+        "message_id": batch_id,
+        "attributes": {
+            "count": len(responses),
+            "errors": errors,
+            "responses": responses
+        }
+    }
+
+
+def _validate_isolated(validate, request):
+    try:
+        return validate(request)
+    except Exception as e:
+        return error_response(request.get("message_id", "unknown"), "VALIDATION_FAILED", str(e))
+
+
+def process_message(message_json, validate, validate_many=None):
+    """Answer a single request or a VALIDATION_BATCH."""
+    if is_batch(message_json):
+        return process_batch(message_json, validate, validate_many)
+    return validate(message_json)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Pluggable validators for the HTTP, IPC and gRPC servers.
+
+A validator is a function that takes the request message dict and returns the
+attributes of its VALIDATION_RESPONSE, e.g. {"result": "PASS", "score": 0.95}.
+A request is routed by attributes.validator if present, otherwise by its type;
+requests matching no validator get the server's built-in echo response.
+
+Validator modules are loaded with --validators module[,module...]. A module
+registers validators through a module-level VALIDATORS dict mapping a name to
+a function or to a (function, timeout_seconds) pair, and may define
+init_worker(), which runs once per process before any request (load models
+there).
+
+Two execution modes are available:
+  inline   - validators run on the handler thread (default)
+  process  - validators run on a ProcessPoolExecutor so CPU-bound validators use
+             every core; workers are started and initialized up front, and
+             per-validator timeouts are enforced (a timed-out request is answered
+             with VALIDATION_TIMEOUT while its worker finishes in the background)
+
+With --cache-size N, responses are memoized in a ResultCache keyed by the
+request's (type, attributes); ERROR responses are never cached. With
+--idempotency-window S, a retried message_id attaches to its validation still
+in flight or is answered from a journal of recent responses (see
+python_idempotency).
+
+A streamed request (see python_streaming) reaches its validator with the
+streamed attribute as an iterator over items still arriving; it is never
+cached, and in process mode it is collected into a list for the worker.
+
+reload() (SIGHUP, see python_lifecycle) re-imports the validator modules into a
+new registry and, in process mode, starts and warms a new pool; both replace
+the running ones only once ready, the old workers finishing the requests they
+were given. A module that fails to import or initialize leaves the running
+validators in place.
+"""
+
+import importlib
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+from python_idempotency import DEFAULT_MAX_ENTRIES, IdempotencyJournal
+from python_logging import log
+from python_result_cache import ResultCache
+from python_streaming import streamed_attribute
+from python_validation import error_response, process_message
+
+MODES = ('inline', 'process')
+
+
+class ValidatorRegistry:
+    """Validator functions keyed by name, with optional per-validator timeouts."""
+
+    def __init__(self):
+        self.validators = {}
+        self.timeouts = {}
+
+    def register(self, name, function, timeout=None):
+        """Register `function` under `name`."""
+        self.validators[name] = function
+        if timeout is not None:
+            self.timeouts[name] = timeout
+
+    def load_module(self, module_name, init_worker=True, reload=False):
+        """Import (or re-import) a validator module, register its VALIDATORS and warm it up."""
+        module = importlib.import_module(module_name)
+        if reload:
+            module = importlib.reload(module)
+        for name, entry in getattr(module, 'VALIDATORS', {}).items():
+            if isinstance(entry, tuple):
+                self.register(name, *entry)
+            else:
+                self.register(name, entry)
+        if init_worker and hasattr(module, 'init_worker'):
+            module.init_worker()
+
+    def resolve(self, message):
+        """Return the validator name for a message, or None for the default response."""
+        attributes = message.get("attributes")
+        if isinstance(attributes, dict) and "validator" in attributes:
+            return attributes["validator"]
+        message_type = message.get("type")
+        if message_type in self.validators:
+            return message_type
+        return None
+
+    def run(self, name, message):
+        """Run a validator and wrap its attributes in a VALIDATION_RESPONSE."""
+        message_id = message.get("message_id", "unknown")
+        function = self.validators.get(name)
+        if function is None:
+            return error_response(message_id, "UNKNOWN_VALIDATOR", f"No validator named '{name}'")
+        try:
+            attributes = function(message)
+        except Exception as e:
+            return error_response(message_id, "VALIDATION_FAILED", f"{type(e).__name__}: {e}")
+        return {
+            "type": "VALIDATION_RESPONSE",
+            "message_id": message_id,
+            "attributes": attributes
+        }
+
+
+_worker_registry = None
+
+
+def _init_worker(module_names):
+    """Process-pool initializer: load (and warm) the validator modules once."""
+    global _worker_registry
+    _worker_registry = ValidatorRegistry()
+    for module_name in module_names:
+        _worker_registry.load_module(module_name)
+
+
+def _run_in_worker(name, message):
+    return _worker_registry.run(name, message)
+
+
+def _ping():
+    return True
+
+
+class ValidationService:
+    """Routes requests to registered validators, inline or on a process pool."""
+
+    def __init__(self, modules=(), mode='inline', pool_size=None, default_timeout=None, cache=None,
+                 journal=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown validation mode: {mode}")
+        self.modules = list(modules)
+        self.mode = mode
+        self.pool_size = pool_size
+        self.default_timeout = default_timeout
+        self.cache = cache
+        self.journal = journal
+        self.registry = ValidatorRegistry()
+        for module_name in self.modules:
+            # process mode only needs the names here; workers do the warm-up
+            self.registry.load_module(module_name, init_worker=(mode == 'inline'))
+        self.pool = None
+        self._pool_lock = Lock()
+        self._reload_lock = Lock()
+
+    @property
+    def blocking(self):
+        """True if handle() waits on other processes and belongs off the event loop."""
+        return self.mode == 'process'
+
+    def start(self):
+        """Start and warm the worker pool (process mode)."""
+        if self.mode == 'process':
+            self._start_pool()
+
+    def _start_pool(self):
+        self.pool = self._new_pool()
+
+    def _new_pool(self):
+        """A process pool whose workers have all loaded the validator modules."""
+        pool = ProcessPoolExecutor(max_workers=self.pool_size, initializer=_init_worker, initargs=(self.modules,))
+        try:
+            for ready in wait([pool.submit(_ping) for _ in range(pool._max_workers)]).done:
+                ready.result()
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        return pool
+
+    def reload(self):
+        """Re-import the validator modules and swap them in without dropping a request (SIGHUP).
+
+        Returns False, keeping the running validators, if a module fails to load.
+        """
+        with self._reload_lock:
+            registry = ValidatorRegistry()
+            pool = None
+            try:
+                for module_name in self.modules:
+                    # workers forked from here inherit the reloaded modules
+                    registry.load_module(module_name, init_worker=(self.mode == 'inline'), reload=True)
+                if self.mode == 'process':
+                    pool = self._new_pool()
+            except Exception as e:
+                log.error("Validator reload failed, keeping the running validators: %s: %s", type(e).__name__, e)
+                return False
+            with self._pool_lock:
+                self.registry = registry
+                previous, self.pool = self.pool, pool or self.pool
+            if pool and previous:
+                previous.shutdown(wait=False)  # its workers finish the requests already submitted
+            if self.cache:
+                self.cache.clear()
+            log.info("Validators reloaded (%s)", self.description())
+            return True
+
+    def bind_metrics(self, registry):
+        """Record the service's own counters (answered duplicates, result cache) in a server's metrics registry."""
+        if self.journal:
+            self.journal.bind_metrics(registry)
+        if self.cache:
+            self.cache.bind_metrics(registry)
+
+    def shutdown(self):
+        """Stop the worker pool."""
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def description(self):
+        """Describe the validation settings for the startup line."""
+        names = ','.join(sorted(self.registry.validators)) or 'none'
+        if self.mode == 'process':
+            description = f"validation=process({self.pool._max_workers} workers), validators={names}"
+        else:
+            description = f"validation=inline, validators={names}"
+        if self.cache:
+            description += f", cache={self.cache.max_entries}x{self.cache.ttl:g}s"
+        if self.journal:
+            description += f", {self.journal.description()}"
+        return description
+
+    def timeout_for(self, name):
+        return self.registry.timeouts.get(name, self.default_timeout)
+
+    def handle(self, message, default):
+        """Answer a request or VALIDATION_BATCH; `default(message)` answers unrouted requests."""
+        stream = streamed_attribute(message)
+        if stream is not None:
+            return self.validate_stream(message, stream, default)
+        if self.journal is not None:
+            return self.journal.run(message, lambda message: self._process(message, default))
+        return self._process(message, default)
+
+    def _process(self, message, default):
+        return process_message(message,
+                               lambda request: self.validate(request, default),
+                               lambda requests: self.validate_many(requests, default))
+
+    def validate(self, message, default):
+        """Validate a single request."""
+        return self.validate_many([message], default)[0]
+
+    def validate_stream(self, message, stream, default):
+        """Validate a streamed request (blocks until its validator has consumed the stream)."""
+        try:
+            if self.mode == 'process':
+                message["attributes"][stream.name] = list(stream)
+            return self._validate_uncached([message], default)[0]
+        finally:
+            stream.abandon()
+
+    def validate_many(self, messages, default):
+        """Validate requests, answering repeats from the result cache."""
+        if self.cache is None:
+            return self._validate_uncached(messages, default)
+
+        keys = [ResultCache.key(message) for message in messages]
+        responses = [self.cache.get(key, message.get("message_id", "unknown"))
+                     for key, message in zip(keys, messages)]
+        misses = [index for index, response in enumerate(responses) if response is None]
+        if misses:
+            registry = self.registry
+            fresh = self._validate_uncached([messages[index] for index in misses], default)
+            for index, response in zip(misses, fresh):
+                # a response of validators reloaded meanwhile is not cached
+                if response.get("type") != "ERROR" and self.registry is registry:
+                    self.cache.put(keys[index], response)
+                responses[index] = response
+        return responses
+
+    def _validate_uncached(self, messages, default):
+        """Validate requests, running process-mode validators in parallel."""
+        registry = self.registry
+        names = [registry.resolve(message) for message in messages]
+        if self.mode == 'inline':
+            return [default(message) if name is None else registry.run(name, message)
+                    for name, message in zip(names, messages)]
+
+        futures = [None if name is None else self._submit(name, message)
+                   for name, message in zip(names, messages)]
+        return [default(message) if future is None else self._collect(name, message, future)
+                for name, message, future in zip(names, messages, futures)]
+
+    def _submit(self, name, message):
+        try:
+            return self.pool.submit(_run_in_worker, name, message)
+        except BrokenProcessPool:
+            self._restart_pool()
+            return self.pool.submit(_run_in_worker, name, message)
+
+    def _collect(self, name, message, future):
+        message_id = message.get("message_id", "unknown")
+        timeout = self.timeout_for(name)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            return error_response(message_id, "VALIDATION_TIMEOUT",
+                                  f"Validator '{name}' exceeded {timeout}s")
+        except BrokenProcessPool:
+            self._restart_pool()
+            return error_response(message_id, "VALIDATION_FAILED",
+                                  f"Validator '{name}' worker process died")
+
+    def _restart_pool(self):
+        with self._pool_lock:
+            if self.pool is None or self.pool._broken:
+                self.shutdown()
+                self._start_pool()
+
+
+def add_validation_arguments(parser):
+    """Add the validator command-line options shared by every server."""
+    parser.add_argument("--validators", default='',
+                        help="Comma-separated validator modules to load")
+    parser.add_argument("--validation-mode", choices=MODES, default='inline',
+                        help="Run validators inline or on a process pool (default: inline)")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="Validator worker processes in process mode (default: CPU count)")
+    parser.add_argument("--validator-timeout", type=float, default=None,
+                        help="Default per-validator timeout in seconds (process mode)")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="Cache up to N responses keyed by (type, attributes) (default: 0 = off)")
+    parser.add_argument("--cache-ttl", type=float, default=300.0,
+                        help="Seconds a cached response stays valid (default: 300)")
+    parser.add_argument("--idempotency-window", type=float, default=0.0,
+                        help="Answer a message_id repeated within S seconds with its first response "
+                             "(default: 0 = off)")
+    parser.add_argument("--idempotency-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f"Responses kept for --idempotency-window (default: {DEFAULT_MAX_ENTRIES})")
+
+
+def validation_service_from_args(args):
+    """Build a ValidationService from parsed command-line arguments."""
+    modules = [name.strip() for name in args.validators.split(',') if name.strip()]
+    cache = ResultCache(args.cache_size, args.cache_ttl) if args.cache_size > 0 else None
+    journal = IdempotencyJournal(args.idempotency_window, args.idempotency_size) \
+        if args.idempotency_window > 0 else None
+    return ValidationService(modules, mode=args.validation_mode, pool_size=args.pool_size,
+                             default_timeout=args.validator_timeout, cache=cache, journal=journal)
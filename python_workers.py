@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Multi-process worker mode (--workers N) for the HTTP, IPC and gRPC servers.
+
+A single server process is capped at one core by the GIL. With --workers N the
+process started from the command line becomes a master that serves nothing
+itself: it runs N copies of the same command line as workers, which share the
+listening port in one of two ways (--worker-socket):
+
+  reuseport  - every worker binds its own SO_REUSEPORT socket and the kernel
+               spreads incoming connections across them (default for TCP on
+               platforms that have SO_REUSEPORT)
+  inherit    - the master binds one listening socket and the workers inherit
+               it and accept from the shared queue (Unix sockets always use it)
+
+Workers learn their role from the environment (WORKER_ENV, LISTEN_FD_ENV,
+PORT_ENV, READY_FD_ENV, METRICS_DIR_ENV), so a worker runs exactly the
+master's arguments. The master restarts a worker that exits, backing off
+exponentially while it keeps crashing on startup.
+
+Readiness (--ready-fd / --notify-socket) is reported by the master alone, with
+the port it bound (so port 0 works), once every initial worker has reported
+listening on its private ready pipe.
+
+Metrics are aggregated across workers: each worker writes its registry's
+export_state() to a file in a shared directory every METRICS_INTERVAL seconds,
+and the worker that answers GET /metrics or a STATS frame sums the other
+workers' latest states into its own (counters of a restarted worker start
+again from zero). The master publishes worker_restarts_total the same way.
+
+SIGUSR1 and SIGHUP sent to the master are forwarded to every live worker, so
+one signal profiles them all (see python_profiling) or reloads their
+validators (see python_lifecycle). SIGTERM stops accepting and lets each
+worker drain for --drain-timeout seconds before it is killed.
+"""
+
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from python_lifecycle import DEFAULT_DRAIN_TIMEOUT, STOP_GRACE
+from python_logging import SHUTDOWN, STARTUP, log
+from python_metrics import MetricsRegistry
+from python_readiness import READY, ReadyNotifier, notifier_from_args
+
+WORKER_SOCKETS = ('reuseport', 'inherit')
+WORKER_ENV = 'SIMPLE_PYTHON_WORKER'
+LISTEN_FD_ENV = 'SIMPLE_PYTHON_LISTEN_FD'
+METRICS_DIR_ENV = 'SIMPLE_PYTHON_METRICS_DIR'
+PORT_ENV = 'SIMPLE_PYTHON_PORT'
+READY_FD_ENV = 'SIMPLE_PYTHON_READY_FD'
+METRICS_INTERVAL = 1.0
+POLL_INTERVAL = 0.2
+STABLE_AFTER = 5.0  # a worker that ran this long resets the restart backoff
+MAX_RESTART_DELAY = 10.0
+MASTER_STATE = 'master.json'
+
+
+def default_worker_socket():
+    return 'reuseport' if hasattr(socket, 'SO_REUSEPORT') else 'inherit'
+
+
+def bind_socket(host, port, unix_path=None, reuse_port=False):
+    """Create a bound (not yet listening) stream socket for the server address."""
+    if unix_path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if unix_path.startswith('@'):
+            sock.bind('\0' + unix_path[1:])
+        else:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            sock.bind(unix_path)
+        return sock
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def write_state(path, state):
+    """Replace `path` atomically so readers never see a partial file."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as state_file:
+        json.dump(state, state_file)
+    os.replace(temporary, path)
+
+
+def _read_states(directory, own_file):
+    states = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return states
+    for name in names:
+        if name == own_file or not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as state_file:
+                states.append(json.load(state_file))
+        except (OSError, ValueError):
+            continue  # removed or replaced while listing
+    return states
+
+
+class Worker:
+    """This process's place in a --workers group, as set up by the master."""
+
+    def __init__(self, index, listen_fd=None, metrics_dir=None, port=None, ready_fd=None):
+        self.index = index
+        self.listen_fd = listen_fd
+        self.metrics_dir = metrics_dir
+        self.port = port
+        self.ready_fd = ready_fd
+        self.state_file = f"worker-{index}.json"
+
+    @classmethod
+    def from_environ(cls):
+        """The Worker for this process, or None if it is not a worker."""
+        index = os.environ.get(WORKER_ENV)
+        if index is None:
+            return None
+        def optional_int(name):
+            value = os.environ.get(name)
+            return int(value) if value else None
+        return cls(int(index), optional_int(LISTEN_FD_ENV), os.environ.get(METRICS_DIR_ENV),
+                   optional_int(PORT_ENV), optional_int(READY_FD_ENV))
+
+    def listen_socket(self, host, port, unix_path=None):
+        """The inherited listening socket, or a fresh SO_REUSEPORT one on the master's port."""
+        if self.listen_fd is not None:
+            return socket.socket(fileno=self.listen_fd)
+        return bind_socket(host, self.port or port, unix_path, reuse_port=True)
+
+    def notifier(self):
+        """Readiness callback reporting to the master (restarted workers report nothing)."""
+        return ReadyNotifier(self.ready_fd) if self.ready_fd is not None else None
+
+    def metrics_registry(self):
+        """A registry that publishes its state and merges the other workers'."""
+        registry = MetricsRegistry()
+        if self.metrics_dir:
+            registry.peers = lambda: _read_states(self.metrics_dir, self.state_file)
+            Thread(target=self._publish, args=(registry,), name=f"worker-{self.index}-metrics",
+                   daemon=True).start()
+        return registry
+
+    def _publish(self, registry):
+        path = os.path.join(self.metrics_dir, self.state_file)
+        while True:
+            try:
+                write_state(path, registry.export_state())
+            except OSError as e:
+                log.warning("Could not publish worker metrics: %s", e)
+            time.sleep(METRICS_INTERVAL)
+
+
+class WorkerMaster:
+    """Runs and restarts N worker copies of this process's command line."""
+
+    def __init__(self, name, workers, worker_socket, host, port, unix_path=None, backlog=socket.SOMAXCONN,
+                 on_ready=None, argv=None, drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+        self.name = name
+        self.workers = workers
+        self.worker_socket = 'inherit' if unix_path else worker_socket
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.backlog = backlog
+        self.on_ready = on_ready
+        self.drain_timeout = drain_timeout
+        self.ready_pipes = {}
+        self.argv = argv or [sys.executable] + sys.argv
+        self.processes = [None] * workers
+        self.started = [0.0] * workers
+        self.restart_at = [0.0] * workers
+        self.backoff = [0.0] * workers
+        self.metrics = MetricsRegistry()
+        self.restarts = self.metrics.counter('worker_restarts_total', 'Worker processes restarted by the master')
+        self.metrics_dir = None
+        self.sock = None
+        self.running = False
+
+    def run(self):
+        """Start the workers and supervise them until interrupted; returns an exit code."""
+        # the master's socket reserves the port (reuseport) or is the shared socket (inherit)
+        self.sock = bind_socket(self.host, self.port, self.unix_path,
+                                reuse_port=self.worker_socket == 'reuseport')
+        if not self.unix_path:
+            self.port = self.sock.getsockname()[1]
+        if self.worker_socket == 'inherit':
+            self.sock.listen(self.backlog)
+            self.sock.set_inheritable(True)
+        self.metrics_dir = tempfile.mkdtemp(prefix='simple_python-metrics-')
+        self._publish_metrics()
+        self.running = True
+        previous = signal.signal(signal.SIGTERM, self._terminate)
+        forwarded = {signum: signal.signal(signum, self._forward)
+                     for signum in (getattr(signal, 'SIGUSR1', None), getattr(signal, 'SIGHUP', None)) if signum}
+        log.info("%s master (pid %d) starting %d workers on %s (worker_socket=%s)",
+                 self.name, os.getpid(), self.workers, self.unix_path or f"{self.host}:{self.port}",
+                 self.worker_socket, extra=STARTUP)
+        try:
+            for index in range(self.workers):
+                self._spawn(index, report_ready=True)
+            self._wait_ready()
+            while self.running:
+                time.sleep(POLL_INTERVAL)
+                self._check_workers()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            signal.signal(signal.SIGTERM, previous)
+            for signum, handler in forwarded.items():
+                signal.signal(signum, handler)
+            self.sock.close()  # an inherited socket stops accepting once every worker has closed it too
+            log.info("%s master stopping %d workers...", self.name, self.workers, extra=SHUTDOWN)
+            self._stop_workers()
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+            if self.unix_path and not self.unix_path.startswith('@'):
+                try:
+                    os.unlink(self.unix_path)
+                except FileNotFoundError:
+                    pass
+        return 0
+
+    def _terminate(self, signum, frame):
+        self.running = False
+
+    def _forward(self, signum, frame):
+        for process in self.processes:
+            if process is not None and process.returncode is None:
+                process.send_signal(signum)
+
+    def _spawn(self, index, report_ready=False):
+        environment = dict(os.environ)
+        environment[WORKER_ENV] = str(index)
+        environment[METRICS_DIR_ENV] = self.metrics_dir
+        pass_fds = []
+        if self.worker_socket == 'inherit':
+            environment[LISTEN_FD_ENV] = str(self.sock.fileno())
+            pass_fds.append(self.sock.fileno())
+        elif not self.unix_path:
+            environment[PORT_ENV] = str(self.port)
+        ready_write = None
+        if report_ready:
+            ready_read, ready_write = os.pipe()
+            self.ready_pipes[index] = ready_read
+            environment[READY_FD_ENV] = str(ready_write)
+            pass_fds.append(ready_write)
+        self.processes[index] = subprocess.Popen(self.argv, env=environment, pass_fds=pass_fds)
+        if ready_write is not None:
+            os.close(ready_write)
+        self.started[index] = time.monotonic()
+        log.info("Worker %d started (pid %d)", index, self.processes[index].pid)
+
+    def _wait_ready(self):
+        """Block until every initial worker is listening (or has exited), then report readiness."""
+        listening = 0
+        for ready_read in self.ready_pipes.values():
+            with os.fdopen(ready_read, 'rb') as pipe:
+                if pipe.readline().startswith(READY.encode('ascii')):
+                    listening += 1
+        self.ready_pipes.clear()
+        if listening and self.on_ready:
+            self.on_ready(self.unix_path or self.port)
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            if process is not None:
+                code = process.poll()
+                if code is None:
+                    continue
+                if now - self.started[index] >= STABLE_AFTER:
+                    self.backoff[index] = 0.0
+                self.backoff[index] = min(MAX_RESTART_DELAY, self.backoff[index] * 2 or POLL_INTERVAL)
+                self.restart_at[index] = now + self.backoff[index]
+                self.processes[index] = None
+                log.warning("Worker %d (pid %d) exited with code %s; restarting in %.1fs",
+                            index, process.pid, code, self.backoff[index])
+            elif now >= self.restart_at[index]:
+                self._spawn(index)
+                self.restarts.inc()
+                self._publish_metrics()
+
+    def _publish_metrics(self):
+        write_state(os.path.join(self.metrics_dir, MASTER_STATE), self.metrics.export_state())
+
+    def _stop_workers(self):
+        live = [process for process in self.processes if process is not None]
+        for process in live:
+            if process.poll() is None:
+                process.terminate()
+        deadline = time.monotonic() + self.drain_timeout + STOP_GRACE  # SIGTERM drains each worker
+        for process in live:
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def add_worker_arguments(parser):
+    """Add the --workers command-line options shared by every server."""
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Serve from N worker processes supervised by a master (default: 1 = no master)")
+    parser.add_argument("--worker-socket", choices=WORKER_SOCKETS, default=default_worker_socket(),
+                        help="How workers share the port: SO_REUSEPORT sockets or one inherited "
+                             f"listening socket (default: {default_worker_socket()})")
+
+
+def run_master(name, args, host, port, unix_path=None):
+    """Run the --workers master if requested; returns an exit code, or None in a worker or single process."""
+    if args.workers <= 1 or Worker.from_environ() is not None:
+        return None
+    if os.name != 'posix':
+        raise SystemExit("--workers requires a POSIX platform")
+    master = WorkerMaster(name, args.workers, args.worker_socket, host, port, unix_path, args.backlog,
+                          on_ready=notifier_from_args(args), drain_timeout=args.drain_timeout)
+    return master.run()
@@ -0,0 +1,41 @@
+"""Binary codec tests for the Python servers (run with python -m pytest test)."""
+
+import os
+import sys
+import tracemalloc
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python_codec import ARRAY, ENVELOPE_MARKER, FIELD_TAGS, OBJECT, decode_binary, encode_binary
+
+
+def huge_count_frame(tag):
+    """A 7-byte payload whose attributes value declares 2**24 items."""
+    return bytes((ENVELOPE_MARKER, FIELD_TAGS['attributes'], tag, 0x80, 0x80, 0x80, 0x08))
+
+
+class TestBinaryCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        message = {'message_id': 'm1', 'type': 'VALIDATION_REQUEST', 'timestamp': 1.5,
+                   'attributes': {'values': [1.0, 2.5], 'ids': [1, 2], 'mixed': [None, True, 'x', {}]}}
+        self.assertEqual(decode_binary(encode_binary(message)), message)
+
+    def test_huge_array_count_rejected_before_allocating(self):
+        tracemalloc.start()
+        try:
+            with self.assertRaises(ValueError):
+                decode_binary(huge_count_frame(ARRAY))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 1 << 20)
+
+    def test_huge_object_count_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_binary(huge_count_frame(OBJECT))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Streamed request tests for the Python frame servers (run with python -m pytest test)."""
+
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python_framing import FrameReader, encode_payload, send_frame
+from python_ipc_server import IPCServer
+from python_streaming import DEFAULT_WINDOW, STREAM_CHUNK_TYPE, STREAM_END_TYPE
+
+
+class RunningServer:
+    """An IPCServer on a free port, served from a background thread."""
+
+    def __init__(self, **options):
+        ready = queue.Queue()
+        self.server = IPCServer(0, on_ready=ready.put, **options)
+        self.thread = threading.Thread(target=self.server.start, daemon=True)
+        self.thread.start()
+        self.port = ready.get(timeout=5)
+
+    def connect(self):
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        return sock, FrameReader(sock)
+
+    def stop(self):
+        self.server.stop()  # a threaded server's accept thread is a daemon; it is not joined
+
+
+class TestControlFramesNamingAStream(unittest.TestCase):
+    """STATS/PING frames carrying "stream" are answered without validation; their chunks must not stall the connection."""
+
+    def check(self, **options):
+        server = RunningServer(**options)
+        try:
+            sock, reader = server.connect()
+            with sock:
+                send_frame(sock, encode_payload({"type": "STATS", "message_id": "s1", "stream": "x"}))
+                for _ in range(DEFAULT_WINDOW + 4):
+                    send_frame(sock, encode_payload({"type": STREAM_CHUNK_TYPE, "message_id": "s1", "items": [1.0]}))
+                send_frame(sock, encode_payload({"type": STREAM_END_TYPE, "message_id": "s1"}))
+                send_frame(sock, encode_payload({"type": "PING", "message_id": "p1"}))
+                answered = [json.loads(bytes(reader.read_frame()))["message_id"] for _ in range(2)]
+            self.assertEqual(sorted(answered), ["p1", "s1"])
+        finally:
+            server.stop()
+
+    def test_asyncio_lock_step(self):
+        self.check(engine='asyncio')
+
+    def test_asyncio_multiplex(self):
+        self.check(engine='asyncio', multiplex=True)
+
+    def test_threaded_lock_step(self):
+        self.check(engine='threaded')
+
+    def test_threaded_multiplex(self):
+        self.check(engine='threaded', multiplex=True)
+
+
+if __name__ == '__main__':
+    unittest.main()